@@ -1,17 +1,31 @@
-from .__about__ import (
-    __version__,
-    __title__,
-    __summary__
-)
-from .mock_op import MockOP
+import time as _time
 
-from . import _op
-if _op.OP:
-    from .response_generator import OPResponseGenerator
-else:
+from .__about__ import __summary__, __title__, __version__
 
-    # make pyonepassword dependency a run-time error so it isn't needed if not generating responses
-    class OPResponseGenerator:
-        def __init__(self, *args, **kwargs):
-            raise NotImplementedError("pyonepassword missing, required for OPResponseGenerator")
-del _op
+# when mock-op started loading, so invocation traces can report import time
+_IMPORT_START = _time.perf_counter()
+
+
+# Everything else is loaded on first use, so that simply importing the package
+# (e.g., to run mock-op or mock-op-client) only pays for what it actually needs.
+# In particular, pyonepassword is only required for response generation
+def __getattr__(name):
+    if name == "MockOP":
+        from .mock_op import MockOP
+        return MockOP
+    if name == "OPResponseGenerator":
+        return _response_generator_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _response_generator_class():
+    from . import _op
+    if _op.OP:
+        from .response_generator import OPResponseGenerator
+    else:
+
+        # make pyonepassword dependency a run-time error so it isn't needed if not generating responses
+        class OPResponseGenerator:
+            def __init__(self, *args, **kwargs):
+                raise NotImplementedError("pyonepassword missing, required for OPResponseGenerator")
+    return OPResponseGenerator
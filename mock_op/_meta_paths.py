@@ -0,0 +1,32 @@
+"""
+Paths recorded in a response directory's metadata, such as 'blob_dir'
+
+Relative paths are relative to the directory holding the response directory JSON file
+(or its compiled index), not to the current directory, so a response directory can be
+checked out or run from anywhere along with what it refers to
+"""
+import os
+from pathlib import Path
+from typing import Union
+
+
+def relative_meta_path(path: Union[str, Path], respdir_file: Union[str, Path]) -> str:
+    """
+    'path', which is relative to the current directory, as it should be recorded in
+    the metadata of 'respdir_file'
+    """
+    path = os.path.abspath(os.path.expanduser(path))
+    base_dir = os.path.dirname(os.path.abspath(respdir_file))
+    try:
+        path = os.path.relpath(path, base_dir)
+    except ValueError:
+        # e.g., on another drive, so it can only be recorded as is
+        pass
+    return path
+
+
+def resolve_meta_path(path: Union[str, Path], respdir_file: Union[str, Path]) -> str:
+    """
+    A path recorded in the metadata of 'respdir_file', as a path usable from the current directory
+    """
+    return os.path.join(os.path.dirname(respdir_file), os.path.expanduser(path))
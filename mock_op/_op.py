@@ -22,8 +22,9 @@ try:
     )
     from pyonepassword.py_op_exceptions import OPWhoAmiException
 except ImportError as e:
-    logging.basicConfig(format="%(message)s", level=logging.DEBUG)
-    logger = logging.getLogger()
+    # Don't reconfigure logging for whoever imported us, the last resort
+    # handler will still get this message to stderr
+    logger = logging.getLogger(__name__)
     logger.error(f"Unable to import from pyonepassword: {e}")
     OP = None
     op_logging = None
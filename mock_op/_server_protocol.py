@@ -0,0 +1,73 @@
+"""
+Wire protocol shared by mock-op-server and mock-op-client
+
+Each message is a fixed-size frame header, followed by a JSON-encoded message
+header, followed by an opaque binary payload:
+
+    [json header length: u32][payload length: u32][json header][payload]
+
+This module intentionally only depends on the standard library so the client
+stays cheap to start
+"""
+import json
+import os
+import socket
+import struct
+from typing import Dict, Optional, Tuple
+
+SERVER_SOCKET_ENV_NAME = "MOCK_OP_SERVER_SOCKET"
+
+# environment variables with these prefixes are forwarded from the client
+# to the server, and are applied for the duration of each invocation
+FORWARDED_ENV_PREFIXES = ["MOCK_OP_", "MOCK_CMD_"]
+
+_FRAME_HEADER = struct.Struct("!II")
+
+
+class MockOPServerProtocolException(Exception):
+    pass
+
+
+def forwarded_env(environ=None) -> Dict[str, str]:
+    if environ is None:
+        environ = os.environ
+    env = {}
+    for name, value in environ.items():
+        if name == SERVER_SOCKET_ENV_NAME:
+            continue
+        for prefix in FORWARDED_ENV_PREFIXES:
+            if name.startswith(prefix):
+                env[name] = value
+                break
+    return env
+
+
+def _recv_exact(sock: socket.socket, length: int) -> bytes:
+    buf = bytearray(length)
+    view = memoryview(buf)
+    received = 0
+    while received < length:
+        count = sock.recv_into(view[received:], length - received)
+        if count == 0:
+            raise MockOPServerProtocolException(
+                f"Connection closed after {received} of {length} bytes")
+        received += count
+    return bytes(buf)
+
+
+def send_message(sock: socket.socket, header: Dict, payload: Optional[bytes] = None):
+    if payload is None:
+        payload = b""
+    header_bytes = json.dumps(header).encode("utf-8")
+    frame = _FRAME_HEADER.pack(len(header_bytes), len(payload))
+    sock.sendall(frame + header_bytes)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock: socket.socket) -> Tuple[Dict, bytes]:
+    frame = _recv_exact(sock, _FRAME_HEADER.size)
+    header_len, payload_len = _FRAME_HEADER.unpack(frame)
+    header = json.loads(_recv_exact(sock, header_len).decode("utf-8"))
+    payload = _recv_exact(sock, payload_len)
+    return header, payload
@@ -0,0 +1,129 @@
+"""
+Generating responses with asyncio
+
+OPResponseGenerator runs each 'op' command it records synchronously, so a slow one holds up
+everything after it. OPResponseGenPlanner has all the same *_generate_response() methods, but
+rather than running the commands they'd record, they return OPResponseGenRequests describing
+them, and OPAsyncResponseGenerator runs those with asyncio.create_subprocess_exec(), at most
+'concurrency' at a time.
+
+Some queries look things up before the command they record, e.g., item_delete_multiple's
+item_list(). Those lookups still run synchronously, so OPAsyncResponseGenerator.generate()
+plans queries in the event loop's default executor, keeping the loop free.
+
+E.g., from async code:
+
+    planner = OPResponseGenPlanner(existing_auth=EXISTING_AUTH_AVAIL)
+    generator = OPAsyncResponseGenerator(concurrency=8)
+    invocations = await asyncio.gather(
+        generator.generate(planner.vault_get_generate_response, "Test Data", "vault-get-test-data"),
+        generator.generate(planner.item_get_generate_response, "Example Login", "item-get-example-login",
+                           vault="Test Data"))
+"""
+import asyncio
+import functools
+from typing import Any, Callable, Optional, Union
+
+from mock_cli import CommandInvocation
+
+from .response_generator import OPResponseGenerator
+
+DEFAULT_CONCURRENCY = 4
+
+
+class OPResponseGenRequest:
+    """
+    An 'op' command to run, and how to record its response
+    """
+
+    def __init__(self,
+                 run_argv,
+                 query_name: str,
+                 expected_return: int,
+                 changes_state: bool,
+                 record_argv=None,
+                 input: Optional[Union[str, bytes]] = None):
+        self.run_argv = run_argv
+        self.query_name = query_name
+        self.expected_return = expected_return
+        self.changes_state = changes_state
+        self.record_argv = record_argv
+        self.input = input
+
+
+class OPResponseGenPlanner(OPResponseGenerator):
+    """
+    An OPResponseGenerator whose *_generate_response() methods return the OPResponseGenRequests
+    for the commands they'd run, rather than running them
+    """
+
+    @classmethod
+    def _generate_response(cls, run_argv, query_name, expected_return, changes_state, record_argv=None, input=None):
+        request = OPResponseGenRequest(run_argv, query_name, expected_return, changes_state,
+                                       record_argv=record_argv, input=input)
+        return request
+
+
+class OPAsyncResponseGenerator:
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY):
+        self.concurrency = max(concurrency, 1)
+        # created on first use, so it belongs to the event loop it's used from
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def run_request(self, request: OPResponseGenRequest) -> CommandInvocation:
+        """
+        Run a request's 'op' command, and record its response
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        input = request.input
+        if isinstance(input, str):
+            input = input.encode("utf-8")
+        # like OPResponseGenerator, 'op' shares our stdin unless there's input for it
+        stdin = asyncio.subprocess.PIPE if input else None
+
+        async with self._semaphore:
+            OPResponseGenerator.logger.info(f"About to run: {request.run_argv.cmd_str()}")
+            proc = await asyncio.create_subprocess_exec(*request.run_argv,
+                                                        stdin=stdin,
+                                                        stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE)
+            stdout, stderr = await proc.communicate(input if input else None)
+
+        invocation = OPResponseGenerator._response_invocation(request.run_argv,
+                                                              request.query_name,
+                                                              request.expected_return,
+                                                              request.changes_state,
+                                                              stdout,
+                                                              stderr,
+                                                              proc.returncode,
+                                                              record_argv=request.record_argv,
+                                                              input=request.input)
+        return invocation
+
+    async def run(self, planned: Any) -> Any:
+        """
+        Run what a planned query returned: a request, or a tuple or list of them, giving back
+        the same shape of invocations
+
+        A tuple's requests run concurrently, but a list's run one after another, as they may
+        each change state, e.g., 'item delete' batches
+        """
+        if isinstance(planned, OPResponseGenRequest):
+            return await self.run_request(planned)
+        if isinstance(planned, tuple):
+            return tuple(await asyncio.gather(*[self.run(request) for request in planned]))
+        if isinstance(planned, list):
+            return [await self.run(request) for request in planned]
+        raise TypeError(f"Not a planned response: {planned!r}")
+
+    async def generate(self, plan: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Plan a query, e.g., with one of OPResponseGenPlanner's *_generate_response() methods,
+        or a response-generator query function given a planner, then run it
+        """
+        loop = asyncio.get_event_loop()
+        planned = await loop.run_in_executor(None, functools.partial(plan, *args, **kwargs))
+        return await self.run(planned)
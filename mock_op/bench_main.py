@@ -0,0 +1,89 @@
+import inspect
+import json
+import sys
+import tempfile
+from argparse import ArgumentParser
+from pathlib import Path
+
+from .benchmark import BENCHMARKS, compare_to_baseline
+
+
+def bench_parse_args():
+    parser = ArgumentParser(description="Run mock-op performance benchmarks")
+    parser.add_argument(
+        "benchmark", nargs="*", help="Names of benchmarks to run. Default is all benchmarks")
+    parser.add_argument(
+        "--list", action="store_true", help="List available benchmarks and exit")
+    parser.add_argument(
+        "--param", action="append", default=[], metavar="NAME=VALUE",
+        help="Benchmark parameter, e.g., size_mb=256. May be given multiple times")
+    parser.add_argument(
+        "--output", metavar="RESULTS_FILE", help="Also write all results to this JSON file")
+    parser.add_argument(
+        "--baseline", metavar="RESULTS_FILE",
+        help="Compare latencies against a previous run's results file, and fail if any have regressed")
+    parser.add_argument(
+        "--threshold", type=float, default=20.0, metavar="PERCENT",
+        help="How much slower than the baseline a latency can be before it's a regression. Default is 20")
+
+    parsed = parser.parse_args()
+    unknown = [name for name in parsed.benchmark if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(unknown)}")
+    params = {}
+    for param in parsed.param:
+        name, sep, value = param.partition("=")
+        if not sep:
+            parser.error(f"Invalid parameter: {param}")
+        try:
+            params[name] = json.loads(value)
+        except json.JSONDecodeError:
+            params[name] = value
+    parsed.params = params
+    return parsed
+
+
+def main():
+    args = bench_parse_args()
+    if args.list:
+        for name, func in BENCHMARKS.items():
+            summary = (func.__doc__ or "").strip().splitlines()
+            summary = summary[0] if summary else ""
+            print(f"{name}: {summary}")
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    names = args.benchmark or list(BENCHMARKS.keys())
+    all_results = {}
+    for name in names:
+        func = BENCHMARKS[name]
+        # only pass each benchmark the parameters it takes
+        accepted = inspect.signature(func).parameters
+        params = {k: v for k, v in args.params.items() if k in accepted}
+        with tempfile.TemporaryDirectory(prefix="mock-op-bench-") as workdir:
+            results = func(Path(workdir), **params)
+        all_results[name] = results
+        print(json.dumps({"benchmark": name, **results}), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(all_results, f, indent=2)
+
+    if baseline is None:
+        return 0
+    regressions = compare_to_baseline(all_results, baseline, args.threshold / 100)
+    for regression in regressions:
+        print(f"Regression: {regression['benchmark']} {regression['metric']}: "
+              f"{regression['baseline']:.3f} ms -> {regression['value']:.3f} ms "
+              f"(+{regression['change'] * 100:.0f}%)", file=sys.stderr)
+    if regressions:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,610 @@
+"""
+Benchmarks for mock-op playback
+
+Each benchmark is a function registered with @benchmark that takes a scratch directory,
+plus optional keyword parameters, and returns a dictionary of results
+
+Results can be compared against a previous run's, to catch latency regressions.
+Only latencies (metrics named '*_ms') are compared, and of timing statistics, only
+the median, since means and extremes vary too much from run to run
+"""
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from mock_cli import CommandInvocation, ResponseDirectory
+from mock_cli.argv_conversion import argv_to_string
+
+from ._server_protocol import FORWARDED_ENV_PREFIXES
+from .command_input import MockOPCommandInput, input_digest
+from .compression import (
+    COMPRESSION_GZIP,
+    COMPRESSION_ZSTD,
+    MockOPCompressionException,
+    MockOPDecompressionCache,
+    compress
+)
+from .in_process import invocation_environment
+from .mock_op import (
+    SIGNIN_ACCOUNT_ENV_NAME,
+    SIGNIN_SUCCESS_ENV_NAME,
+    USES_BIO_ENV_NAME,
+    MockOP
+)
+from .mock_op_command import MockOPCommand
+from .response_directory import (
+    MockOPResponseDirectory,
+    MockOPResponseDirectoryCache
+)
+from .response_index import compile_response_index
+from .response_pack import pack_response_dir
+from .state import MockOPStateConfig, reset_state_session, write_json_atomic
+
+BENCHMARKS: Dict[str, Callable[..., Dict]] = {}
+
+
+def benchmark(name: str):
+    def _register(func):
+        BENCHMARKS[name] = func
+        return func
+    return _register
+
+
+def _max_rss_kb() -> int:
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss
+
+
+def timing_stats(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    stats = {
+        "iterations": len(timings),
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "min_ms": timings[0] * 1000,
+        "median_ms": timings[len(timings) // 2] * 1000,
+        "max_ms": timings[-1] * 1000
+    }
+    return stats
+
+
+# means & extremes are too noisy to compare from one run to the next
+_UNCOMPARED_METRICS = ["mean_ms", "min_ms", "max_ms"]
+
+
+def _latency_metrics(results: Dict, prefix: str = "") -> Dict[str, float]:
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(_latency_metrics(value, prefix=f"{name}."))
+        elif key.endswith("_ms") and key not in _UNCOMPARED_METRICS and isinstance(value, (int, float)):
+            metrics[name] = value
+    return metrics
+
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[Dict]:
+    """
+    Latencies in 'results' more than 'threshold' (e.g., 0.2 for 20%) slower than in 'baseline'
+
+    Both are keyed by benchmark name. Benchmarks and metrics that only one of them has
+    are ignored
+    """
+    regressions = []
+    for name, benchmark_results in results.items():
+        if name not in baseline:
+            continue
+        baseline_metrics = _latency_metrics(baseline[name])
+        for metric, value in _latency_metrics(benchmark_results).items():
+            baseline_value = baseline_metrics.get(metric)
+            if not baseline_value:
+                continue
+            change = (value - baseline_value) / baseline_value
+            if change > threshold:
+                regressions.append({
+                    "benchmark": name,
+                    "metric": metric,
+                    "baseline": baseline_value,
+                    "value": value,
+                    "change": change
+                })
+    return regressions
+
+
+def _write_large_file(path: Path, size: int, chunk_size: int = 1024 * 1024):
+    # incompressible-looking, but cheap to generate, and never held in memory all at once
+    chunk = os.urandom(chunk_size)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(chunk[:remaining])
+            remaining -= chunk_size
+
+
+def _document_response_dir(workdir: Path, size: int) -> Path:
+    respdir_json_file = Path(workdir, "response-directory.json")
+    response_path = Path(workdir, "responses")
+    directory = ResponseDirectory(respdir_json_file, create=True, response_dir=response_path)
+    invocation = CommandInvocation(
+        ["document", "get", "large-document", "--vault", "Test Data"],
+        b"", b"", 0, "document-get-large", None)
+    directory.add_command_invocation(invocation, save=True)
+    _write_large_file(Path(response_path, "document-get-large", "output"), size)
+    return respdir_json_file
+
+
+def _playback(respdir_json_file: Path, output_path: Path, iterations: int,
+              argv: Optional[List[str]] = None,
+              decompression_cache: Optional[MockOPDecompressionCache] = None) -> List[float]:
+    if argv is None:
+        argv = ["document", "get", "large-document", "--vault", "Test Data"]
+    timings = []
+    for _ in range(iterations):
+        # a real file rather than /dev/null, so the output is actually copied
+        with open(output_path, "wb") as output:
+            start = time.perf_counter()
+            MockOPCommand(response_directory=respdir_json_file,
+                          stdout=output, stderr=output,
+                          decompression_cache=decompression_cache).respond(argv)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+@benchmark("document-playback")
+def document_playback(workdir: Path, size_mb: int = 64, iterations: int = 10, packed: bool = False) -> Dict:
+    """
+    Play back a large recorded 'document get' response, and report latency and peak memory
+    """
+    size = size_mb * 1024 * 1024
+    respdir_json_file = _document_response_dir(workdir, size)
+    if packed:
+        pack_response_dir(Path(workdir, "responses"), remove=True)
+
+    rss_before = _max_rss_kb()
+    timings = _playback(respdir_json_file, Path(workdir, "playback-output"), iterations)
+    results = {
+        "size_bytes": size,
+        "packed": packed,
+        "max_rss_kb": _max_rss_kb(),
+        "max_rss_growth_kb": _max_rss_kb() - rss_before
+    }
+    results.update(timing_stats(timings))
+    return results
+
+
+_ITEM_LIST_ARGV = ["--format", "json", "item", "list", "--vault", "Test Data"]
+
+
+def _item_list_output(size: int) -> bytes:
+    # repetitive JSON, like real 'item list' output
+    rand = random.Random(0)
+    items = []
+    length = 2
+    while length < size:
+        item = {
+            "id": "".join(rand.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(26)),
+            "title": f"Example Login {len(items)}",
+            "version": rand.randint(1, 20),
+            "vault": {"id": "yhdg6ovhkjcfhn3u25cp2bnl6e", "name": "Test Data"},
+            "category": "LOGIN",
+            "last_edited_by": "RAYGBJEJOJECHKLMSTBCB5OGLA",
+            "created_at": "2023-04-11T02:47:12Z",
+            "updated_at": "2023-04-11T02:47:12Z",
+            "additional_information": "example_user"
+        }
+        items.append(item)
+        length += len(json.dumps(item)) + 2
+    return json.dumps(items, indent=2).encode("utf-8")
+
+
+def _tree_size(path: Path) -> int:
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            size += os.path.getsize(Path(dirpath, filename))
+    return size
+
+
+@benchmark("compressed-playback")
+def compressed_playback(workdir: Path, size_mb: int = 16, iterations: int = 10,
+                        compressions: Optional[List[str]] = None) -> Dict:
+    """
+    Compare disk footprint & playback latency of uncompressed, gzip, and zstd recorded responses
+    """
+    if compressions is None:
+        compressions = ["none", COMPRESSION_GZIP, COMPRESSION_ZSTD]
+    output = _item_list_output(size_mb * 1024 * 1024)
+    results = {"size_bytes": len(output)}
+    for compression in compressions:
+        tree = Path(workdir, compression)
+        respdir_json_file = Path(tree, "response-directory.json")
+        response_path = Path(tree, "responses")
+        if compression == "none":
+            compression = None
+        try:
+            if compression:
+                # fail now, rather than partway through recording
+                compress(b"", compression)
+        except MockOPCompressionException as e:
+            results[str(compression)] = {"error": str(e)}
+            continue
+        directory = MockOPResponseDirectory(
+            respdir_json_file, create=True, response_dir=response_path, compression=compression)
+        invocation = CommandInvocation(_ITEM_LIST_ARGV, output, b"", 0, "item-list", False)
+        start = time.perf_counter()
+        directory.add_command_invocation(invocation, overwrite=True, save=True)
+        record_ms = (time.perf_counter() - start) * 1000
+
+        output_path = Path(workdir, "playback-output")
+        streamed = _playback(respdir_json_file, output_path, iterations, argv=_ITEM_LIST_ARGV)
+        if output_path.read_bytes() != output:
+            raise Exception(f"Played back output doesn't match recorded output ({compression})")
+        # as in long-lived modes, where decompressed output stays cached between invocations
+        cache = MockOPDecompressionCache()
+        cached = _playback(respdir_json_file, output_path, iterations, argv=_ITEM_LIST_ARGV,
+                           decompression_cache=cache)
+        results[str(compression or "none")] = {
+            "disk_bytes": _tree_size(response_path),
+            "record_ms": record_ms,
+            "streamed": timing_stats(streamed),
+            "cached": timing_stats(cached),
+            "cache_hits": cache.hits
+        }
+    return results
+
+
+_STATE_CHANGING_ARGV = ["item", "delete", "state-benchmark-item"]
+
+
+def _state_config(workdir: Path, state_count: int) -> Path:
+    # each state's response to the same state-changing command is its own iteration number
+    state_list = []
+    for i in range(state_count):
+        respdir_json_file = Path(workdir, f"response-directory-{i}.json")
+        directory = ResponseDirectory(
+            respdir_json_file, create=True, response_dir=Path(workdir, f"responses-{i}"))
+        invocation = CommandInvocation(
+            _STATE_CHANGING_ARGV, f"{i}\n".encode("utf-8"), b"", 0, "item-delete", True)
+        # mock_cli's new, empty response directories share a dictionary, so this command
+        # looks like it's already been added
+        directory.add_command_invocation(invocation, overwrite=True, save=True)
+        state_list.append({
+            "response-directory": str(respdir_json_file),
+            "env-vars": {"set": {}, "pop": []}
+        })
+
+    state_config_path = Path(workdir, "state", "config.json")
+    state_config = {
+        "iteration": 0,
+        "max-iterations": state_count,
+        "state-list": state_list
+    }
+    write_json_atomic(state_config_path, state_config)
+    return state_config_path
+
+
+def _state_worker(state_config_path: str, transitions: int) -> List[int]:
+    observed = []
+    for _ in range(transitions):
+        output = io.BytesIO()
+        MockOPCommand(state_dir=state_config_path, stdout=output,
+                      stderr=io.BytesIO()).respond(_STATE_CHANGING_ARGV)
+        observed.append(int(output.getvalue()))
+    return observed
+
+
+@benchmark("state-contention")
+def state_contention(workdir: Path, processes: int = 16, transitions: int = 25) -> Dict:
+    """
+    Advance one shared state configuration from many processes, checking for lost or duplicated transitions
+    """
+    total = processes * transitions
+    # one extra state for the last transition to land on
+    state_config_path = _state_config(workdir, total + 1)
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(
+            _state_worker, [(str(state_config_path), transitions)] * processes)
+    elapsed = time.perf_counter() - start
+
+    # each transition should have been answered from a distinct iteration, with none skipped
+    counts = Counter(iteration for observed in results for iteration in observed)
+    lost = [i for i in range(total) if i not in counts]
+    duplicated = [i for i, count in counts.items() if count > 1]
+    final_iteration = MockOPStateConfig(state_config_path).iteration
+
+    results = {
+        "processes": processes,
+        "transitions": total,
+        "final_iteration": final_iteration,
+        "lost": len(lost),
+        "duplicated": len(duplicated),
+        "ok": not lost and not duplicated and final_iteration == total,
+        "elapsed_ms": elapsed * 1000,
+        "transitions_per_sec": total / elapsed
+    }
+    return results
+
+
+def _item_get_argv(i: int) -> List[str]:
+    return ["--format", "json", "item", "get", f"Example Login {i}", "--vault", "Test Data"]
+
+
+_DOCUMENT_EDIT_ARGV = ["document", "edit", "large-document", "--vault", "Test Data"]
+
+
+def _synthetic_response_dir(workdir: Path, command_count: int, inputs: Optional[List[bytes]] = None) -> Path:
+    """
+    A response directory with 'command_count' 'item get' commands, plus a 'document edit'
+    command for each of 'inputs'
+
+    Every command shares the same recorded output, so large directories are quick to create
+    """
+    respdir_json_file = Path(workdir, "response-directory.json")
+    response_path = Path(workdir, "responses")
+    Path(response_path, "shared").mkdir(parents=True, exist_ok=True)
+    Path(response_path, "shared", "output").write_bytes(b'{"title": "Example Login"}\n')
+    Path(response_path, "shared", "error_output").write_bytes(b"")
+    response = {
+        "exit_status": 0,
+        "stdout": "output",
+        "stderr": "error_output",
+        "name": "shared",
+        "changes_state": False
+    }
+    commands = {argv_to_string(_item_get_argv(i)): response for i in range(command_count)}
+    commands_with_input = {}
+    for input in inputs or []:
+        commands_with_input[input_digest(input)] = {argv_to_string(_DOCUMENT_EDIT_ARGV): response}
+    directory = {
+        "meta": {"response_dir": str(response_path), "input_dir": "input"},
+        "commands": commands,
+        "commands_with_input": commands_with_input
+    }
+    write_json_atomic(respdir_json_file, directory)
+    return respdir_json_file
+
+
+def _clean_environment() -> Dict[str, str]:
+    # so the caller's mock-op configuration doesn't leak into benchmarks
+    env = {name: value for name, value in os.environ.items()
+           if not name.startswith(tuple(FORWARDED_ENV_PREFIXES))}
+    return env
+
+
+def _process_timings(argv: List[str], iterations: int, env: Dict[str, str]) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = subprocess.run(argv, env=env, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise Exception(f"{argv} failed: {result.stderr.decode('utf-8', 'replace')}")
+    return timings
+
+
+def _slowest_imports(env: Dict[str, str], count: int = 10) -> Dict[str, float]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import mock_op.mock_op_main"],
+                            env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, check=True)
+    # lines are 'import time: <self us> | <cumulative us> | <module>'
+    self_times = []
+    for line in result.stderr.decode("utf-8").splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[0].startswith("import time:"):
+            continue
+        try:
+            self_us = int(fields[0].split(":")[1])
+        except ValueError:
+            continue
+        self_times.append((self_us, fields[2].strip()))
+    self_times.sort(reverse=True)
+    return {module: self_us / 1000 for self_us, module in self_times[:count]}
+
+
+@benchmark("cold-start")
+def cold_start(workdir: Path, iterations: int = 20) -> Dict:
+    """
+    Run mock-op as a new process, as most test suites do, and report startup & import time
+    """
+    respdir_json_file = _synthetic_response_dir(workdir, 100)
+    env = _clean_environment()
+    interpreter = _process_timings([sys.executable, "-c", "pass"], iterations, env)
+    imports = _process_timings([sys.executable, "-c", "import mock_op.mock_op_main"], iterations, env)
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(respdir_json_file)
+    invocations = _process_timings(
+        [sys.executable, "-m", "mock_op.mock_op_main"] + _item_get_argv(0), iterations, env)
+
+    interpreter_stats = timing_stats(interpreter)
+    import_stats = timing_stats(imports)
+    results = {
+        "interpreter": interpreter_stats,
+        "import": import_stats,
+        "invocation": timing_stats(invocations),
+        # how much of startup is mock-op's own doing
+        "import_ms": import_stats["median_ms"] - interpreter_stats["median_ms"],
+        "slowest_imports_self_ms": _slowest_imports(env)
+    }
+    return results
+
+
+def _respond_timings(mock_op: Callable[[], MockOP], argv: List[str], iterations: int,
+                     input=None) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        output = io.BytesIO()
+        start = time.perf_counter()
+        exit_status = mock_op().respond(argv, input, stdout=output, stderr=output)
+        timings.append(time.perf_counter() - start)
+        if exit_status != 0:
+            raise Exception(f"{argv} failed: {output.getvalue().decode('utf-8', 'replace')}")
+    return timings
+
+
+@benchmark("respond")
+def respond(workdir: Path, command_count: int = 100, iterations: int = 1000) -> Dict:
+    """
+    Answer invocations in-process with MockOP.respond(), with and without a resident response directory
+    """
+    respdir_json_file = _synthetic_response_dir(workdir, command_count)
+    argv = _item_get_argv(command_count // 2)
+    directory_cache = MockOPResponseDirectoryCache()
+    with invocation_environment(env={}):
+        # as mock-op does, loading the response directory every time
+        loading = _respond_timings(
+            lambda: MockOP(response_directory=respdir_json_file), argv, iterations)
+        # as mock-op-server and in-process interception do
+        resident = _respond_timings(
+            lambda: MockOP(response_directory=respdir_json_file, directory_cache=directory_cache),
+            argv, iterations)
+    results = {
+        "command_count": command_count,
+        "loading": timing_stats(loading),
+        "resident": timing_stats(resident)
+    }
+    return results
+
+
+def _lookup_timings(respdir_json_file: Path, argvs: List[str], loading_lookups: int) -> Dict:
+    loading = []
+    for argv in argvs[:loading_lookups]:
+        output = io.BytesIO()
+        start = time.perf_counter()
+        MockOPCommand(response_directory=respdir_json_file, stdout=output, stderr=output).respond(argv)
+        loading.append(time.perf_counter() - start)
+
+    directory_cache = MockOPResponseDirectoryCache()
+    directory_cache.get(respdir_json_file)
+    resident = []
+    for argv in argvs:
+        output = io.BytesIO()
+        start = time.perf_counter()
+        MockOPCommand(response_directory=respdir_json_file, stdout=output, stderr=output,
+                      directory_cache=directory_cache).respond(argv)
+        resident.append(time.perf_counter() - start)
+    return {"loading": timing_stats(loading), "resident": timing_stats(resident)}
+
+
+@benchmark("lookup-scaling")
+def lookup_scaling(workdir: Path, command_counts: Optional[List[int]] = None,
+                   lookups: int = 1000, loading_lookups: int = 10) -> Dict:
+    """
+    Look up commands in ever larger response directories, from JSON and from a compiled index
+    """
+    if command_counts is None:
+        command_counts = [100, 10000, 100000]
+    rand = random.Random(0)
+    results = {}
+    for command_count in command_counts:
+        respdir_json_file = _synthetic_response_dir(Path(workdir, str(command_count)), command_count)
+        argvs = [_item_get_argv(rand.randrange(command_count)) for _ in range(lookups)]
+        count_results = {
+            "json_bytes": os.path.getsize(respdir_json_file),
+            "json": _lookup_timings(respdir_json_file, argvs, loading_lookups)
+        }
+        start = time.perf_counter()
+        compile_response_index(respdir_json_file)
+        count_results["compile_ms"] = (time.perf_counter() - start) * 1000
+        count_results["index"] = _lookup_timings(respdir_json_file, argvs, loading_lookups)
+        results[str(command_count)] = count_results
+    return results
+
+
+@benchmark("input-lookup")
+def input_lookup(workdir: Path, input_sizes_mb: Optional[List[int]] = None,
+                 other_inputs: int = 1000, iterations: int = 10) -> Dict:
+    """
+    Look up commands that take large input, among many other inputs' commands
+    """
+    if input_sizes_mb is None:
+        input_sizes_mb = [1, 16]
+    # the other inputs only need distinct hashes
+    inputs = [f"other input {i}".encode("utf-8") for i in range(other_inputs)]
+    large_inputs = [os.urandom(size_mb * 1024 * 1024) for size_mb in input_sizes_mb]
+    respdir_json_file = _synthetic_response_dir(workdir, 100, inputs=inputs + large_inputs)
+    directory_cache = MockOPResponseDirectoryCache()
+
+    def mock_op():
+        return MockOP(response_directory=respdir_json_file, directory_cache=directory_cache)
+
+    results = {}
+    with invocation_environment(env={}):
+        for size_mb, input in zip(input_sizes_mb, large_inputs):
+            as_bytes = _respond_timings(mock_op, _DOCUMENT_EDIT_ARGV, iterations, input=input)
+            # input as it arrives on stdin, hashed as it's read
+            as_stream = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                command_input = MockOPCommandInput.read(io.BytesIO(input))
+                read_time = time.perf_counter() - start
+                as_stream.append(
+                    read_time + _respond_timings(mock_op, _DOCUMENT_EDIT_ARGV, 1, input=command_input)[0])
+            results[f"{size_mb}mb"] = {
+                "bytes": timing_stats(as_bytes),
+                "stream": timing_stats(as_stream)
+            }
+    return results
+
+
+@benchmark("signin")
+def signin(workdir: Path, iterations: int = 200) -> Dict:
+    """
+    Handle successful & failed 'signin' invocations
+    """
+    results = {}
+    cases = {
+        "success": {SIGNIN_SUCCESS_ENV_NAME: "1", SIGNIN_ACCOUNT_ENV_NAME: "example", USES_BIO_ENV_NAME: "0"},
+        "failure": {SIGNIN_SUCCESS_ENV_NAME: "0", SIGNIN_ACCOUNT_ENV_NAME: "example", USES_BIO_ENV_NAME: "0"}
+    }
+    for case, env in cases.items():
+        timings = []
+        with invocation_environment(env=env):
+            for _ in range(iterations):
+                output = io.BytesIO()
+                start = time.perf_counter()
+                MockOP().respond(["signin", "--raw"], None, stdout=output, stderr=output)
+                timings.append(time.perf_counter() - start)
+        results[case] = timing_stats(timings)
+    return results
+
+
+def _transition_timings(state_config_path: Path, transitions: int,
+                        session: Optional[str] = None) -> List[float]:
+    timings = []
+    for i in range(transitions):
+        output = io.BytesIO()
+        start = time.perf_counter()
+        MockOPCommand(state_dir=state_config_path, state_session=session,
+                      stdout=output, stderr=io.BytesIO()).respond(_STATE_CHANGING_ARGV)
+        timings.append(time.perf_counter() - start)
+        if int(output.getvalue()) != i:
+            raise Exception(f"Transition {i} answered from iteration {int(output.getvalue())}")
+    return timings
+
+
+@benchmark("state-transitions")
+def state_transitions(workdir: Path, transitions: int = 200) -> Dict:
+    """
+    Advance a state configuration one transition at a time, shared and in a state session
+    """
+    state_config_path = _state_config(workdir, transitions + 1)
+    with invocation_environment(env={}):
+        session = _transition_timings(state_config_path, transitions, session="state-transitions")
+        reset_state_session(state_config_path, "state-transitions")
+        shared = _transition_timings(state_config_path, transitions)
+    results = {
+        "transitions": transitions,
+        "shared": timing_stats(shared),
+        "session": timing_stats(session)
+    }
+    return results
@@ -0,0 +1,283 @@
+"""
+A content-addressed store for recorded response output
+
+Most output files are byte-identical across response directories, and across the
+response directories for each iteration of a stateful configuration: 'whoami',
+'vault list', unchanged 'item get' responses, and so on. With a blob store, each distinct
+output is stored once, named for its SHA-256 digest:
+
+    blobs/3f/a2c9...
+
+A response directory that uses a blob store records the store's path in its metadata as
+'blob_dir', relative to the response directory JSON file, and each response records the
+digest of its output & error output:
+
+    "response": {
+      "exit_status": 0,
+      "stdout": "output",
+      "stderr": "error_output",
+      "name": "whoami",
+      "changes_state": false,
+      "blobs": {"output": "3fa2c9...", "error_output": "e3b0c4..."}
+    }
+
+mock-op resolves these transparently. Responses without 'blobs' are read from their
+response directory as usual, so a response directory can hold a mix of both.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from mock_cli import CommandResponse
+
+from ._meta_paths import relative_meta_path
+from .response_directory import MockOPResponseDirectory
+from .state import write_json_atomic
+
+BLOBS_KEY = "blobs"
+BLOB_DIR_KEY = "blob_dir"
+
+
+class MockOPBlobStoreException(Exception):
+    pass
+
+
+def blob_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class MockOPBlobStore:
+
+    def __init__(self, blob_dir: Union[str, Path]):
+        self._blob_dir = Path(blob_dir)
+
+    @property
+    def blob_dir(self) -> Path:
+        return self._blob_dir
+
+    def blob_path(self, digest: str) -> Path:
+        # fan out by the first two hex digits, so no single directory gets too large
+        return Path(self._blob_dir, digest[:2], digest[2:])
+
+    def __contains__(self, digest: str) -> bool:
+        return self.blob_path(digest).exists()
+
+    def add(self, data: bytes, digest: Optional[str] = None) -> str:
+        """
+        Store 'data' if it isn't already stored, returning its digest
+        """
+        if digest is None:
+            digest = blob_digest(data)
+        blob_path = self.blob_path(digest)
+        if blob_path.exists():
+            return digest
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=blob_path.parent, prefix=f".{blob_path.name}-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        return self.blob_path(digest).read_bytes()
+
+
+def response_blob_store(directory) -> Optional[MockOPBlobStore]:
+    """
+    The blob store a response directory uses, if any
+    """
+    blob_store = None
+    blob_dir = getattr(directory, "blob_dir", None)
+    if blob_dir:
+        blob_store = MockOPBlobStore(blob_dir)
+    return blob_store
+
+
+class MockOPBlobRecordedResponse(CommandResponse):
+    """
+    A newly recorded command response whose output goes to a blob store rather than
+    to its own directory
+    """
+
+    def __init__(self, response_dict, blob_store: MockOPBlobStore, output=None, error_output=None):
+        super().__init__(response_dict, None, output=output, error_output=error_output)
+        self._blob_store = blob_store
+
+    def record_response(self, response_dir):
+        output = self.output
+        error_output = self.error_output
+        if None in [output, error_output]:
+            raise MockOPBlobStoreException(
+                "Missing stdout and/or stderr response")
+        self[BLOBS_KEY] = {
+            self["stdout"]: self._blob_store.add(output),
+            self["stderr"]: self._blob_store.add(error_output)
+        }
+
+
+class MockOPBlobResponseDirectory(MockOPResponseDirectory):
+    """
+    A response directory that records response output in a blob store
+    """
+
+    def __init__(self, responsedir_json_file, blob_dir: Union[str, Path], create=False, response_dir=None,
+                 input_dir=None, compression: Optional[str] = None, compression_level: Optional[int] = None):
+        super().__init__(responsedir_json_file, create=create, response_dir=response_dir, input_dir=input_dir,
+                         compression=compression, compression_level=compression_level)
+        self._blob_store = MockOPBlobStore(blob_dir)
+        self.meta[BLOB_DIR_KEY] = relative_meta_path(blob_dir, responsedir_json_file)
+
+    def _recorded_response(self, response: CommandResponse) -> CommandResponse:
+        response = super()._recorded_response(response)
+        return MockOPBlobRecordedResponse(
+            response, self._blob_store, output=response.output, error_output=response.error_output)
+
+
+def _response_dicts(directory: dict) -> Iterator[dict]:
+    yield from directory.get("commands", {}).values()
+    for commands in directory.get("commands_with_input", {}).values():
+        yield from commands.values()
+
+
+def state_response_directories(state_config_path: Union[str, Path]) -> List[str]:
+    """
+    The response directory JSON files for each iteration of a state configuration
+    """
+    with open(state_config_path, "r") as f:
+        state_config = json.load(f)
+    return [state["response-directory"] for state in state_config["state-list"]]
+
+
+class MockOPDedupeStats:
+
+    def __init__(self):
+        self.file_count = 0
+        self.byte_count = 0
+        self.stored_count = 0
+        self.stored_bytes = 0
+        self.skipped_count = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.byte_count - self.stored_bytes
+
+    def add(self, other: "MockOPDedupeStats"):
+        for name in ["file_count", "byte_count", "stored_count", "stored_bytes", "skipped_count"]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+def _convert_response_directory(respdir_json_file: Path,
+                                blob_store: MockOPBlobStore,
+                                dry_run: bool,
+                                seen: Set[str]) -> Tuple[MockOPDedupeStats, Set[Path], str]:
+    """
+    Store a response directory's output files as blobs, returning statistics, the paths of
+    the output files that are no longer needed, which are left in place, and the response_dir
+    """
+    with open(respdir_json_file, "r") as f:
+        directory = json.load(f)
+    response_dir = os.path.expanduser(directory["meta"]["response_dir"])
+    stats = MockOPDedupeStats()
+    converted: Dict[Path, str] = {}
+
+    for response in _response_dicts(directory):
+        blobs = response.get(BLOBS_KEY, {})
+        for out_key in ["stdout", "stderr"]:
+            out_name = response[out_key]
+            out_path = Path(response_dir, response["name"], out_name)
+            if out_path in converted:
+                blobs[out_name] = converted[out_path]
+                continue
+            try:
+                data = out_path.read_bytes()
+            except FileNotFoundError:
+                if out_name not in blobs:
+                    stats.skipped_count += 1
+                continue
+            digest = blob_digest(data)
+            if digest not in seen and digest not in blob_store:
+                stats.stored_count += 1
+                stats.stored_bytes += len(data)
+            seen.add(digest)
+            if not dry_run:
+                blob_store.add(data, digest=digest)
+            blobs[out_name] = digest
+            converted[out_path] = digest
+            stats.file_count += 1
+            stats.byte_count += len(data)
+        if blobs:
+            response[BLOBS_KEY] = blobs
+
+    if not dry_run:
+        directory["meta"][BLOB_DIR_KEY] = relative_meta_path(blob_store.blob_dir, respdir_json_file)
+        write_json_atomic(respdir_json_file, directory)
+    return stats, set(converted), response_dir
+
+
+def _remove_converted(converted: Set[Path], response_dirs: Set[str]):
+    for out_path in sorted(converted):
+        out_path.unlink()
+    for response_dir in sorted(response_dirs):
+        for dirpath, _, _ in sorted(os.walk(response_dir), reverse=True):
+            if not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+
+def dedupe_response_directory(respdir_json_file: Union[str, Path],
+                              blob_dir: Union[str, Path],
+                              dry_run: bool = False,
+                              seen: Optional[Set[str]] = None) -> MockOPDedupeStats:
+    """
+    Move a response directory's output files into a blob store
+
+    Each response's output files are replaced by references to blobs, and files already
+    in the blob store, e.g., from other response directories, aren't stored again.
+    Output files that aren't on disk (e.g., they've been packed) are skipped.
+
+    Output files are removed once converted, so response directories sharing a 'response_dir'
+    have to be converted together, with dedupe_response_directories()
+
+    If 'dry_run' is True, nothing is modified, but the returned statistics are as if it had
+    been. 'seen' collects the digests stored so far, so dry runs over several directories
+    don't count a blob as newly stored more than once
+    """
+    if seen is None:
+        seen = set()
+    stats, converted, response_dir = _convert_response_directory(
+        Path(respdir_json_file), MockOPBlobStore(blob_dir), dry_run, seen)
+    if not dry_run:
+        _remove_converted(converted, {response_dir})
+    return stats
+
+
+def dedupe_response_directories(respdir_json_files: List[Union[str, Path]],
+                                blob_dir: Union[str, Path],
+                                dry_run: bool = False) -> Iterator[Tuple[Path, MockOPDedupeStats]]:
+    """
+    Deduplicate several response directories into a shared blob store,
+    yielding statistics for each as it's done
+
+    Output files are only removed after every response directory has been converted,
+    since response directories, e.g., for a state configuration's iterations, may share them
+    """
+    blob_store = MockOPBlobStore(blob_dir)
+    seen: Set[str] = set()
+    converted: Set[Path] = set()
+    response_dirs: Set[str] = set()
+    for respdir_json_file in respdir_json_files:
+        respdir_json_file = Path(respdir_json_file)
+        stats, respdir_converted, response_dir = _convert_response_directory(
+            respdir_json_file, blob_store, dry_run, seen)
+        converted.update(respdir_converted)
+        response_dirs.add(response_dir)
+        yield respdir_json_file, stats
+    if not dry_run:
+        _remove_converted(converted, response_dirs)
@@ -0,0 +1,89 @@
+"""
+Rewriting response directories so commands are recorded in canonical form
+
+Responses are looked up by their exact argument list first, and then by its canonical form
+(see MockOPArgValidator.canonical_args()), and new responses are recorded in canonical form.
+Converting older response directories means equivalent invocations, e.g., with options in
+a different order, share one response, and any duplicates recorded for them are merged.
+
+Where equivalent commands were recorded separately, the one already in canonical form is
+kept, otherwise the first one recorded. Their output files are left in place. A compiled
+response index is rebuilt the next time its response directory is opened.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from mock_cli.argv_conversion import argv_from_string, argv_to_string
+
+from .mock_op_arg_validator import canonical_argv
+from .state import write_json_atomic
+
+
+class MockOPCanonicalizeStats:
+
+    def __init__(self):
+        self.command_count = 0
+        self.rewritten_count = 0
+        self.merged_count = 0
+        # commands the argument table can't vouch for, which are left as they are
+        self.skipped_count = 0
+        # (dropped, kept) argument strings of merged commands whose responses differed
+        self.conflicts: List[Tuple[str, str]] = []
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.rewritten_count or self.merged_count)
+
+    def add(self, other: "MockOPCanonicalizeStats"):
+        for name in ["command_count", "rewritten_count", "merged_count", "skipped_count"]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.conflicts.extend(other.conflicts)
+
+
+def _canonicalize_commands(commands: Dict[str, Dict], stats: MockOPCanonicalizeStats) -> Dict[str, Dict]:
+    canonical_strings = {}
+    kept = {}
+    for arg_string in commands:
+        canonical = canonical_argv(argv_from_string(arg_string))
+        if canonical is None:
+            stats.skipped_count += 1
+            canonical_string = arg_string
+        else:
+            canonical_string = argv_to_string(canonical)
+        canonical_strings[arg_string] = canonical_string
+        if canonical_string not in kept or canonical_string == arg_string:
+            kept[canonical_string] = arg_string
+
+    canonicalized = {}
+    for arg_string, response in commands.items():
+        stats.command_count += 1
+        canonical_string = canonical_strings[arg_string]
+        kept_string = kept[canonical_string]
+        if kept_string != arg_string:
+            stats.merged_count += 1
+            if response != commands[kept_string]:
+                stats.conflicts.append((arg_string, kept_string))
+            continue
+        if canonical_string != arg_string:
+            stats.rewritten_count += 1
+        canonicalized[canonical_string] = response
+    return canonicalized
+
+
+def canonicalize_response_directory(respdir_json_file: Union[str, Path],
+                                    dry_run: bool = False) -> MockOPCanonicalizeStats:
+    """
+    Rewrite a response directory's commands in canonical form, merging equivalent ones
+    """
+    with open(respdir_json_file, "r") as f:
+        directory = json.load(f)
+    stats = MockOPCanonicalizeStats()
+    directory["commands"] = _canonicalize_commands(directory.get("commands", {}), stats)
+    commands_with_input = directory.get("commands_with_input", {})
+    for input_hash, commands in commands_with_input.items():
+        commands_with_input[input_hash] = _canonicalize_commands(commands, stats)
+
+    if stats.changed and not dry_run:
+        write_json_atomic(respdir_json_file, directory)
+    return stats
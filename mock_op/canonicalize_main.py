@@ -0,0 +1,66 @@
+from argparse import ArgumentParser
+
+from mock_cli.argv_conversion import arg_shlex_from_string
+
+from .blob_store import state_response_directories
+from .canonicalize import (
+    MockOPCanonicalizeStats,
+    canonicalize_response_directory
+)
+
+
+def canonicalize_parse_args():
+    parser = ArgumentParser(
+        description="Rewrite response directories' commands in canonical form, so equivalent invocations share one response")
+    parser.add_argument(
+        "response_dir", nargs="*", help="Path to response directory JSON file")
+    parser.add_argument(
+        "--state-config", action="append", default=[],
+        help="Path to a state configuration file, whose response directories should all be rewritten. May be given more than once")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report what would change")
+
+    parsed = parser.parse_args()
+    if not parsed.response_dir and not parsed.state_config:
+        parser.error("At least one response directory or state configuration is required")
+    return parsed
+
+
+def _report(label, stats: MockOPCanonicalizeStats):
+    msg = (f"{label}: {stats.command_count} commands, {stats.rewritten_count} rewritten, "
+           f"{stats.merged_count} merged")
+    if stats.skipped_count:
+        msg += f", {stats.skipped_count} not recognized and left as they are"
+    print(msg)
+
+
+def main():
+    args = canonicalize_parse_args()
+    respdir_json_files = list(args.response_dir)
+    try:
+        for state_config in args.state_config:
+            respdir_json_files.extend(state_response_directories(state_config))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading state configuration: {e}")
+        return 1
+
+    respdir_json_files = list(dict.fromkeys(respdir_json_files))
+    total = MockOPCanonicalizeStats()
+    try:
+        for respdir_json_file in respdir_json_files:
+            stats = canonicalize_response_directory(respdir_json_file, dry_run=args.dry_run)
+            _report(str(respdir_json_file), stats)
+            for dropped, kept in stats.conflicts:
+                print(f"  Warning: response for [{arg_shlex_from_string(dropped)}] differed from "
+                      f"the one kept for [{arg_shlex_from_string(kept)}]")
+            total.add(stats)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading response directory: {e}")
+        return 1
+    if len(respdir_json_files) > 1:
+        _report("Total", total)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
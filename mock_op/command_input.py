@@ -0,0 +1,154 @@
+import hashlib
+import io
+import os
+import select
+from argparse import Namespace
+from typing import BinaryIO, Optional, Union
+
+INPUT_CHUNK_SIZE = 64 * 1024
+
+STDIN_MODE_ENV_NAME = "MOCK_OP_STDIN_MODE"
+STDIN_TIMEOUT_ENV_NAME = "MOCK_OP_STDIN_TIMEOUT"
+
+# only read stdin for commands that take input
+STDIN_MODE_SUBCOMMAND = "subcommand"
+# as above, but also read stdin for other commands if input shows up within the timeout
+STDIN_MODE_POLL = "poll"
+# read stdin whenever it isn't a terminal, as older versions of mock-op did
+STDIN_MODE_ALWAYS = "always"
+
+DEFAULT_STDIN_TIMEOUT = 0.1
+
+# (command, subcommand) -> None if the command always reads stdin,
+# otherwise the positional argument that has to be '-' for it to read stdin
+INPUT_COMMANDS = {
+    ("document", "edit"): None,
+    ("item", "delete"): "item",
+    ("user", "edit"): "user"
+}
+
+
+class MockOPCommandInput:
+    """
+    Input to a command, hashed as it's read
+
+    Only the digest is needed to look up a response, so the input itself is only kept
+    if asked for. As with mock_cli's digest_input(), empty input counts as no input
+    """
+
+    def __init__(self, digest: Optional[str], data: Optional[bytes] = None):
+        self._digest = digest
+        self._data = data
+
+    @classmethod
+    def from_bytes(cls, data: Optional[Union[str, bytes]]) -> "MockOPCommandInput":
+        if isinstance(data, str):
+            data = data.encode()
+        digest = None
+        if data:
+            digest = hashlib.md5(data).hexdigest()
+        return cls(digest, data=data)
+
+    @classmethod
+    def read(cls, stream: BinaryIO, retain: bool = False) -> "MockOPCommandInput":
+        """
+        Read and hash a stream until EOF, in fixed size chunks
+
+        If 'retain' is True, the input is also kept and made available as 'data'
+        """
+        md5 = hashlib.md5()
+        chunks = [] if retain else None
+        size = 0
+        while True:
+            chunk = stream.read(INPUT_CHUNK_SIZE)
+            if not chunk:
+                break
+            md5.update(chunk)
+            size += len(chunk)
+            if retain:
+                chunks.append(chunk)
+
+        digest = None
+        if size:
+            digest = md5.hexdigest()
+        data = None
+        if retain:
+            data = b"".join(chunks)
+        return cls(digest, data=data)
+
+    @property
+    def digest(self) -> Optional[str]:
+        return self._digest
+
+    @property
+    def data(self) -> Optional[bytes]:
+        return self._data
+
+    def __bool__(self):
+        return self._digest is not None
+
+
+def input_digest(input: Optional[Union[str, bytes, MockOPCommandInput]]) -> Optional[str]:
+    """
+    The digest used to look up a response for the given input, which may be raw input
+    or already hashed input
+    """
+    if not isinstance(input, MockOPCommandInput):
+        input = MockOPCommandInput.from_bytes(input)
+    return input.digest
+
+
+def command_reads_input(parsed_args: Namespace) -> bool:
+    """
+    Whether the command described by a parsed argument list reads input from stdin
+    """
+    key = (getattr(parsed_args, "command", None), getattr(parsed_args, "subcommand", None))
+    if key not in INPUT_COMMANDS:
+        return False
+    dash_arg = INPUT_COMMANDS[key]
+    if dash_arg is None:
+        return True
+    return getattr(parsed_args, dash_arg, None) == "-"
+
+
+def _stdin_timeout() -> float:
+    try:
+        timeout = float(os.environ[STDIN_TIMEOUT_ENV_NAME])
+    except (KeyError, ValueError):
+        timeout = DEFAULT_STDIN_TIMEOUT
+    return timeout
+
+
+def _input_ready(stream: BinaryIO, timeout: float) -> bool:
+    try:
+        readable, _, _ = select.select([stream], [], [], timeout)
+    except (OSError, ValueError, io.UnsupportedOperation):
+        # not something we can poll, so assume input is there
+        return True
+    return bool(readable)
+
+
+def read_command_input(stream: BinaryIO, parsed_args: Namespace, retain: bool = False) -> MockOPCommandInput:
+    """
+    Read and hash a command's input from 'stream', if the command takes any, also keeping
+    the input itself if 'retain' is True
+
+    What counts as taking input depends on the MOCK_OP_STDIN_MODE environment variable.
+    In the default, 'subcommand' mode, only commands in INPUT_COMMANDS read input, so
+    other commands never block on a pipe that's never closed
+    """
+    input = MockOPCommandInput(None)
+    if stream.isatty():
+        return input
+
+    mode = os.environ.get(STDIN_MODE_ENV_NAME, STDIN_MODE_SUBCOMMAND)
+    if mode == STDIN_MODE_ALWAYS or command_reads_input(parsed_args):
+        read = True
+    elif mode == STDIN_MODE_POLL:
+        read = _input_ready(stream, _stdin_timeout())
+    else:
+        read = False
+
+    if read:
+        input = MockOPCommandInput.read(stream, retain=retain)
+    return input
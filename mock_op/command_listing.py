@@ -0,0 +1,199 @@
+"""
+Listing and querying the commands in a response directory
+
+Entries are produced one at a time rather than all at once, so even very large response
+directories can be listed without holding formatted results in memory. For compiled
+response indexes, filters are partly applied by the index itself, so only candidate
+entries are decoded.
+"""
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Union
+
+from mock_cli.argv_conversion import DEFAULT_SEP, argv_from_string
+
+from .blob_store import BLOBS_KEY, response_blob_store
+from .mock_op_arg_validator import parse_mock_op_args
+from .response_index import MockOPIndexedResponseDirectory
+from .response_pack import open_response_pack
+
+
+class MockOPCommandEntry:
+    """
+    A command in a response directory. Plain commands have no input hash
+    """
+    __slots__ = ("input_hash", "args", "_response")
+
+    def __init__(self, input_hash: Optional[str], args: str, response: Union[Dict, str]):
+        self.input_hash = input_hash
+        self.args = args
+        # responses from an index are only decoded if they're needed
+        self._response = response
+
+    @property
+    def response(self) -> Dict:
+        if isinstance(self._response, str):
+            self._response = json.loads(self._response)
+        return self._response
+
+    @property
+    def argv(self) -> List[str]:
+        return argv_from_string(self.args)
+
+
+def subcommand_words(argv: List[str]) -> Optional[List[str]]:
+    """
+    The command & subcommand words of an argument list, e.g., ['item', 'get'],
+    or None if the arguments aren't ones the validator recognizes. Global options may
+    follow the subcommand, as mock-op itself accepts them
+    """
+    parsed = parse_mock_op_args(argv)
+    if parsed is None:
+        return None
+    words = [getattr(parsed, "command", None), getattr(parsed, "subcommand", None)]
+    return [word for word in words if word]
+
+
+def _contains_run(argv: List[str], words: List[str]) -> bool:
+    for i in range(len(argv) - len(words) + 1):
+        if argv[i:i + len(words)] == words:
+            return True
+    return False
+
+
+class MockOPCommandFilter:
+    """
+    Criteria for selecting commands from a response directory
+
+    'subcommand' is e.g., "item get", or just "item". 'contains' and 'regex' are matched
+    against the command's arguments joined by spaces. An 'input_hash' of "" selects only
+    commands that take no input
+    """
+
+    def __init__(self,
+                 subcommand: Optional[str] = None,
+                 contains: Optional[str] = None,
+                 regex: Optional[str] = None,
+                 input_hash: Optional[str] = None,
+                 exit_status: Optional[List[int]] = None):
+        self.subcommand = subcommand.split() if subcommand else None
+        self.contains = contains
+        self.regex = re.compile(regex) if regex else None
+        self.input_hash = input_hash
+        self.exit_status = set(exit_status) if exit_status else None
+
+    def required_substrings(self) -> List[str]:
+        """
+        Substrings any matching command's argument string must contain, regardless
+        of how its arguments are separated
+        """
+        substrings = []
+        if self.subcommand:
+            substrings.extend(self.subcommand)
+        if self.contains:
+            substrings.extend(self.contains.split())
+        return substrings
+
+    def matches(self, entry: MockOPCommandEntry) -> bool:
+        if self.input_hash is not None and (entry.input_hash or "") != self.input_hash:
+            return False
+        if self.exit_status is not None and entry.response.get("exit_status") not in self.exit_status:
+            return False
+        if self.contains is None and self.regex is None and self.subcommand is None:
+            return True
+
+        argv = entry.argv
+        if self.subcommand:
+            words = subcommand_words(argv)
+            if words is None:
+                # arguments the validator isn't sure of; settle for the words appearing in order
+                if not _contains_run(argv, self.subcommand):
+                    return False
+            elif words[:len(self.subcommand)] != self.subcommand:
+                return False
+        command = " ".join(argv)
+        if self.contains is not None and self.contains not in command:
+            return False
+        if self.regex is not None and not self.regex.search(command):
+            return False
+        return True
+
+
+def iter_commands(directory, command_filter: Optional[MockOPCommandFilter] = None) -> Iterator[MockOPCommandEntry]:
+    """
+    Iterate over a response directory's commands, in the order they're recorded,
+    optionally only those matching 'command_filter'
+    """
+    if command_filter is None:
+        command_filter = MockOPCommandFilter()
+
+    if isinstance(directory, MockOPIndexedResponseDirectory):
+        # a separator can't appear within a required substring, so the index can check
+        # for them without splitting arguments apart
+        substrings = [substring for substring in command_filter.required_substrings()
+                      if DEFAULT_SEP not in substring]
+        entries = (MockOPCommandEntry(input_hash or None, args, response)
+                   for input_hash, args, response in directory.iter_commands(
+                       input_hash=command_filter.input_hash, args_contain=substrings, decode=False))
+    else:
+        entries = _iter_directory_commands(directory, command_filter.input_hash)
+
+    for entry in entries:
+        if command_filter.matches(entry):
+            yield entry
+
+
+def _iter_directory_commands(directory, input_hash: Optional[str]) -> Iterator[MockOPCommandEntry]:
+    if not input_hash:
+        for args, response in directory.commands.items():
+            yield MockOPCommandEntry(None, args, response)
+    if input_hash == "":
+        return
+    for _input_hash, commands in directory.commands_with_input.items():
+        if input_hash is not None and _input_hash != input_hash:
+            continue
+        for args, response in commands.items():
+            yield MockOPCommandEntry(_input_hash, args, response)
+
+
+class MockOPResponseSizer:
+    """
+    Reports how many bytes each command's recorded output takes up as stored, wherever that is
+
+    Stored output is found the same way MockOPCommand finds it, but without building
+    a response object per command
+    """
+
+    def __init__(self, directory):
+        self._response_dir = os.path.realpath(os.path.expanduser(directory.response_dir))
+        self._blob_store = response_blob_store(directory)
+        self._pack = open_response_pack(self._response_dir)
+
+    def _stored_size(self, response: Dict, out_name: str) -> Optional[int]:
+        blob_digest = None
+        if self._blob_store is not None:
+            blob_digest = response.get(BLOBS_KEY, {}).get(out_name)
+        if blob_digest is not None:
+            out_path = self._blob_store.blob_path(blob_digest)
+        else:
+            out_path = os.path.join(self._response_dir, response["name"], out_name)
+        try:
+            return os.stat(out_path).st_size
+        except FileNotFoundError:
+            pass
+        size = None
+        if self._pack is not None:
+            size = self._pack.size(f"{response['name']}/{out_name}")
+        return size
+
+    def sizes(self, entry: MockOPCommandEntry) -> Dict[str, Optional[int]]:
+        """
+        Stored size of a command's output & error output, or None for either if it's missing
+        """
+        response = entry.response
+        sizes = {
+            "output_bytes": self._stored_size(response, response["stdout"]),
+            "error_output_bytes": self._stored_size(response, response["stderr"])
+        }
+        return sizes
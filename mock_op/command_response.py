@@ -0,0 +1,90 @@
+import os
+
+from mock_cli import CommandResponse
+
+from .compression import COMPRESSION_KEY, decompress, open_decompressed
+from .output_stream import OutputSource
+
+
+class MockOPCommandResponse(CommandResponse):
+    """
+    A command response whose output can be opened for streaming rather than read
+    into memory all at once
+
+    If a blob store is provided, output recorded in it (see blob_store.py) is read from there.
+    Compressed output (see compression.py) is decompressed, via the decompression cache if provided
+    """
+
+    def __init__(self, response_dict, response_dir, output=None, error_output=None, blob_store=None,
+                 decompression_cache=None):
+        super().__init__(response_dict, response_dir, output=output, error_output=error_output)
+        self._blob_store = blob_store
+        self._decompression_cache = decompression_cache
+
+    def _out_path(self, out_name):
+        blob_digest = None
+        if self._blob_store is not None:
+            blob_digest = self.get("blobs", {}).get(out_name)
+        if blob_digest is not None:
+            out_path = self._blob_store.blob_path(blob_digest)
+        else:
+            out_path = super()._out_path(out_name)
+        return out_path
+
+    def _open_stored(self, out_name) -> OutputSource:
+        """
+        Open output as it's stored, i.e., possibly compressed
+        """
+        return open(self._out_path(out_name), "rb")
+
+    def _stored_id(self, out_name):
+        """
+        Identifies this version of the stored output
+        """
+        out_path = self._out_path(out_name)
+        st = os.stat(out_path)
+        return (str(out_path), st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read_stored(self, out_name) -> bytes:
+        stored = self._open_stored(out_name)
+        if isinstance(stored, (bytes, bytearray, memoryview)):
+            return bytes(stored)
+        with stored:
+            return stored.read()
+
+    def _open_out(self, out_name) -> OutputSource:
+        compression = self.get(COMPRESSION_KEY, {}).get(out_name)
+        if compression is None:
+            output = self._open_stored(out_name)
+        elif self._decompression_cache is not None:
+            output = self._decompression_cache.get(
+                self._stored_id(out_name),
+                lambda: decompress(self._read_stored(out_name), compression))
+        else:
+            output = open_decompressed(self._open_stored(out_name), compression)
+        return output
+
+    def _read_out(self, out_name) -> bytes:
+        output = self._open_out(out_name)
+        if isinstance(output, (bytes, bytearray, memoryview)):
+            return bytes(output)
+        with output:
+            return output.read()
+
+    def _read_output(self):
+        return self._read_out(self["stdout"])
+
+    def _read_error_output(self):
+        return self._read_out(self["stderr"])
+
+    def open_output(self) -> OutputSource:
+        output = self._output
+        if output is None:
+            output = self._open_out(self["stdout"])
+        return output
+
+    def open_error_output(self) -> OutputSource:
+        error_output = self._error_output
+        if error_output is None:
+            error_output = self._open_out(self["stderr"])
+        return error_output
@@ -0,0 +1,38 @@
+from argparse import ArgumentParser
+
+from mock_cli import ResponseDirectoryException
+
+from .response_index import compile_response_index, response_index_path
+
+
+def compile_parse_args():
+    parser = ArgumentParser(
+        description="Compile response directory JSON files into indexes for fast lookup")
+    parser.add_argument(
+        "response_dir", nargs="+", help="Path to response directory JSON file")
+    parser.add_argument(
+        "--index-path", help="Path to write the index to. Only valid with a single response directory")
+
+    parsed = parser.parse_args()
+    if parsed.index_path and len(parsed.response_dir) > 1:
+        parser.error("--index-path may only be used with a single response directory")
+    return parsed
+
+
+def main():
+    args = compile_parse_args()
+    for respdir_json_file in args.response_dir:
+        index_path = args.index_path
+        if not index_path:
+            index_path = response_index_path(respdir_json_file)
+        try:
+            compile_response_index(respdir_json_file, index_path=index_path)
+        except ResponseDirectoryException as e:
+            print(f"Error loading response directory: {e}")
+            return 1
+        print(f"{respdir_json_file} -> {index_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Compressed response output
+
+Large recorded output, such as 'item list' JSON or 'document get' files, can be stored
+compressed with gzip, or with zstd if the 'zstandard' package is installed. A response
+records how each of its output files is compressed:
+
+    "compression": {"output": "zstd"}
+
+Files not listed aren't compressed. Output is only compressed if doing so makes it smaller,
+so empty or tiny error output is left alone.
+
+On playback, compressed output is decompressed as it's streamed to its destination.
+Long-lived processes (mock-op-server, in-process interception) instead keep recently
+decompressed output in a bounded MockOPDecompressionCache, so hot responses are
+only decompressed once.
+"""
+import io
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Dict, Hashable, Optional
+
+from .output_stream import OutputSource
+
+COMPRESSION_KEY = "compression"
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSIONS = [COMPRESSION_GZIP, COMPRESSION_ZSTD]
+
+# the most decompressed output the cache holds at once
+DEFAULT_DECOMPRESSION_CACHE_SIZE = 256 * 1024 * 1024
+
+
+class MockOPCompressionException(Exception):
+    pass
+
+
+def _zstandard():
+    # optional, and only needed if there's zstd compressed output
+    try:
+        import zstandard
+    except ImportError as e:
+        raise MockOPCompressionException(
+            "zstd compression requires the 'zstandard' package") from e
+    return zstandard
+
+
+def _check_compression(compression: str):
+    if compression not in COMPRESSIONS:
+        raise MockOPCompressionException(f"Unknown compression: {compression}")
+
+
+def compress(data: bytes, compression: str, level: Optional[int] = None) -> bytes:
+    _check_compression(compression)
+    # without a level, use each library's default
+    if compression == COMPRESSION_GZIP:
+        import gzip
+        kwargs = {} if level is None else {"compresslevel": level}
+        # no timestamp, so identical output compresses identically
+        compressed = gzip.compress(data, mtime=0, **kwargs)
+    else:
+        kwargs = {} if level is None else {"level": level}
+        compressed = _zstandard().ZstdCompressor(**kwargs).compress(data)
+    return compressed
+
+
+def decompress(data, compression: str) -> bytes:
+    _check_compression(compression)
+    if compression == COMPRESSION_GZIP:
+        import gzip
+        decompressed = gzip.decompress(data)
+    else:
+        # don't rely on the frame header recording the content size
+        reader = _zstandard().ZstdDecompressor().stream_reader(data)
+        with reader:
+            decompressed = reader.readall()
+    return decompressed
+
+
+def compress_outputs(response: Dict, outputs: Dict[str, bytes], compression: str,
+                     level: Optional[int] = None) -> Dict[str, bytes]:
+    """
+    Compress a response's output files, keyed by name, wherever that makes them smaller,
+    recording which are compressed in the response
+    """
+    compressed_outputs = {}
+    compressed_names = {}
+    for out_name, data in outputs.items():
+        compressed = compress(data, compression, level=level)
+        if len(compressed) < len(data):
+            data = compressed
+            compressed_names[out_name] = compression
+        compressed_outputs[out_name] = data
+    response.pop(COMPRESSION_KEY, None)
+    if compressed_names:
+        response[COMPRESSION_KEY] = compressed_names
+    return compressed_outputs
+
+
+class _DecompressedSource(io.RawIOBase):
+    """
+    A compressed output source, decompressed as it's read
+
+    Unlike the decompressor, this has no file descriptor, so it's never mistaken for
+    something that can be copied directly to a destination
+    """
+
+    def __init__(self, reader: BinaryIO, stored: OutputSource):
+        super().__init__()
+        self._reader = reader
+        self._stored = stored
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._reader.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._reader.close()
+            if isinstance(self._stored, memoryview):
+                self._stored.release()
+            elif not isinstance(self._stored, (bytes, bytearray)):
+                self._stored.close()
+        super().close()
+
+
+def open_decompressed(stored: OutputSource, compression: str) -> OutputSource:
+    """
+    Wrap a compressed output source so it can be streamed decompressed
+    """
+    _check_compression(compression)
+    fileobj = stored
+    if isinstance(stored, (bytes, bytearray, memoryview)):
+        fileobj = io.BytesIO(stored)
+    if compression == COMPRESSION_GZIP:
+        import gzip
+        reader = gzip.GzipFile(fileobj=fileobj, mode="rb")
+    else:
+        reader = _zstandard().ZstdDecompressor().stream_reader(fileobj, closefd=False)
+    return _DecompressedSource(reader, stored)
+
+
+class MockOPDecompressionCache:
+    """
+    A least-recently-used cache of decompressed output, bounded by total size
+
+    Keys identify a particular version of stored output, e.g., a file's path, size,
+    and modification time, so changed output is never served stale
+    """
+
+    def __init__(self, max_size: int = DEFAULT_DECOMPRESSION_CACHE_SIZE):
+        self._max_size = max_size
+        self._size = 0
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, load: Callable[[], bytes]) -> bytes:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        data = load()
+        if len(data) <= self._max_size:
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self._max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return data
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
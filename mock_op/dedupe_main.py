@@ -0,0 +1,67 @@
+from argparse import ArgumentParser
+
+from .blob_store import (
+    MockOPDedupeStats,
+    dedupe_response_directories,
+    state_response_directories
+)
+
+
+def dedupe_parse_args():
+    parser = ArgumentParser(
+        description="Move response directories' output files into a shared, content-addressed blob store, storing identical output only once")
+    parser.add_argument(
+        "response_dir", nargs="*", help="Path to response directory JSON file")
+    parser.add_argument(
+        "--state-config", action="append", default=[],
+        help="Path to a state configuration file, whose response directories should all be deduplicated. May be given more than once")
+    parser.add_argument(
+        "--blob-dir", required=True, help="Path to the blob store directory")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report how much space would be saved")
+
+    parsed = parser.parse_args()
+    if not parsed.response_dir and not parsed.state_config:
+        parser.error("At least one response directory or state configuration is required")
+    return parsed
+
+
+def _report(label, stats: MockOPDedupeStats):
+    msg = (f"{label}: {stats.file_count} files ({stats.byte_count} bytes), "
+           f"{stats.stored_count} new blobs ({stats.stored_bytes} bytes), "
+           f"{stats.bytes_saved} bytes saved")
+    if stats.skipped_count:
+        msg += f", {stats.skipped_count} files not found and skipped"
+    print(msg)
+
+
+def main():
+    args = dedupe_parse_args()
+    respdir_json_files = list(args.response_dir)
+    try:
+        for state_config in args.state_config:
+            respdir_json_files.extend(state_response_directories(state_config))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading state configuration: {e}")
+        return 1
+
+    # several state iterations may share a response directory
+    respdir_json_files = list(dict.fromkeys(respdir_json_files))
+    total = MockOPDedupeStats()
+    try:
+        for respdir_json_file, stats in dedupe_response_directories(
+                respdir_json_files, args.blob_dir, dry_run=args.dry_run):
+            _report(str(respdir_json_file), stats)
+            total.add(stats)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading response directory: {e}")
+        return 1
+    if len(respdir_json_files) > 1:
+        _report("Total", total)
+    if args.dry_run:
+        print("Dry run; nothing was modified")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
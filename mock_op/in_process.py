@@ -0,0 +1,160 @@
+"""
+Running mock-op invocations inside an existing Python process
+
+This is what mock-op-server and subprocess interception have in common: an invocation's
+argument list, input, environment, and working directory go in, and its exit status,
+output, and error output come out, exactly as a stand-alone mock-op would produce them
+"""
+import io
+import os
+import threading
+import traceback
+from argparse import ArgumentParser
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from ._server_protocol import FORWARDED_ENV_PREFIXES
+from .command_input import MockOPCommandInput, read_command_input
+from .compression import (
+    DEFAULT_DECOMPRESSION_CACHE_SIZE,
+    MockOPDecompressionCache
+)
+from .mock_op import MockOP
+from .mock_op_arg_validator import parse_mock_op_args
+from .mock_op_argument_parser import mock_op_arg_parser
+from .mock_op_main import respond_handle_exceptions
+from .response_directory import MockOPResponseDirectoryCache
+from .vault_model import MockOPVaultModelCache
+
+
+@contextmanager
+def invocation_environment(env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None):
+    """
+    Temporarily apply an invocation's environment and working directory to this process
+
+    If 'env' is provided, it replaces any MOCK_OP_* and MOCK_CMD_* environment variables
+    for the duration. Everything is restored afterward
+    """
+    # only touch the variables that actually change; rewriting the whole environment
+    # costs more than answering the invocation
+    changes: Dict[str, Optional[str]] = {}
+    if env is not None:
+        for name in os.environ:
+            if name not in env and name.startswith(tuple(FORWARDED_ENV_PREFIXES)):
+                changes[name] = None
+        for name, value in env.items():
+            if os.environ.get(name) != value:
+                changes[name] = value
+    saved_env = {name: os.environ.get(name) for name in changes}
+    saved_cwd = None
+    if cwd is not None:
+        saved_cwd = os.getcwd()
+    try:
+        _update_environ(changes)
+        if cwd is not None:
+            os.chdir(cwd)
+        yield
+    finally:
+        _update_environ(saved_env)
+        if saved_cwd is not None:
+            os.chdir(saved_cwd)
+
+
+def _update_environ(changes: Dict[str, Optional[str]]):
+    for name, value in changes.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+class MockOPInvoker:
+    """
+    Answers mock-op invocations in-process
+
+    Argument parsers, loaded response directories and vault models, and recently
+    decompressed output stay resident between invocations.
+    Invocations are serialized, since each one temporarily takes over the process's
+    environment and working directory
+    """
+
+    def __init__(self, decompression_cache_size: int = DEFAULT_DECOMPRESSION_CACHE_SIZE):
+        self._arg_parsers: Dict[str, ArgumentParser] = {}
+        self._directory_cache = MockOPResponseDirectoryCache()
+        self._decompression_cache = MockOPDecompressionCache(max_size=decompression_cache_size)
+        self._vault_model_cache = MockOPVaultModelCache()
+        self._lock = threading.RLock()
+
+    @property
+    def directory_cache(self) -> MockOPResponseDirectoryCache:
+        return self._directory_cache
+
+    @property
+    def decompression_cache(self) -> MockOPDecompressionCache:
+        return self._decompression_cache
+
+    @property
+    def vault_model_cache(self) -> MockOPVaultModelCache:
+        return self._vault_model_cache
+
+    def arg_parser(self, prog) -> ArgumentParser:
+        # the program name ends up in usage & error messages, so keep a parser
+        # per program name mock-op was invoked as
+        parser = self._arg_parsers.get(prog)
+        if parser is None:
+            parser = mock_op_arg_parser(prog=prog)
+            self._arg_parsers[prog] = parser
+        return parser
+
+    def invoke(self,
+               prog: str,
+               argv: List[str],
+               input: Optional[Union[MockOPCommandInput, BinaryIO]] = None,
+               env: Optional[Dict[str, str]] = None,
+               cwd: Optional[str] = None) -> Tuple[int, bytes, bytes]:
+        """
+        Run one invocation, returning its exit status, output, and error output
+
+        'input' is either input that's already been read, or a binary stream to read it from
+        if the command takes input. See invocation_environment() for 'env' and 'cwd'
+        """
+        with self._lock, invocation_environment(env=env, cwd=cwd):
+            result = self._invoke(prog, argv, input)
+        return result
+
+    def _invoke(self, prog, argv, input) -> Tuple[int, bytes, bytes]:
+        stdout = io.BytesIO()
+        stderr = io.BytesIO()
+        text_stdout = io.StringIO()
+        text_stderr = io.StringIO()
+        try:
+            with redirect_stdout(text_stdout), redirect_stderr(text_stderr):
+                parser = self.arg_parser(prog)
+                mock_op_cmd = MockOP(arg_parser=parser,
+                                     directory_cache=self._directory_cache,
+                                     decompression_cache=self._decompression_cache,
+                                     vault_model_cache=self._vault_model_cache)
+                # We parse args in order to fail on args we don't understand,
+                # and to know whether the command takes input
+                parsed = parse_mock_op_args(argv)
+                if parsed is None:
+                    parsed = parser.parse_args(argv)
+                if not isinstance(input, MockOPCommandInput):
+                    if input is None:
+                        input = MockOPCommandInput(None)
+                    else:
+                        input = read_command_input(input, parsed, retain=mock_op_cmd.uses_vault_model)
+                exit_status = respond_handle_exceptions(
+                    mock_op_cmd, argv, input, stdout=stdout, stderr=stderr)
+        except SystemExit as e:
+            exit_status = e.code
+            if exit_status is None:
+                exit_status = 0
+        except Exception:
+            # emulate an uncaught exception in a stand-alone mock-op
+            text_stderr.write(traceback.format_exc())
+            exit_status = 1
+
+        out = text_stdout.getvalue().encode("utf-8") + stdout.getvalue()
+        err = text_stderr.getvalue().encode("utf-8") + stderr.getvalue()
+        return exit_status, out, err
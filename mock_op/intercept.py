@@ -0,0 +1,327 @@
+"""
+In-process interception of subprocess calls to 'op'
+
+Code under test that shells out to 'op' (e.g., via pyonepassword) normally pays for a
+fork & exec per query, even with mock-op-server. Within a MockOPInterceptor context,
+subprocess.Popen, and therefore subprocess.run(), check_output(), etc., answer calls to
+'op' directly via mock-op, without creating a process:
+
+    with MockOPInterceptor():
+        result = subprocess.run(["op", "--format", "json", "whoami"], capture_output=True)
+
+Exit status, output, and error output are the same as a stand-alone mock-op would produce,
+and the call's environment (or the process's, if none is given) provides MOCK_OP_* settings.
+Calls to anything else are passed through to the real subprocess.Popen.
+
+Processes started through asyncio aren't intercepted.
+"""
+import inspect
+import io
+import locale
+import os
+import subprocess
+import sys
+import threading
+from typing import Iterable, List, Optional
+
+from ._server_protocol import forwarded_env
+from .in_process import MockOPInvoker
+
+DEFAULT_EXECUTABLES = ["op", "mock-op"]
+
+_POPEN_SIGNATURE = inspect.signature(subprocess.Popen)
+
+
+class MockOPInterceptException(Exception):
+    pass
+
+
+def _write_fd(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+class _MockOPOutputPipe(io.BufferedIOBase):
+    """
+    The read end of an intercepted call's stdout or stderr pipe
+
+    Reading from it runs the call first, if it hasn't run yet
+    """
+
+    def __init__(self, process: "MockOPPopen"):
+        super().__init__()
+        self._process = process
+        self._buffer: Optional[io.BytesIO] = None
+
+    def _set_data(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    def _data(self) -> io.BytesIO:
+        if self._buffer is None:
+            self._process._run()
+        return self._buffer
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._data().read(size)
+
+    def read1(self, size=-1):
+        return self._data().read1(size)
+
+    def readline(self, size=-1):
+        return self._data().readline(size)
+
+
+class _MockOPInputPipe(io.BytesIO):
+    """
+    The write end of an intercepted call's stdin pipe
+
+    Closing it runs the call, just as closing a real process's stdin lets it finish reading
+    """
+
+    def __init__(self, process: "MockOPPopen"):
+        super().__init__()
+        self._process = process
+
+    def close(self):
+        if not self.closed:
+            data = self.getvalue()
+            super().close()
+            self._process._run(data)
+
+
+class MockOPPopen:
+    """
+    Stands in for a subprocess.Popen object for a call answered by mock-op
+
+    The call runs when its input is complete: right away unless stdin is a pipe, otherwise when
+    communicate() or wait() is called, or stdin is closed, or output is read
+    """
+
+    def __init__(self, interceptor: "MockOPInterceptor", argv: List[str], args, stdin=None, stdout=None,
+                 stderr=None, cwd=None, env=None, text=None, universal_newlines=None, encoding=None,
+                 errors=None, **kwargs):
+        self._interceptor = interceptor
+        self._argv = argv
+        self.args = args
+        self.pid = -1
+        self.returncode = None
+        self._cwd = os.fspath(cwd) if cwd is not None else None
+        self._env = env
+        self._stdin_dest = stdin
+        self._stdout_dest = stdout
+        self._stderr_dest = stderr
+        self._text_mode = bool(text or universal_newlines or encoding or errors)
+        self._encoding = encoding or locale.getpreferredencoding(False)
+        self._errors = errors or "strict"
+
+        self.stdin = None
+        self.stdout = None
+        self.stderr = None
+        if stdin == subprocess.PIPE:
+            self.stdin = self._wrap_pipe(_MockOPInputPipe(self))
+        if stdout == subprocess.PIPE:
+            self.stdout = self._wrap_pipe(_MockOPOutputPipe(self))
+        if stderr == subprocess.PIPE:
+            self.stderr = self._wrap_pipe(_MockOPOutputPipe(self))
+
+        if self.stdin is None:
+            self._run()
+
+    def _wrap_pipe(self, pipe):
+        if self._text_mode:
+            pipe = io.TextIOWrapper(pipe, encoding=self._encoding, errors=self._errors,
+                                    write_through=True)
+        return pipe
+
+    def _raw_pipe(self, pipe):
+        if isinstance(pipe, io.TextIOWrapper):
+            pipe = pipe.buffer
+        return pipe
+
+    def _input_stream(self, input: Optional[bytes]):
+        stdin = self._stdin_dest
+        stream = None
+        if input is not None:
+            stream = io.BytesIO(input)
+        elif isinstance(stdin, int) and stdin >= 0:
+            stream = os.fdopen(stdin, "rb", closefd=False)
+        elif stdin not in (None, subprocess.DEVNULL) and hasattr(stdin, "fileno"):
+            stream = os.fdopen(stdin.fileno(), "rb", closefd=False)
+        # an inherited stdin is treated as a terminal; the call's input is never ours to consume
+        return stream
+
+    def _run(self, input: Optional[bytes] = None):
+        if self.returncode is not None:
+            return
+        prog = os.path.basename(self._argv[0])
+        env = forwarded_env(self._env) if self._env is not None else None
+        exit_status, output, error_output = self._interceptor.invoke(
+            prog, self._argv[1:], self._input_stream(input), env=env, cwd=self._cwd)
+        if isinstance(exit_status, int):
+            # as the exit status of a real process would be, e.g., -1 -> 255
+            exit_status &= 0xFF
+        else:
+            # sys.exit() with a message
+            error_output += f"{exit_status}\n".encode("utf-8")
+            exit_status = 1
+
+        if self._stderr_dest == subprocess.STDOUT:
+            output += error_output
+            error_output = b""
+        self.returncode = exit_status
+
+        for dest, pipe, data, std_stream in [
+                (self._stdout_dest, self.stdout, output, sys.stdout),
+                (self._stderr_dest, self.stderr, error_output, sys.stderr)]:
+            if pipe is not None:
+                self._raw_pipe(pipe)._set_data(data)
+            else:
+                self._deliver(dest, data, std_stream)
+
+    def _deliver(self, dest, data: bytes, std_stream):
+        if not data or dest in (subprocess.DEVNULL, subprocess.STDOUT):
+            return
+        if dest is None:
+            std_stream.flush()
+            buffer = getattr(std_stream, "buffer", None)
+            if buffer is not None:
+                buffer.write(data)
+                buffer.flush()
+            else:
+                std_stream.write(data.decode(self._encoding, errors="replace"))
+        elif isinstance(dest, int):
+            _write_fd(dest, data)
+        else:
+            dest.flush()
+            _write_fd(dest.fileno(), data)
+
+    def _decode(self, data):
+        if data is not None and self._text_mode:
+            data = data.decode(self._encoding, errors=self._errors)
+        return data
+
+    def communicate(self, input=None, timeout=None):
+        if input is not None and self._text_mode and isinstance(input, str):
+            input = input.encode(self._encoding, errors=self._errors)
+        if self.stdin is not None and not self.stdin.closed:
+            if input:
+                self._raw_pipe(self.stdin).write(input)
+            self.stdin.close()
+        else:
+            self._run()
+
+        output = None
+        error_output = None
+        if self.stdout is not None:
+            output = self._raw_pipe(self.stdout).read()
+        if self.stderr is not None:
+            error_output = self._raw_pipe(self.stderr).read()
+        return self._decode(output), self._decode(error_output)
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is None:
+            if self.stdin is not None:
+                self.stdin.close()
+            else:
+                self._run()
+        return self.returncode
+
+    def send_signal(self, sig):
+        pass
+
+    def terminate(self):
+        pass
+
+    def kill(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, traceback):
+        for pipe in [self.stdout, self.stderr]:
+            if pipe is not None:
+                pipe.close()
+        if self.stdin is not None:
+            self.stdin.close()
+        self.wait()
+
+
+class MockOPInterceptor:
+    """
+    A context manager that answers subprocess calls to 'op' in-process using mock-op
+
+    'executables' are the program names to intercept, matched against the base name of the
+    first argument. Interceptors can't be nested
+    """
+    _active_lock = threading.Lock()
+    _active: Optional["MockOPInterceptor"] = None
+
+    def __init__(self, executables: Iterable[str] = DEFAULT_EXECUTABLES):
+        self._executables = set(executables)
+        self._invoker = MockOPInvoker()
+        self._saved_popen = None
+        self.calls: List[List[str]] = []
+
+    def intercepted_argv(self, args, shell=False, executable=None) -> Optional[List[str]]:
+        """
+        The argument list to answer with mock-op if a call to subprocess.Popen
+        should be intercepted, otherwise None
+        """
+        if shell:
+            return None
+        if isinstance(args, (str, bytes, os.PathLike)):
+            args = [args]
+        argv = [os.fsdecode(arg) for arg in args]
+        if not argv:
+            return None
+        program = os.fsdecode(executable) if executable is not None else argv[0]
+        if os.path.basename(program) not in self._executables:
+            return None
+        return argv
+
+    def invoke(self, prog, argv, input, env=None, cwd=None):
+        self.calls.append([prog] + argv)
+        return self._invoker.invoke(prog, argv, input, env=env, cwd=cwd)
+
+    def __enter__(self):
+        with self._active_lock:
+            if MockOPInterceptor._active is not None:
+                raise MockOPInterceptException("A mock-op interceptor is already active")
+            MockOPInterceptor._active = self
+
+        interceptor = self
+        real_popen = subprocess.Popen
+
+        class _InterceptingPopen(real_popen):
+            def __new__(cls, *popenargs, **kwargs):
+                if len(popenargs) == 1:
+                    # the usual case, and much cheaper than binding to Popen's signature
+                    popen_kwargs = dict(kwargs, args=popenargs[0])
+                else:
+                    popen_kwargs = _POPEN_SIGNATURE.bind(*popenargs, **kwargs).arguments
+                argv = interceptor.intercepted_argv(popen_kwargs["args"],
+                                                    shell=popen_kwargs.get("shell", False),
+                                                    executable=popen_kwargs.get("executable"))
+                if argv is not None:
+                    # not an instance of cls, so Popen.__init__() won't be called on it
+                    return MockOPPopen(interceptor, argv, **popen_kwargs)
+                return super().__new__(cls)
+
+        self._saved_popen = real_popen
+        subprocess.Popen = _InterceptingPopen
+        return self
+
+    def __exit__(self, exc_type, value, traceback):
+        subprocess.Popen = self._saved_popen
+        self._saved_popen = None
+        with self._active_lock:
+            MockOPInterceptor._active = None
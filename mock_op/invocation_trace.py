@@ -0,0 +1,163 @@
+"""
+Per-invocation timing traces
+
+If the MOCK_OP_PROFILE environment variable is set to a file path, each mock-op invocation
+appends one JSON record to that file, e.g.:
+
+    {"time": 1760745600.1, "pid": 4242, "argv": "--format|json|item|get|Example Login 1",
+     "input_hash": null, "response": "item-get-1", "exit_status": 0,
+     "output_bytes": 1137, "error_output_bytes": 0, "state_iteration": null,
+     "phases_ms": {"import": 41.2, "parse_args": 0.1, "read_input": 0.0, "load": 3.9,
+                   "lookup": 0.1, "write": 0.1}, "total_ms": 45.6}
+
+Phase times don't overlap: time spent, e.g., loading a response directory while refreshing
+state counts toward 'load', not 'state'. Records are appended with a single write to a file
+opened for appending, so concurrent mock-op processes can share a trace file.
+
+mock-op-trace-report summarizes one or more trace files.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from mock_cli.argv_conversion import argv_from_string
+
+PROFILE_ENV_NAME = "MOCK_OP_PROFILE"
+
+PHASE_IMPORT = "import"
+PHASE_PARSE_ARGS = "parse_args"
+PHASE_READ_INPUT = "read_input"
+PHASE_STATE = "state"
+PHASE_LOAD = "load"
+PHASE_LOOKUP = "lookup"
+PHASE_WRITE = "write"
+
+PERCENTILES = [50, 95, 99]
+
+
+def trace_path_from_env() -> Optional[str]:
+    return os.environ.get(PROFILE_ENV_NAME) or None
+
+
+class MockOPTrace:
+    """
+    Timings and details for a single invocation
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        if start is None:
+            start = time.perf_counter()
+        self._start = start
+        self._phases: Dict[str, float] = {}
+        # [name, start, time spent in nested phases]
+        self._stack: List[List] = []
+        self.fields: Dict[str, Any] = {}
+
+    def add_phase(self, name: str, elapsed: float):
+        self._phases[name] = self._phases.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def phase(self, name: str):
+        entry = [name, time.perf_counter(), 0.0]
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - entry[1]
+            self.add_phase(name, elapsed - entry[2])
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def record(self) -> Dict[str, Any]:
+        record = {
+            "time": time.time(),
+            "pid": os.getpid()
+        }
+        record.update(self.fields)
+        record["phases_ms"] = {name: elapsed * 1000 for name, elapsed in self._phases.items()}
+        record["total_ms"] = (time.perf_counter() - self._start) * 1000
+        return record
+
+    def write(self, trace_path: Union[str, os.PathLike]):
+        line = json.dumps(self.record()) + "\n"
+        fd = os.open(trace_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+
+def trace_phase(trace: Optional[MockOPTrace], name: str):
+    """
+    Time a phase if there's a trace, otherwise do nothing
+    """
+    if trace is None:
+        return nullcontext()
+    return trace.phase(name)
+
+
+def read_traces(trace_paths: Iterable[Union[str, os.PathLike]]) -> Iterator[Dict[str, Any]]:
+    for trace_path in trace_paths:
+        with open(trace_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # e.g., a line cut short by a process being killed
+                    continue
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    # nearest rank
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _percentile_stats(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    stats = {"count": len(values)}
+    for pct in PERCENTILES:
+        stats[f"p{pct}_ms"] = percentile(values, pct)
+    return stats
+
+
+def _command_key(record: Dict[str, Any], by: str) -> str:
+    argv_key = record.get("argv") or ""
+    if by == "argv":
+        return argv_key
+    # the subcommand, e.g., 'item get', without options or their values
+    from .command_listing import subcommand_words
+    words = subcommand_words(argv_from_string(argv_key)) if argv_key else None
+    if not words:
+        return "(other)"
+    return " ".join(words)
+
+
+def summarize_traces(records: Iterable[Dict[str, Any]], by: str = "subcommand") -> Dict[str, Any]:
+    """
+    p50/p95/p99 of each phase, and of each command's total time, across trace records
+
+    Commands are grouped 'by' subcommand, e.g., 'item get', or by their full argument list
+    """
+    phases: Dict[str, List[float]] = {}
+    commands: Dict[str, List[float]] = {}
+    totals = []
+    for record in records:
+        totals.append(record["total_ms"])
+        for name, elapsed in record.get("phases_ms", {}).items():
+            phases.setdefault(name, []).append(elapsed)
+        commands.setdefault(_command_key(record, by), []).append(record["total_ms"])
+
+    summary = {
+        "invocations": len(totals),
+        "total": _percentile_stats(totals) if totals else {},
+        "phases": {name: _percentile_stats(values) for name, values in phases.items()},
+        "commands": {key: _percentile_stats(values) for key, values in commands.items()}
+    }
+    return summary
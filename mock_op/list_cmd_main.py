@@ -1,24 +1,57 @@
+import json
 import os
+import sys
 from argparse import ArgumentParser
+from collections import Counter
 
-from mock_cli import ResponseDirectory, ResponseDirectoryException
+from mock_cli import ResponseDirectoryException
 from mock_cli.argv_conversion import arg_shlex_from_string
 
+from .command_listing import (
+    MockOPCommandEntry,
+    MockOPCommandFilter,
+    MockOPResponseSizer,
+    iter_commands
+)
 from .mock_op import MockOP
+from .response_directory import open_response_directory
 
 
 def parse_args():
-    parser = ArgumentParser()
+    parser = ArgumentParser(
+        description="List, and optionally filter, the commands in a response directory")
     parser.add_argument(
-        "--response-dir", help="Path to response directory JSON file")
+        "--response-dir", help="Path to response directory JSON file or compiled response index")
     parser.add_argument(
         "--verbose", help="Include additional command response detail", action="store_true")
 
+    filters = parser.add_argument_group("filters")
+    filters.add_argument(
+        "--subcommand", help="Only list commands for this subcommand, e.g., 'item get', or 'vault'")
+    filters.add_argument(
+        "--contains", help="Only list commands whose arguments, joined by spaces, contain this string")
+    filters.add_argument(
+        "--regex", help="Only list commands whose arguments, joined by spaces, match this regular expression")
+    filters.add_argument(
+        "--input-hash", help="Only list commands for this input hash. Use 'none' for commands that take no input")
+    filters.add_argument(
+        "--exit-status", type=int, action="append",
+        help="Only list commands with this exit status. May be given more than once")
+
+    output = parser.add_argument_group("output")
+    output.add_argument(
+        "--json", help="Print one JSON object per command (JSON Lines)", action="store_true")
+    output.add_argument(
+        "--sizes", help="Include the size of each command's stored output", action="store_true")
+    output.add_argument(
+        "--summary", help="Print counts and total response bytes instead of listing commands",
+        action="store_true")
+
     parsed = parser.parse_args()
     return parsed
 
 
-def print_command_verbose(response, command_string, response_dir):
+def print_command_verbose(response, command_string, response_dir, sizes=None):
     name = response["name"]
     out_path = os.path.join(response_dir, name, response["stdout"])
     err_path = os.path.join(response_dir, name, response["stderr"])
@@ -27,40 +60,110 @@ def print_command_verbose(response, command_string, response_dir):
     print(f"\toutput: {out_path}")
     print(f"\terror output: {err_path}")
     print(f"\texit status: {exit_status}")
+    if sizes is not None:
+        print(f"\toutput bytes: {sizes['output_bytes']}")
+        print(f"\terror output bytes: {sizes['error_output_bytes']}")
     print("")
 
 
+def _json_entry(entry: MockOPCommandEntry, command_string, sizes=None):
+    obj = {
+        "command": command_string,
+        "args": entry.argv,
+        "input_hash": entry.input_hash,
+        "response": entry.response
+    }
+    if sizes is not None:
+        obj.update(sizes)
+    return json.dumps(obj)
+
+
+def _summarize(entries, sizer: MockOPResponseSizer):
+    command_count = 0
+    input_hashes = set()
+    with_input_count = 0
+    exit_statuses = Counter()
+    response_bytes = 0
+    missing_count = 0
+    for entry in entries:
+        command_count += 1
+        if entry.input_hash:
+            with_input_count += 1
+            input_hashes.add(entry.input_hash)
+        exit_statuses[entry.response.get("exit_status")] += 1
+        for size in sizer.sizes(entry).values():
+            if size is None:
+                missing_count += 1
+            else:
+                response_bytes += size
+    summary = {
+        "commands": command_count,
+        "commands_with_input": with_input_count,
+        "input_hashes": len(input_hashes),
+        "exit_statuses": {str(status): count for status, count in sorted(exit_statuses.items())},
+        "response_bytes": response_bytes,
+        "missing_response_files": missing_count
+    }
+    return summary
+
+
 def main():
     parsed = parse_args()
     verbose = parsed.verbose
     if parsed.response_dir:
         respdir_json_file = parsed.response_dir
     else:
-        respdir_json_file = MockOP()._response_directory
+        respdir_json_file = MockOP().response_directory_path
 
     try:
-        directory = ResponseDirectory(respdir_json_file)
+        directory = open_response_directory(respdir_json_file)
     except ResponseDirectoryException as e:
         print(f"Error loading response directory: {e}")
         exit(1)
 
-    print(f"Directory path: {respdir_json_file}")
-    commands = directory.commands
-    response_dir = directory.response_dir
-    commands_with_input = directory.commands_with_input
-
-    for cmd, response in commands.items():
-        cmd_string = arg_shlex_from_string(cmd, popped_args=['op'])
-        if verbose:
-            print_command_verbose(response, cmd_string, response_dir)
-        else:
-            print(f"{cmd_string}")
-
-    for input_hash, input_dict in commands_with_input.items():
-        print(f"For input hash: {input_hash}:")
-        for cmd, response in input_dict.items():
-            cmd_string = arg_shlex_from_string(cmd, popped_args=['op'])
-        if verbose:
-            print_command_verbose(response, cmd_string, response_dir)
-        else:
-            print(f"{cmd_string}")
+    input_hash = parsed.input_hash
+    if input_hash == "none":
+        input_hash = ""
+    command_filter = MockOPCommandFilter(subcommand=parsed.subcommand,
+                                         contains=parsed.contains,
+                                         regex=parsed.regex,
+                                         input_hash=input_hash,
+                                         exit_status=parsed.exit_status)
+    entries = iter_commands(directory, command_filter)
+    sizer = None
+    if parsed.sizes or parsed.summary:
+        sizer = MockOPResponseSizer(directory)
+
+    try:
+        if parsed.summary:
+            summary = _summarize(entries, sizer)
+            if parsed.json:
+                print(json.dumps(summary))
+            else:
+                print(f"Directory path: {respdir_json_file}")
+                for key, value in summary.items():
+                    print(f"{key}: {value}")
+            return 0
+
+        response_dir = directory.response_dir
+        if not parsed.json:
+            print(f"Directory path: {respdir_json_file}")
+        last_input_hash = None
+        for entry in entries:
+            cmd_string = arg_shlex_from_string(entry.args, popped_args=['op'])
+            sizes = sizer.sizes(entry) if sizer is not None else None
+            if parsed.json:
+                print(_json_entry(entry, cmd_string, sizes=sizes))
+                continue
+            if entry.input_hash and entry.input_hash != last_input_hash:
+                print(f"For input hash: {entry.input_hash}:")
+            last_input_hash = entry.input_hash
+            if verbose:
+                print_command_verbose(entry.response, cmd_string, response_dir, sizes=sizes)
+            else:
+                print(f"{cmd_string}")
+    except BrokenPipeError:
+        # e.g., piped to 'head'; stop quietly, and don't complain again at exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    return 0
@@ -2,11 +2,27 @@
 import os
 import sys
 from pathlib import Path
-
-from mock_cli import MockCommand
-
-from .mock_op_argument_parser import mock_op_arg_parser
+from typing import Optional
+
+from mock_cli.argv_conversion import argv_to_string
+
+from .command_input import MockOPCommandInput, input_digest
+from .invocation_trace import (
+    PHASE_LOOKUP,
+    PHASE_WRITE,
+    MockOPTrace,
+    trace_path_from_env,
+    trace_phase
+)
+from .mock_op_arg_validator import parse_mock_op_args
+from .mock_op_command import MockOPCommand
 from .signin_responses import MockOPSigninResponse
+from .vault_model import (
+    VAULT_MODEL_ENV_NAME,
+    VAULT_MODEL_STATE_ENV_NAME,
+    MockOPVaultModelCache,
+    vault_model_respond
+)
 
 RESPONSE_DIRECTORY_PATH = Path(
     Path.home(), ".config", "mock-op", "response-directory.json")
@@ -16,8 +32,12 @@ SIGNIN_SUCCESS_ENV_NAME = "MOCK_OP_SIGNIN_SUCCEED"
 SIGNIN_ACCOUNT_ENV_NAME = "MOCK_OP_SIGNIN_ACCOUNT"
 USES_BIO_ENV_NAME = "MOCK_OP_SIGNIN_USES_BIO"
 STATE_DIR_ENV_NAME = "MOCK_OP_STATE_DIR"
+STATE_SESSION_ENV_NAME = "MOCK_OP_STATE_SESSION"
 CLI_VER_ENV_NAME = "MOCK_OP_CLI_VER"
 
+# what invocation traces record as the response for answers from a vault model
+VAULT_MODEL_RESPONSE_NAME = "(vault model)"
+
 
 class MockOPSigninException(Exception):
     pass
@@ -27,11 +47,21 @@ class MockOP:
     SIGNIN_CMD = "signin"
     VERSION_OPTIONS = ["--version", "-v"]
 
-    def __init__(self, arg_parser=None, response_directory=None):
-        if arg_parser is None:
-            arg_parser = mock_op_arg_parser()
+    def __init__(self, arg_parser=None, response_directory=None, directory_cache=None, decompression_cache=None,
+                 trace=None, vault_model_cache: Optional[MockOPVaultModelCache] = None):
+        # if no argument parser is provided, the default one is built on first use,
+        # and only if the default parser's validation table can't vouch for the arguments
         self._arg_parser = arg_parser
+        self._default_arg_parser = arg_parser is None
+        self._directory_cache = directory_cache
+        self._decompression_cache = decompression_cache
+        # if a trace is provided, whoever provided it records it
+        self._trace = trace
         self._state_dir = os.environ.get(STATE_DIR_ENV_NAME)
+        self._state_session = os.environ.get(STATE_SESSION_ENV_NAME)
+        self._vault_model = os.environ.get(VAULT_MODEL_ENV_NAME)
+        self._vault_model_state = os.environ.get(VAULT_MODEL_STATE_ENV_NAME)
+        self._vault_model_cache = vault_model_cache
 
         if response_directory is None:
             response_directory = os.environ.get(RESP_DIR_ENV_NAME)
@@ -44,11 +74,40 @@ class MockOP:
     def response_directory_path(self):
         return self._response_directory
 
+    @property
+    def uses_vault_model(self) -> bool:
+        return bool(self._vault_model)
+
+    @property
+    def arg_parser(self):
+        if self._arg_parser is None:
+            # building the parser tree is only needed for arguments the table can't vouch for
+            from .mock_op_argument_parser import mock_op_arg_parser
+            self._arg_parser = mock_op_arg_parser()
+        return self._arg_parser
+
+    def _validate_args(self, argv):
+        parsed = None
+        if self._default_arg_parser:
+            parsed = parse_mock_op_args(argv)
+        return parsed
+
     def parse_args(self, argv=None):
         if argv is None:
-            parsed = self._arg_parser.parse_args()
-        else:
-            parsed = self._arg_parser.parse_args(argv)
+            argv = sys.argv[1:]
+        parsed = self._validate_args(argv)
+        if parsed is None:
+            parsed = self.arg_parser.parse_args(argv)
+        return parsed
+
+    def parse_known_args(self, argv=None):
+        if argv is None:
+            argv = sys.argv[1:]
+        parsed = self._validate_args(argv)
+        if parsed is None:
+            # returns a two item tuple containing the populated
+            # namespace and the list of remaining argument strings
+            parsed = self.arg_parser.parse_known_args(argv)[0]
         return parsed
 
     def _uses_bio(self):
@@ -64,15 +123,11 @@ class MockOP:
             raise Exception(f"unknown uses_bio value {uses_bio}")
         return uses_bio
 
-    def _handle_signin(self, args):
+    def _handle_signin(self, args, stdout=None, stderr=None):
         signin_success = False
         signin_success_val: str | None = os.environ.get(
             SIGNIN_SUCCESS_ENV_NAME)
-        parser = mock_op_arg_parser()
-
-        # returns a two item tuple containing the populated
-        # namespace and the list of remaining argument strings
-        parsed = parser.parse_known_args(args)[0]
+        parsed = self.parse_known_args(args)
         raw = parsed.raw
         if parsed.account:
             account = parsed.account
@@ -94,7 +149,7 @@ class MockOP:
             raise MockOPSigninException("No account identifier provided")
 
         response = MockOPSigninResponse(
-            account, signin_success=signin_success, raw=raw)
+            account, signin_success=signin_success, raw=raw, stdout=stdout, stderr=stderr)
         exit_status = response.respond([])
         return exit_status
 
@@ -112,16 +167,82 @@ class MockOP:
                     break
         return (cli_ver_output, exit_status)
 
-    def respond(self, args, input):
+    def _respond_from_vault_model(self, args, input, stdout, stderr, trace) -> Optional[int]:
+        # None if the vault model can't answer, and the response directory should
+        if isinstance(input, MockOPCommandInput):
+            input = input.data
+        elif isinstance(input, str):
+            input = input.encode("utf-8")
+        with trace_phase(trace, PHASE_LOOKUP):
+            response = vault_model_respond(self._vault_model, args, input=input,
+                                           state_path=self._vault_model_state,
+                                           cache=self._vault_model_cache)
+        if response is None:
+            return None
+        if trace is not None:
+            trace.fields["response"] = VAULT_MODEL_RESPONSE_NAME
+        with trace_phase(trace, PHASE_WRITE):
+            for handle, stream, output in [(stdout, sys.stdout, response.output),
+                                           (stderr, sys.stderr, response.error_output)]:
+                if not output:
+                    continue
+                if handle is None:
+                    MockOPCommand.write_binary_output(stream, output)
+                else:
+                    handle.write(output)
+        return response.exit_status
+
+    def respond(self, args, input, stdout=None, stderr=None):
+        """
+        Look up and play back the response for the given argument list and input
+
+        If 'stdout' and/or 'stderr' binary output handles are provided, response
+        output is written to them rather than to the process's stdout & stderr
+
+        If MOCK_OP_PROFILE is set, and no trace was provided, a trace of this invocation
+        is appended to the file it names
+        """
+        trace = self._trace
+        trace_path = None
+        if trace is None:
+            trace_path = trace_path_from_env()
+            if trace_path:
+                trace = MockOPTrace()
+        if trace is not None:
+            trace.fields.update({"argv": argv_to_string(args), "input_hash": input_digest(input)})
+
+        exit_status = None
+        try:
+            exit_status = self._respond(args, input, stdout=stdout, stderr=stderr, trace=trace)
+        finally:
+            if trace_path:
+                trace.fields["exit_status"] = exit_status
+                trace.write(trace_path)
+        return exit_status
+
+    def _respond(self, args, input, stdout=None, stderr=None, trace=None):
         if self.SIGNIN_CMD in args:
-            exit_status = self._handle_signin(args)
+            exit_status = self._handle_signin(args, stdout=stdout, stderr=stderr)
         else:
             version_override, exit_status = self._cli_version_override(args)
             if version_override:
-                MockCommand.write_binary_output(sys.stdout, version_override)
+                if stdout is None:
+                    MockOPCommand.write_binary_output(sys.stdout, version_override)
+                else:
+                    stdout.write(version_override)
             else:
-                cmd = MockCommand(
-                    response_directory=self._response_directory, state_dir=self._state_dir)
-                exit_status = cmd.respond(args, input=input)
+                exit_status = None
+                if self._vault_model:
+                    exit_status = self._respond_from_vault_model(args, input, stdout, stderr, trace)
+                if exit_status is None:
+                    cmd = MockOPCommand(response_directory=self._response_directory,
+                                        state_dir=self._state_dir,
+                                        state_session=self._state_session,
+                                        stdout=stdout,
+                                        stderr=stderr,
+                                        directory_cache=self._directory_cache,
+                                        decompression_cache=self._decompression_cache,
+                                        trace=trace)
+                    exit_status = cmd.respond(args, input=input)
 
         return exit_status
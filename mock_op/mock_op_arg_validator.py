@@ -0,0 +1,494 @@
+"""
+A compact, table-driven stand-in for mock-op's argparse parser tree
+
+Building the full argparse tree on every invocation just to reject arguments we
+don't understand is a significant part of mock-op's start-up time. Instead, the
+tree is compiled into a JSON validation table that can check an argument list in
+a single pass.
+
+The validator is deliberately conservative: it only ever *accepts* an argument list
+that argparse would also accept, producing the same namespace. Anything it isn't
+certain about (unknown or abbreviated options, '--', help options, missing or
+surplus arguments, invalid choices, etc.) is handed back to the caller, who should
+then fall back to argparse. That way usage and error messages always come from
+argparse itself.
+
+The same table defines a canonical form for argument lists, so equivalent invocations
+(options in a different order, '--opt=value' rather than '--opt value', short rather than
+long options, global options after the subcommand as op allows) share one recorded response.
+See MockOPArgValidator.canonical_args().
+
+The table is compiled ahead of time and stored in the package's config directory. After
+changing mock_op_argument_parser.py, recompile it with:
+
+    python -m mock_op.mock_op_arg_validator
+
+Until then, mock-op notices the table is out of date and compiles it in memory each time
+it runs, which is slower but never writes to the installed package.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from argparse import Namespace
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ARG_TABLE_FORMAT_VERSION = 1
+
+_PKG_DIR = Path(__file__).parent
+ARG_PARSER_SOURCE_PATH = Path(_PKG_DIR, "mock_op_argument_parser.py")
+ARG_TABLE_PATH = Path(_PKG_DIR, "config", "arg-table.json")
+
+# argparse's nargs value for subparsers, argparse.PARSER
+_NARGS_PARSER = "A..."
+_NARGS_OPTIONAL = "?"
+
+
+class MockOPArgTableException(Exception):
+    pass
+
+
+def _action_default(action):
+    from argparse import SUPPRESS
+    if action.dest == SUPPRESS or action.default == SUPPRESS:
+        return (False, None)
+    return (True, action.default)
+
+
+def _compile_node(parser) -> Dict:
+    from argparse import (
+        _HelpAction,
+        _StoreAction,
+        _StoreConstAction,
+        _SubParsersAction
+    )
+    node = {
+        "supported": True,
+        "defaults": {},
+        "options": {},
+        "required_options": [],
+        "positionals": [],
+        "subparsers": None
+    }
+    if parser._mutually_exclusive_groups or parser.fromfile_prefix_chars is not None:
+        node["supported"] = False
+    if parser.prefix_chars != "-":
+        node["supported"] = False
+
+    for action in parser._actions:
+        if isinstance(action, _HelpAction):
+            # leave help options out of the table altogether,
+            # so they are always handled by argparse
+            continue
+
+        has_default, default = _action_default(action)
+        if has_default:
+            node["defaults"][action.dest] = default
+
+        if action.type is not None:
+            node["supported"] = False
+            continue
+
+        if isinstance(action, _SubParsersAction):
+            parsers = {}
+            for name, subparser in action.choices.items():
+                parsers[name] = _compile_node(subparser)
+            node["subparsers"] = {
+                "dest": action.dest,
+                "required": action.required,
+                "parsers": parsers
+            }
+            node["positionals"].append({"dest": action.dest,
+                                        "nargs": _NARGS_PARSER,
+                                        "choices": None})
+            continue
+
+        choices = list(action.choices) if action.choices is not None else None
+        if action.option_strings:
+            if type(action) is _StoreAction and action.nargs is None:
+                entry = {"dest": action.dest, "nargs": 1, "choices": choices}
+            elif isinstance(action, _StoreConstAction):
+                # also covers store_true & store_false
+                entry = {"dest": action.dest, "nargs": 0, "const": action.const}
+            else:
+                node["supported"] = False
+                continue
+            for option_string in action.option_strings:
+                node["options"][option_string] = entry
+            if action.required:
+                node["required_options"].append(action.dest)
+        else:
+            if type(action) is _StoreAction and action.nargs in [None, _NARGS_OPTIONAL]:
+                node["positionals"].append({"dest": action.dest,
+                                            "nargs": action.nargs,
+                                            "choices": choices})
+            else:
+                node["supported"] = False
+
+    # subparsers must be the final positional, and can't follow an optional positional
+    positionals = node["positionals"]
+    for i, positional in enumerate(positionals):
+        if positional["nargs"] == _NARGS_PARSER:
+            if i != len(positionals) - 1:
+                node["supported"] = False
+            if any(p["nargs"] == _NARGS_OPTIONAL for p in positionals[:i]):
+                node["supported"] = False
+
+    return node
+
+
+def arg_parser_source_digest() -> str:
+    source = ARG_PARSER_SOURCE_PATH.read_bytes()
+    digest = hashlib.md5(source).hexdigest()
+    return digest
+
+
+def compile_arg_table(parser=None) -> Dict:
+    """
+    Compile an argparse parser tree into a validation table
+
+    If no parser is provided, mock-op's default parser is used
+    """
+    if parser is None:
+        from .mock_op_argument_parser import mock_op_arg_parser
+        parser = mock_op_arg_parser()
+    table = {
+        "format-version": ARG_TABLE_FORMAT_VERSION,
+        "source-digest": arg_parser_source_digest(),
+        "parser": _compile_node(parser)
+    }
+    return table
+
+
+def save_arg_table(table: Dict, table_path=ARG_TABLE_PATH):
+    table_path = Path(table_path)
+    table_path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temp file & rename, so a concurrent reader never sees a partial table
+    fd, tmp_path = tempfile.mkstemp(dir=table_path.parent, prefix=".arg-table-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(table, f, indent=2)
+            f.write("\n")
+        os.replace(tmp_path, table_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_arg_table(table_path=ARG_TABLE_PATH) -> Dict:
+    """
+    Load the validation table for mock-op's default parser, recompiling it in memory
+    if it's missing or out of date. Only save_arg_table() writes the table
+    """
+    table = None
+    try:
+        with open(table_path, "r") as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if (table is None
+            or table.get("format-version") != ARG_TABLE_FORMAT_VERSION
+            or table.get("source-digest") != arg_parser_source_digest()):
+        # the package may be installed read-only, or in use by other processes,
+        # so leave saving to the explicit compile step
+        table = compile_arg_table()
+    return table
+
+
+class MockOPArgValidator:
+
+    def __init__(self, table: Dict):
+        self._root = table["parser"]
+
+    def parse_args(self, argv: List[str]) -> Optional[Namespace]:
+        """
+        Validate an argument list against the table
+
+        Returns a namespace identical to the one argparse would produce if the argument list
+        is definitely valid, and None if argparse should be consulted instead
+        """
+        values = self._parse_node(self._root, list(argv))
+        if values is None:
+            return None
+        return Namespace(**values)
+
+    def _parse_node(self, node, args) -> Optional[Dict]:
+        if not node["supported"]:
+            return None
+
+        values = dict(node["defaults"])
+        options = node["options"]
+        positionals = node["positionals"]
+        has_optional_positional = any(
+            p["nargs"] == _NARGS_OPTIONAL for p in positionals)
+        seen_options = set()
+        pos_index = 0
+        positional_runs = 0
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg.startswith("-") and arg != "-":
+                option_string = arg
+                explicit_arg = None
+                if option_string not in options and "=" in option_string:
+                    option_string, explicit_arg = option_string.split("=", 1)
+                option = options.get(option_string)
+                if option is None:
+                    # unknown, abbreviated, help, '--', negative number, etc.
+                    return None
+                if option["nargs"] == 0:
+                    if explicit_arg is not None:
+                        return None
+                    value = option["const"]
+                    i += 1
+                else:
+                    if explicit_arg is None:
+                        if i + 1 >= len(args):
+                            return None
+                        value = args[i + 1]
+                        if value.startswith("-") and value != "-":
+                            return None
+                        i += 2
+                    else:
+                        if explicit_arg == "--":
+                            # argparse strips '--' even from '--opt=--', differently between Python versions
+                            return None
+                        value = explicit_arg
+                        i += 1
+                    if option["choices"] is not None and value not in option["choices"]:
+                        return None
+                values[option["dest"]] = value
+                seen_options.add(option["dest"])
+                continue
+
+            # a run of one or more positional arguments
+            positional_runs += 1
+            if has_optional_positional and positional_runs > 1:
+                # argparse's handling of optional positionals split up by
+                # options is subtle and has changed between Python versions
+                return None
+            while i < len(args) and not (args[i].startswith("-") and args[i] != "-"):
+                if pos_index >= len(positionals):
+                    # surplus arguments
+                    return None
+                positional = positionals[pos_index]
+                pos_index += 1
+                arg = args[i]
+                if positional["nargs"] == _NARGS_PARSER:
+                    subparsers = node["subparsers"]
+                    subnode = subparsers["parsers"].get(arg)
+                    if subnode is None:
+                        return None
+                    values[subparsers["dest"]] = arg
+                    # everything that remains belongs to the subcommand
+                    subvalues = self._parse_node(subnode, args[i + 1:])
+                    if subvalues is None:
+                        return None
+                    values.update(subvalues)
+                    i = len(args)
+                    break
+                if positional["choices"] is not None and arg not in positional["choices"]:
+                    return None
+                values[positional["dest"]] = arg
+                i += 1
+
+        for positional in positionals[pos_index:]:
+            if positional["nargs"] is None:
+                return None
+            if positional["nargs"] == _NARGS_PARSER and node["subparsers"]["required"]:
+                return None
+
+        for dest in node["required_options"]:
+            if dest not in seen_options:
+                return None
+
+        return values
+
+    def canonical_args(self, argv: List[str]) -> Optional[List[str]]:
+        """
+        The canonical form of an argument list, or None if it can't be validated
+
+        At each level of the parser tree, positional arguments come first, then options sorted
+        by their long name, each given as separate '--option value' arguments, and then the
+        subcommand. Options that belong to a parent command, e.g., '--format', are moved up to
+        it, wherever they appear. An option given more than once keeps its last value, as
+        with argparse
+        """
+        levels: List[Tuple[Dict, Dict]] = []
+        if not self._canonical_node(self._root, list(argv), levels):
+            return None
+
+        canonical = []
+        for node, found in levels:
+            for dest in node["required_options"]:
+                if dest not in found["options"]:
+                    return None
+            canonical.extend(found["positionals"])
+            for option_args in sorted(found["options"].values()):
+                canonical.extend(option_args)
+            if found["subcommand"] is not None:
+                canonical.append(found["subcommand"])
+        return canonical
+
+    def _canonical_node(self, node, args, levels) -> bool:
+        # the same walk as _parse_node(), but recording arguments rather than values
+        if not node["supported"]:
+            return False
+
+        found = {"options": {}, "positionals": [], "subcommand": None}
+        levels.append((node, found))
+        positionals = node["positionals"]
+        has_optional_positional = any(
+            p["nargs"] == _NARGS_OPTIONAL for p in positionals)
+        pos_index = 0
+        positional_runs = 0
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg.startswith("-") and arg != "-":
+                owner = _option_owner(levels, arg)
+                explicit_arg = None
+                if owner is None and "=" in arg:
+                    arg, explicit_arg = arg.split("=", 1)
+                    owner = _option_owner(levels, arg)
+                if owner is None:
+                    return False
+                owner_node, owner_found = owner
+                option = owner_node["options"][arg]
+                option_args = [_long_option_string(owner_node, option["dest"])]
+                if option["nargs"] == 0:
+                    if explicit_arg is not None:
+                        return False
+                    i += 1
+                else:
+                    if explicit_arg is None:
+                        if i + 1 >= len(args):
+                            return False
+                        value = args[i + 1]
+                        if value.startswith("-") and value != "-":
+                            return False
+                        i += 2
+                    else:
+                        if explicit_arg == "--":
+                            return False
+                        value = explicit_arg
+                        i += 1
+                    if option["choices"] is not None and value not in option["choices"]:
+                        return False
+                    if value.startswith("-") and value != "-":
+                        # only parseable attached to its option
+                        option_args = [f"{option_args[0]}={value}"]
+                    else:
+                        option_args.append(value)
+                owner_found["options"][option["dest"]] = option_args
+                continue
+
+            positional_runs += 1
+            if has_optional_positional and positional_runs > 1:
+                return False
+            while i < len(args) and not (args[i].startswith("-") and args[i] != "-"):
+                if pos_index >= len(positionals):
+                    return False
+                positional = positionals[pos_index]
+                pos_index += 1
+                arg = args[i]
+                if positional["nargs"] == _NARGS_PARSER:
+                    subnode = node["subparsers"]["parsers"].get(arg)
+                    if subnode is None:
+                        return False
+                    found["subcommand"] = arg
+                    return self._canonical_node(subnode, args[i + 1:], levels)
+                if positional["choices"] is not None and arg not in positional["choices"]:
+                    return False
+                found["positionals"].append(arg)
+                i += 1
+
+        for positional in positionals[pos_index:]:
+            if positional["nargs"] is None:
+                return False
+            if positional["nargs"] == _NARGS_PARSER and node["subparsers"]["required"]:
+                return False
+        return True
+
+    def subcommand_path(self, argv: List[str]) -> Optional[List[str]]:
+        """
+        The command & subcommand names of an argument list, e.g., ['item', 'get'], without
+        validating anything after them. None if there aren't any
+        """
+        levels = [self._root]
+        path = []
+        i = 0
+        while i < len(argv):
+            node = levels[-1]
+            if node["subparsers"] is None:
+                break
+            arg = argv[i]
+            if arg.startswith("-") and arg != "-":
+                option_string, has_value, _ = arg.partition("=")
+                owner = _option_owner([(level, None) for level in levels], option_string)
+                if owner is None:
+                    return None
+                takes_value = owner[0]["options"][option_string]["nargs"] != 0
+                i += 2 if takes_value and not has_value else 1
+                continue
+            subnode = node["subparsers"]["parsers"].get(arg)
+            if subnode is None:
+                return None
+            levels.append(subnode)
+            path.append(arg)
+            i += 1
+        return path or None
+
+
+def _option_owner(levels, option_string) -> Optional[Tuple[Dict, Dict]]:
+    # the nearest command, starting with the current one, that has the option
+    for node, found in reversed(levels):
+        if option_string in node["options"]:
+            return node, found
+    return None
+
+
+def _long_option_string(node, dest) -> str:
+    option_strings = [option_string for option_string, option in node["options"].items()
+                      if option["dest"] == dest]
+    # e.g., '--raw' rather than '-r'
+    return min(option_strings, key=lambda option_string: (not option_string.startswith("--"), option_string))
+
+
+_validator = None
+
+
+def mock_op_arg_validator() -> MockOPArgValidator:
+    global _validator
+    if _validator is None:
+        _validator = MockOPArgValidator(load_arg_table())
+    return _validator
+
+
+def canonical_argv(argv: List[str]) -> Optional[List[str]]:
+    """
+    The canonical form of an argument list according to mock-op's default parser,
+    or None if it can't be validated
+    """
+    return mock_op_arg_validator().canonical_args(argv)
+
+
+def parse_mock_op_args(argv: List[str]) -> Optional[Namespace]:
+    """
+    Validate an argument list with mock-op's default parser, also accepting global options
+    after the subcommand, as op does. Returns None if argparse should be consulted instead
+    """
+    validator = mock_op_arg_validator()
+    parsed = validator.parse_args(argv)
+    if parsed is None:
+        canonical = validator.canonical_args(argv)
+        if canonical is not None:
+            parsed = validator.parse_args(canonical)
+    return parsed
+
+
+if __name__ == "__main__":
+    save_arg_table(compile_arg_table())
+    print(f"Wrote {ARG_TABLE_PATH}")
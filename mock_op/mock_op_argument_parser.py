@@ -254,8 +254,8 @@ def arg_subparser_account(subparsers: _SubParsersAction):
         "list", help="List users and accounts set up on this device")
 
 
-def mock_op_arg_parser() -> ArgumentParser:
-    parser = ArgumentParser()
+def mock_op_arg_parser(prog=None) -> ArgumentParser:
+    parser = ArgumentParser(prog=prog)
     parser.add_argument("--account", metavar="account",
                         help="use the account with this identifier")
     parser.add_argument(
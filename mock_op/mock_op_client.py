@@ -0,0 +1,83 @@
+import os
+import socket
+import sys
+
+from ._server_protocol import (
+    SERVER_SOCKET_ENV_NAME,
+    forwarded_env,
+    recv_message,
+    send_message
+)
+from .command_input import read_command_input
+from .mock_op_arg_validator import parse_mock_op_args
+
+# mirror mock_op_main and vault_model, but we don't want to import them unless we have to
+READ_INPUT_FILE_ENV_NAME = "MOCK_OP_READ_INPUT_FILE"
+VAULT_MODEL_ENV_NAME = "MOCK_OP_VAULT_MODEL"
+
+
+def _connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        sock = None
+    return sock
+
+
+def _read_input(parsed):
+    # looking up a recorded response only needs the input's digest, so hash it here, but a
+    # vault model needs the input itself, e.g., the items 'item delete -' is given
+    retain = bool(os.environ.get(VAULT_MODEL_ENV_NAME))
+    input_file = os.environ.get(READ_INPUT_FILE_ENV_NAME)
+    if input_file:
+        with open(input_file, "rb") as f:
+            input = read_command_input(f, parsed, retain=retain)
+    else:
+        input = read_command_input(sys.stdin.buffer, parsed, retain=retain)
+    return input
+
+
+def _write(stream, data):
+    if data:
+        stream.buffer.write(data)
+        stream.buffer.flush()
+
+
+def main():
+    sock = None
+    parsed = None
+    socket_path = os.environ.get(SERVER_SOCKET_ENV_NAME)
+    if socket_path:
+        # we need to know whether the command takes input before reading any, but leave
+        # anything the argument table can't vouch for to argparse
+        parsed = parse_mock_op_args(sys.argv[1:])
+        if parsed is not None:
+            sock = _connect(socket_path)
+
+    if sock is None:
+        # no server to talk to, so fall back to answering in-process
+        from .mock_op_main import main as mock_op_main
+        return mock_op_main()
+
+    input = _read_input(parsed)
+    request = {
+        "prog": os.path.basename(sys.argv[0]),
+        "argv": sys.argv[1:],
+        "cwd": os.getcwd(),
+        "env": forwarded_env(),
+        "input_hash": input.digest
+    }
+    with sock:
+        send_message(sock, request, input.data)
+        reply, payload = recv_message(sock)
+
+    stdout_len = reply["stdout_length"]
+    _write(sys.stdout, payload[:stdout_len])
+    _write(sys.stderr, payload[stdout_len:])
+    return reply["exit_status"]
+
+
+if __name__ == "__main__":
+    main()
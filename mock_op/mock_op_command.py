@@ -0,0 +1,184 @@
+import sys
+from pathlib import Path
+from typing import IO, Optional, Tuple
+
+from mock_cli import MockCommand, ResponseReadException
+from mock_cli.mock_cmd_state import MockCMDStateNoDirectoryException
+
+from .blob_store import response_blob_store
+from .command_input import input_digest
+from .command_response import MockOPCommandResponse
+from .compression import MockOPCompressionException, MockOPDecompressionCache
+from .invocation_trace import (
+    PHASE_LOAD,
+    PHASE_LOOKUP,
+    PHASE_STATE,
+    PHASE_WRITE,
+    MockOPTrace,
+    trace_phase
+)
+from .output_stream import OutputSource, close_source, write_output
+from .response_directory import (
+    MockOPResponseDirectoryCache,
+    open_response_directory,
+    response_lookup_digest
+)
+from .response_pack import MockOPPackedCommandResponse, open_response_pack
+from .state import MockOPState
+
+
+class MockOPCommand(MockCommand):
+    """
+    A MockCommand that can write its responses to arbitrary binary output handles
+    rather than only to the process's stdout & stderr, and that can optionally share
+    already loaded response directories via a response directory cache
+
+    Recorded output is streamed from disk (or from a response pack) to its destination
+    rather than being read into memory first
+    """
+
+    def __init__(self,
+                 response_directory=None,
+                 state_dir=None,
+                 state_session: Optional[str] = None,
+                 stdout: Optional[IO[bytes]] = None,
+                 stderr: Optional[IO[bytes]] = None,
+                 directory_cache: Optional[MockOPResponseDirectoryCache] = None,
+                 decompression_cache: Optional[MockOPDecompressionCache] = None,
+                 trace: Optional[MockOPTrace] = None):
+        # these need to be set before calling the superclass's constructor,
+        # since it will call _get_response_directory()
+        self._stdout = stdout
+        self._stderr = stderr
+        self._directory_cache = directory_cache
+        self._decompression_cache = decompression_cache
+        self._state_session = state_session
+        self._trace = trace
+        super().__init__(response_directory=response_directory, state_dir=state_dir)
+
+    def _get_response_directory(self, response_directory):
+        if response_directory is None:
+            if self._mock_cmd_state:
+                response_directory = self._mock_cmd_state.response_directory_path()
+
+        if isinstance(response_directory, (str, Path)):
+            with trace_phase(self._trace, PHASE_LOAD):
+                if self._directory_cache is not None:
+                    response_directory = self._directory_cache.get(response_directory)
+                else:
+                    response_directory = open_response_directory(response_directory)
+
+        return super()._get_response_directory(response_directory)
+
+    def _write_stdout(self, source: OutputSource) -> int:
+        handle = self._stdout
+        if handle is None:
+            handle = sys.stdout
+        return write_output(handle, source)
+
+    def _write_stderr(self, source: OutputSource) -> int:
+        handle = self._stderr
+        if handle is None:
+            handle = sys.stderr
+        return write_output(handle, source)
+
+    def get_response(self, args, input=None) -> MockOPCommandResponse:
+        with trace_phase(self._trace, PHASE_LOOKUP):
+            response = self._get_response(args, input=input)
+        return response
+
+    def _get_response(self, args, input=None) -> MockOPCommandResponse:
+        # input may already have been hashed as it was read
+        response = response_lookup_digest(
+            self.response_directory, args, input_digest(input))
+        response_dir = response.response_dir
+        blob_store = response_blob_store(self.response_directory)
+        pack = None
+        if response_dir is not None:
+            pack = open_response_pack(response_dir)
+        if pack is not None:
+            response = MockOPPackedCommandResponse(
+                response, response_dir, pack, blob_store=blob_store,
+                decompression_cache=self._decompression_cache)
+        else:
+            response = MockOPCommandResponse(
+                response, response_dir, blob_store=blob_store,
+                decompression_cache=self._decompression_cache)
+        return response
+
+    def _get_mock_cmd_state(self, state_dir):
+        try:
+            with trace_phase(self._trace, PHASE_STATE):
+                cmd_state = MockOPState(state_dir=state_dir, session=self._state_session)
+        except MockCMDStateNoDirectoryException:
+            cmd_state = None
+        return cmd_state
+
+    def _refresh_state(self):
+        # another process may have advanced the state since we loaded it
+        with trace_phase(self._trace, PHASE_STATE):
+            if self._mock_cmd_state.refresh():
+                self.response_directory = self._get_response_directory(None)
+
+    def _iterate_state(self):
+        with trace_phase(self._trace, PHASE_STATE):
+            super()._iterate_state()
+
+    def _open_response(self, response: MockOPCommandResponse) -> Tuple[OutputSource, OutputSource]:
+        # open both before writing anything, so a missing error output file
+        # doesn't leave a partial response written
+        output = None
+        try:
+            with trace_phase(self._trace, PHASE_LOOKUP):
+                output = response.open_output()
+                error_output = response.open_error_output()
+        except (FileNotFoundError, PermissionError, OSError, MockOPCompressionException) as err:
+            if output is not None:
+                close_source(output)
+            err_msg = f"Response couldn't be read {err}"
+            raise ResponseReadException(err_msg)
+        return output, error_output
+
+    def _respond_with_state(self, args, input=None):
+        state = self._mock_cmd_state
+        # most responses don't change state, so look them up holding only a shared lock,
+        # then look again, holding an exclusive lock, if the response changes state
+        with state.lock():
+            self._refresh_state()
+            response = self.get_response(args, input=input)
+            iteration = state.iteration
+        if not response.changes_state:
+            self._trace_field("state_iteration", iteration)
+            return response, self._open_response(response)
+
+        with state.lock(exclusive=True):
+            self._refresh_state()
+            response = self.get_response(args, input=input)
+            self._trace_field("state_iteration", state.iteration)
+            sources = self._open_response(response)
+            if response.changes_state:
+                self._iterate_state()
+        return response, sources
+
+    def respond(self, args, input=None) -> int:
+        if self._mock_cmd_state is None:
+            response = self.get_response(args, input=input)
+            output, error_output = self._open_response(response)
+        else:
+            response, (output, error_output) = self._respond_with_state(args, input=input)
+
+        with trace_phase(self._trace, PHASE_WRITE):
+            output_bytes = self._write_stdout(output)
+            error_output_bytes = self._write_stderr(error_output)
+        if self._trace is not None:
+            self._trace.fields.update({
+                "response": response.get("name"),
+                "output_bytes": output_bytes,
+                "error_output_bytes": error_output_bytes
+            })
+
+        return response.return_code
+
+    def _trace_field(self, name, value):
+        if self._trace is not None:
+            self._trace.fields[name] = value
@@ -1,8 +1,6 @@
 import os
 import pathlib
 
-from dotenv import load_dotenv
-
 RESP_GEN_DOT_ENV_VAR_NAME = "RESP_GEN_DOT_ENV_FILE"
 MOCK_OP_DOT_ENV_VAR_NAME = "MOCK_OP_DOT_ENV_FILE"
 
@@ -13,6 +11,8 @@ def _load_dot_env(ENV_VAR_NAME: str):
         dot_env_file = ".env"
     dot_env_path = pathlib.Path(dot_env_file)
     if dot_env_path.exists():
+        # python-dotenv is only needed if there's actually a .env file to load
+        from dotenv import load_dotenv
         load_dotenv(dot_env_path)
 
 
@@ -1,14 +1,28 @@
 import os
 import sys
+import time
 
 from mock_cli import (
     ResponseDirectoryException,
     ResponseLookupException,
     ResponseReadException
 )
-from mock_cli.hashing import digest_input
+from mock_cli.argv_conversion import arg_shlex_from_string
+from mock_cli.mock_cmd import MockCommandResponseDirException
 
-from .mock_op import MockOP
+from . import _IMPORT_START
+from .command_input import input_digest, read_command_input
+from .invocation_trace import (
+    PHASE_IMPORT,
+    PHASE_PARSE_ARGS,
+    PHASE_READ_INPUT,
+    MockOPTrace,
+    trace_path_from_env,
+    trace_phase
+)
+from .mock_op import RESP_DIR_ENV_NAME, STATE_DIR_ENV_NAME, MockOP
+from .response_directory import MockOPResponseLookupException
+from .vault_model import MockOPVaultModelException
 
 READ_INPUT_FILE_ENV_NAME = "MOCK_OP_READ_INPUT_FILE"
 
@@ -21,32 +35,93 @@ def optionally_replace_stdin():
         sys.stdin = fh
 
 
-def main():
-    optionally_replace_stdin()
-    mock_op_cmd = MockOP()
-    # We parse args in order to fail on args we don't understand
-    # even though we don't actually use them
-    mock_op_cmd.parse_args()
-    input = None
-    if not sys.stdin.isatty():
-        # this lets us read binary data from stdin
-        input = sys.stdin.buffer.read()
+def _suggestions_msg(lookup_error: MockOPResponseLookupException) -> str:
+    # only imported once a lookup has failed
+    from .suggestions import suggest_commands, suggestion_limit_from_env
 
-    args = sys.argv[1:]
     try:
-        exit_status = mock_op_cmd.respond(args, input)
+        suggestions = suggest_commands(lookup_error.directory, lookup_error.argv,
+                                       input_hash=lookup_error.input_hash,
+                                       limit=suggestion_limit_from_env())
+    except Exception:
+        # suggestions are a convenience, and mustn't get in the way of reporting the failed lookup
+        return ""
+    if not suggestions:
+        return ""
+    msg = "\nClosest recorded commands:"
+    for suggestion in suggestions:
+        msg += f"\n    {arg_shlex_from_string(suggestion.args)}"
+        if suggestion.input_hash != (lookup_error.input_hash or None):
+            input_hash = suggestion.input_hash or "none"
+            msg += f" (input hash: {input_hash})"
+    return msg
+
+
+def respond_handle_exceptions(mock_op_cmd: MockOP, args, input, stdout=None, stderr=None):
+    try:
+        exit_status = mock_op_cmd.respond(
+            args, input, stdout=stdout, stderr=stderr)
     except (ResponseDirectoryException,
             ResponseLookupException,
             ResponseReadException) as e:
-        input_hash = digest_input(input)
+        input_hash = input_digest(input)
         err_msg = f"Error looking up response: [{e}]"
 
         if input_hash:
             err_msg += f", with input hash: {input_hash}"
+        if isinstance(e, MockOPResponseLookupException):
+            err_msg += _suggestions_msg(e)
 
-        print(err_msg, file=sys.stderr)
+        _write_error(err_msg, stderr)
+        exit_status = -1
+    except MockCommandResponseDirException as e:
+        if mock_op_cmd.uses_vault_model:
+            err_msg = (f"Command isn't modelled by the vault model, and no response directory is configured. "
+                       f"Set {RESP_DIR_ENV_NAME} or {STATE_DIR_ENV_NAME} for commands the model can't answer")
+        else:
+            err_msg = f"Error looking up response: [{e}]"
+        _write_error(err_msg, stderr)
         exit_status = -1
+    except MockOPVaultModelException as e:
+        _write_error(f"Error loading vault model: [{e}]", stderr)
+        exit_status = -1
+
+    return exit_status
+
+
+def _write_error(err_msg: str, stderr=None):
+    if stderr is None:
+        print(err_msg, file=sys.stderr)
+    else:
+        stderr.write(f"{err_msg}\n".encode("utf-8"))
+
+
+def main():
+    trace = None
+    trace_path = trace_path_from_env()
+    if trace_path:
+        trace = MockOPTrace(start=_IMPORT_START)
+        trace.add_phase(PHASE_IMPORT, time.perf_counter() - _IMPORT_START)
+
+    optionally_replace_stdin()
+    mock_op_cmd = MockOP(trace=trace)
+    # We parse args in order to fail on args we don't understand,
+    # and to know whether the command takes input
+    with trace_phase(trace, PHASE_PARSE_ARGS):
+        parsed = mock_op_cmd.parse_args()
+    # this lets us read binary data from stdin
+    # (stdin may have been replaced with a file already opened in binary mode)
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
+    with trace_phase(trace, PHASE_READ_INPUT):
+        # answering from a vault model may need the input itself, not just its digest
+        input = read_command_input(stdin, parsed, retain=mock_op_cmd.uses_vault_model)
+
+    args = sys.argv[1:]
+    exit_status = respond_handle_exceptions(mock_op_cmd, args, input)
 
+    if trace is not None:
+        trace.fields["exit_status"] = exit_status
+        trace.write(trace_path)
     return exit_status
 
 
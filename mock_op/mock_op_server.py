@@ -0,0 +1,118 @@
+import os
+import signal
+import socketserver
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Tuple
+
+from mock_cli import ResponseDirectoryException
+
+from ._server_protocol import (
+    SERVER_SOCKET_ENV_NAME,
+    MockOPServerProtocolException,
+    recv_message,
+    send_message
+)
+from .command_input import MockOPCommandInput
+from .compression import DEFAULT_DECOMPRESSION_CACHE_SIZE
+from .in_process import MockOPInvoker
+from .mock_op import RESP_DIR_ENV_NAME
+
+
+class MockOPRequestHandler(socketserver.BaseRequestHandler):
+    server: "MockOPServer"
+
+    def handle(self):
+        try:
+            request, payload = recv_message(self.request)
+        except MockOPServerProtocolException:
+            # the client went away without sending a request
+            return
+        # clients hash their input, and only send the input itself if it's needed
+        input = MockOPCommandInput(request.get("input_hash"), data=payload or None)
+        exit_status, stdout, stderr = self.server.invoke(request, input)
+        reply = {
+            "exit_status": exit_status,
+            "stdout_length": len(stdout),
+            "stderr_length": len(stderr)
+        }
+        send_message(self.request, reply, stdout + stderr)
+
+
+class MockOPServer(socketserver.UnixStreamServer):
+    """
+    A long-lived mock-op that answers invocations forwarded by mock-op-client over a
+    Unix domain socket
+
+    Argument parsers and loaded response directories stay resident between invocations.
+    Invocations are handled one at a time, since each one temporarily takes over
+    the process's environment and working directory
+    """
+
+    def __init__(self, socket_path, decompression_cache_size: int = DEFAULT_DECOMPRESSION_CACHE_SIZE):
+        self._socket_path = Path(socket_path)
+        self._invoker = MockOPInvoker(decompression_cache_size=decompression_cache_size)
+        if self._socket_path.is_socket():
+            # stale socket from a previous run
+            self._socket_path.unlink()
+        super().__init__(str(self._socket_path), MockOPRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if self._socket_path.is_socket():
+            self._socket_path.unlink()
+
+    def preload(self, response_directory_path):
+        try:
+            self._invoker.directory_cache.get(response_directory_path)
+        except ResponseDirectoryException as e:
+            print(f"Unable to preload response directory: {e}", file=sys.stderr)
+
+    def invoke(self, request, input) -> Tuple[int, bytes, bytes]:
+        return self._invoker.invoke(request["prog"], request["argv"], input,
+                                    env=request["env"], cwd=request["cwd"])
+
+
+def server_parse_args():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--socket", help=f"Path to the Unix domain socket to listen on. Defaults to ${SERVER_SOCKET_ENV_NAME}")
+    parser.add_argument(
+        "--decompression-cache-mb", type=int, default=DEFAULT_DECOMPRESSION_CACHE_SIZE // (1024 * 1024),
+        help="How much decompressed response output to keep in memory, in MiB. Defaults to %(default)s")
+    parsed = parser.parse_args()
+    return parsed
+
+
+def _terminate(signum, frame):
+    sys.exit(0)
+
+
+def main():
+    args = server_parse_args()
+    socket_path = args.socket
+    if not socket_path:
+        socket_path = os.environ.get(SERVER_SOCKET_ENV_NAME)
+    if not socket_path:
+        print(
+            f"No socket path provided. Use --socket or set {SERVER_SOCKET_ENV_NAME}", file=sys.stderr)
+        return 1
+
+    signal.signal(signal.SIGTERM, _terminate)
+    server = MockOPServer(
+        socket_path, decompression_cache_size=args.decompression_cache_mb * 1024 * 1024)
+    try:
+        response_directory = os.environ.get(RESP_DIR_ENV_NAME)
+        if response_directory:
+            server.preload(response_directory)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    main()
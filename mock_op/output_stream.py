@@ -0,0 +1,144 @@
+"""
+Streaming response output to its destination without reading it all into memory
+
+Output sources are either in-memory buffers (bytes, or memoryview slices of a response pack)
+or open binary files. Files are copied to file descriptor destinations in the kernel with
+os.sendfile() or os.copy_file_range() where available, falling back to a chunked copy.
+"""
+import errno
+import io
+import os
+import sys
+from typing import IO, BinaryIO, Optional, Union
+
+CHUNK_SIZE = 1024 * 1024
+
+OutputSource = Union[bytes, bytearray, memoryview, BinaryIO]
+
+# errors indicating a zero-copy mechanism isn't supported for this pair of file descriptors,
+# rather than an actual I/O error
+_UNSUPPORTED_ERRNOS = {
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EBADF,
+    errno.ENOTSOCK,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP
+}
+
+
+def _handle_fileno(handle: IO) -> Optional[int]:
+    try:
+        fd = handle.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fd = None
+    return fd
+
+
+def _write_all(fd: int, data) -> int:
+    view = memoryview(data)
+    total = len(view)
+    written = 0
+    while written < total:
+        written += os.write(fd, view[written:])
+    return total
+
+
+def _sendfile(in_fd: int, out_fd: int, offset: int, size: int) -> int:
+    while offset < size:
+        sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+    return offset
+
+
+def _copy_file_range(in_fd: int, out_fd: int, offset: int, size: int) -> int:
+    while offset < size:
+        copied = os.copy_file_range(in_fd, out_fd, size - offset, offset_src=offset)
+        if copied == 0:
+            break
+        offset += copied
+    return offset
+
+
+def _chunked_copy(in_fd: int, out_fd: int, offset: int) -> int:
+    os.lseek(in_fd, offset, os.SEEK_SET)
+    while True:
+        chunk = os.read(in_fd, CHUNK_SIZE)
+        if not chunk:
+            break
+        offset += _write_all(out_fd, chunk)
+    return offset
+
+
+def copy_fd(in_fd: int, out_fd: int) -> int:
+    """
+    Copy the entire contents of a regular file to another file descriptor,
+    returning the number of bytes copied
+    """
+    size = os.fstat(in_fd).st_size
+    offset = 0
+    for zero_copy in [getattr(os, "sendfile", None), getattr(os, "copy_file_range", None)]:
+        if zero_copy is None:
+            continue
+        try:
+            if zero_copy is os.sendfile:
+                offset = _sendfile(in_fd, out_fd, offset, size)
+            else:
+                offset = _copy_file_range(in_fd, out_fd, offset, size)
+            if offset >= size:
+                return offset
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    # whatever the zero-copy mechanisms didn't get to
+    return _chunked_copy(in_fd, out_fd, offset)
+
+
+def close_source(source: OutputSource):
+    if not isinstance(source, (bytes, bytearray, memoryview)):
+        source.close()
+
+
+def write_output(handle: Optional[IO[bytes]], source: OutputSource) -> int:
+    """
+    Write response output to a binary handle, returning the number of bytes written
+
+    If 'handle' is None, output goes to the process's stdout. Handles backed by a file descriptor
+    are written to directly, bypassing Python's buffering. File sources are closed afterward.
+    """
+    if handle is None:
+        handle = sys.stdout
+    fd = _handle_fileno(handle)
+    if fd is not None:
+        # don't let anything still sitting in Python's buffer get written out of order
+        handle.flush()
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if fd is None:
+            handle.write(source)
+            written = len(source)
+        else:
+            written = _write_all(fd, source)
+        return written
+
+    with source:
+        # sources without their own file descriptor (e.g., output being decompressed)
+        # have to be copied through Python
+        in_fd = _handle_fileno(source)
+        if fd is None or in_fd is None:
+            written = 0
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if fd is None:
+                    handle.write(chunk)
+                else:
+                    _write_all(fd, chunk)
+                written += len(chunk)
+        else:
+            written = copy_fd(in_fd, fd)
+    return written
@@ -0,0 +1,66 @@
+import os
+from argparse import ArgumentParser
+from pathlib import Path
+
+from mock_cli import ResponseDirectoryException
+
+from .response_directory import open_response_directory
+from .response_pack import (
+    MockOPResponsePackException,
+    pack_response_dir,
+    response_pack_path,
+    unpack_response_dir
+)
+
+
+def pack_parse_args():
+    parser = ArgumentParser(
+        description="Pack a response directory's output files into a single archive, or unpack them again")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    parser_pack = subparsers.add_parser(
+        "pack", help="Pack all files in a response directory")
+    parser_pack.add_argument(
+        "--remove", help="Remove the packed files afterward", action="store_true")
+
+    parser_unpack = subparsers.add_parser(
+        "unpack", help="Extract all files from a response directory's pack, e.g., before regenerating responses")
+    parser_unpack.add_argument(
+        "--remove", help="Remove the pack afterward", action="store_true")
+
+    for _parser in [parser_pack, parser_unpack]:
+        _parser.add_argument(
+            "response_dir", help="Path to response directory JSON file, or to the response directory itself")
+
+    parsed = parser.parse_args()
+    return parsed
+
+
+def main():
+    args = pack_parse_args()
+    response_dir = args.response_dir
+    if not os.path.isdir(response_dir):
+        try:
+            directory = open_response_directory(response_dir)
+        except ResponseDirectoryException as e:
+            print(f"Error loading response directory: {e}")
+            return 1
+        response_dir = directory.response_dir
+    response_dir = Path(response_dir)
+    pack_path = response_pack_path(response_dir)
+
+    if args.action == "pack":
+        file_count, byte_count = pack_response_dir(response_dir, remove=args.remove)
+        print(f"Packed {file_count} files ({byte_count} bytes) from {response_dir} into {pack_path}")
+    else:
+        try:
+            file_count, byte_count = unpack_response_dir(response_dir, remove=args.remove)
+        except (OSError, MockOPResponsePackException) as e:
+            print(f"Error unpacking response directory: {e}")
+            return 1
+        print(f"Unpacked {file_count} files ({byte_count} bytes) from {pack_path} into {response_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
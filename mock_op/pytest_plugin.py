@@ -0,0 +1,35 @@
+"""
+pytest plugin providing the 'mock_op_intercept' and 'mock_op_state_session' fixtures
+
+Within a test using 'mock_op_intercept', subprocess calls to 'op' are answered in-process by
+mock-op. Set MOCK_OP_* environment variables (e.g., with monkeypatch.setenv()) as with mock-op itself
+
+A test using 'mock_op_state_session' gets its own state session, so it starts from the
+state configuration's initial iteration no matter what other tests, or other test workers,
+have done with the same state configuration
+"""
+import os
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def mock_op_intercept():
+    from .intercept import MockOPInterceptor
+
+    with MockOPInterceptor() as interceptor:
+        yield interceptor
+
+
+@pytest.fixture
+def mock_op_state_session(monkeypatch):
+    from .mock_op import STATE_DIR_ENV_NAME, STATE_SESSION_ENV_NAME
+    from .state import reset_state_session
+
+    session = uuid.uuid4().hex
+    monkeypatch.setenv(STATE_SESSION_ENV_NAME, session)
+    yield session
+    state_dir = os.environ.get(STATE_DIR_ENV_NAME)
+    if state_dir:
+        reset_state_session(state_dir, session)
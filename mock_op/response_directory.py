@@ -0,0 +1,218 @@
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from mock_cli import (
+    CommandInvocation,
+    CommandResponse,
+    ResponseDirectory,
+    ResponseLookupException
+)
+from mock_cli.argv_conversion import arg_shlex_from_string, argv_to_string
+
+from ._meta_paths import resolve_meta_path
+from .compression import compress_outputs
+from .mock_op_arg_validator import canonical_argv
+from .response_index import (
+    MockOPIndexedResponseDirectory,
+    is_response_index,
+    open_indexed_response_directory
+)
+from .state import write_json_atomic
+
+
+class MockOPResponseLookupException(ResponseLookupException):
+    """
+    A failed lookup, along with what's needed to suggest the command that was perhaps meant
+    """
+
+    def __init__(self, msg, directory: ResponseDirectory, argv, input_hash: Optional[str]):
+        super().__init__(msg)
+        self.directory = directory
+        self.argv = list(argv)
+        self.input_hash = input_hash
+
+
+class MockOPResponseDirectory(ResponseDirectory):
+    """
+    A mock_cli ResponseDirectory that exposes its metadata, and that can compress
+    the output of responses added to it
+    """
+
+    def __init__(self, responsedir_json_file, create=False, response_dir=None, input_dir=None,
+                 compression: Optional[str] = None, compression_level: Optional[int] = None):
+        super().__init__(responsedir_json_file, create=create, response_dir=response_dir, input_dir=input_dir)
+        self._compression = compression
+        self._compression_level = compression_level
+
+    def _load_or_create_directory(self, responsedir_json_file, create, response_dir):
+        # mock_cli hands every newly created directory the same default dict; give this one its own
+        self.default_directory = {
+            "meta": {
+                "response_dir": "responses",
+                "input_dir": "input"
+            },
+            "commands": {},
+            "commands_with_input": {}
+        }
+        return super()._load_or_create_directory(responsedir_json_file, create, response_dir)
+
+    @property
+    def meta(self) -> Dict[str, str]:
+        return self._response_directory["meta"]
+
+    @property
+    def blob_dir(self) -> Optional[str]:
+        blob_dir = self.meta.get("blob_dir")
+        if blob_dir:
+            blob_dir = resolve_meta_path(blob_dir, self.json_file)
+        return blob_dir
+
+    @property
+    def json_file(self) -> Path:
+        return Path(self._response_responsedir_json_filename)
+
+    def _recorded_response(self, response: CommandResponse) -> CommandResponse:
+        """
+        The response to record for a newly added command invocation
+        """
+        if self._compression:
+            response_dict = dict(response)
+            outputs = compress_outputs(
+                response_dict,
+                {response["stdout"]: response.output, response["stderr"]: response.error_output},
+                self._compression, level=self._compression_level)
+            response = CommandResponse(response_dict, None,
+                                       output=outputs[response["stdout"]],
+                                       error_output=outputs[response["stderr"]])
+        return response
+
+    def add_command_invocation(self, cmd: CommandInvocation, overwrite=False, save=False):
+        cmd["response"] = self._recorded_response(cmd.response)
+        # record under the canonical form, so equivalent invocations find this response
+        canonical = canonical_argv(cmd.cmd_args)
+        if canonical is not None:
+            cmd["args"] = canonical
+        super().add_command_invocation(cmd, overwrite=overwrite, save=save)
+
+    def recorded_command(self, arg_string: str, input_hash: Optional[str] = None) -> Optional[Dict]:
+        """
+        The response dict recorded for a command, if there is one
+        """
+        if input_hash:
+            commands = self._response_directory.get("commands_with_input", {}).get(input_hash, {})
+        else:
+            commands = self.commands
+        return commands.get(arg_string)
+
+    def restore_recorded_command(self, arg_string: str, input_hash: Optional[str], response_dict: Dict):
+        """
+        Put back a response dict recorded earlier, whose output and input files are already in place
+        """
+        if input_hash:
+            commands = self._response_directory.setdefault("commands_with_input", {}).setdefault(input_hash, {})
+        else:
+            commands = self.commands
+        commands[arg_string] = response_dict
+
+    def save(self):
+        self._save_to_disk(self._response_responsedir_json_filename, self._response_directory)
+
+    def _save_to_disk(self, responsedir_json_filename, directory):
+        # never leave a half-written file behind, which would be taken for a missing one next time
+        write_json_atomic(responsedir_json_filename, directory)
+
+
+def open_response_directory(response_directory_path: Union[str, Path]) -> ResponseDirectory:
+    """
+    Open a response directory for lookups
+
+    The path may be to a response directory JSON file, or to a compiled response index.
+    If a JSON file has been compiled, its index is used instead, and is first rebuilt
+    if the JSON file has changed
+    """
+    if is_response_index(response_directory_path):
+        directory = MockOPIndexedResponseDirectory(response_directory_path)
+    else:
+        directory = open_indexed_response_directory(response_directory_path)
+        if directory is None:
+            directory = MockOPResponseDirectory(response_directory_path)
+    return directory
+
+
+def response_lookup_digest(directory: ResponseDirectory, args, input_hash: Optional[str]) -> CommandResponse:
+    """
+    Look up a response by the digest of its input rather than the input itself,
+    so the input never has to be held in memory
+
+    If the arguments weren't recorded as given, they're looked up again in canonical form
+    """
+    try:
+        return _response_lookup_digest(directory, args, input_hash)
+    except ResponseLookupException as e:
+        lookup_error = e
+    canonical = canonical_argv(args)
+    if canonical is not None and canonical != list(args):
+        try:
+            return _response_lookup_digest(directory, canonical, input_hash)
+        except ResponseLookupException:
+            pass
+    # report the arguments as given
+    raise MockOPResponseLookupException(str(lookup_error), directory, args, input_hash)
+
+
+def _response_lookup_digest(directory: ResponseDirectory, args, input_hash: Optional[str]) -> CommandResponse:
+    if isinstance(directory, MockOPIndexedResponseDirectory):
+        return directory.response_lookup_digest(args, input_hash)
+
+    arg_string = argv_to_string(args)
+    try:
+        commands = directory.commands
+        if input_hash:
+            commands = directory.commands_with_input[input_hash]
+        response_dict = commands[arg_string]
+    except KeyError:
+        escaped_arg_str = arg_shlex_from_string(arg_string)
+        raise ResponseLookupException(
+            "No response for command args: {}".format(escaped_arg_str))
+
+    response = CommandResponse(response_dict, directory.response_dir)
+    return response
+
+
+class MockOPResponseDirectoryCache:
+    """
+    Keeps loaded response directories resident so long-lived processes don't
+    re-parse the response directory JSON file for every lookup
+
+    A cached directory is reloaded if its JSON file's modification time or size changes
+    """
+
+    def __init__(self):
+        self._directories: Dict[str, Tuple[Tuple[int, int], ResponseDirectory]] = {}
+
+    def _cache_key(self, response_directory_path: Union[str, Path]) -> str:
+        path = os.path.expanduser(response_directory_path)
+        path = os.path.realpath(path)
+        return path
+
+    def get(self, response_directory_path: Union[str, Path]) -> ResponseDirectory:
+        key = self._cache_key(response_directory_path)
+        try:
+            st = os.stat(key)
+        except OSError:
+            # let ResponseDirectory raise the appropriate exception
+            return open_response_directory(key)
+
+        file_id = (st.st_mtime_ns, st.st_size)
+        cached = self._directories.get(key)
+        if cached and cached[0] == file_id:
+            directory = cached[1]
+        else:
+            directory = open_response_directory(key)
+            self._directories[key] = (file_id, directory)
+
+        return directory
+
+    def clear(self):
+        self._directories.clear()
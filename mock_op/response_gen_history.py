@@ -0,0 +1,177 @@
+"""
+Regenerating only the response definitions that need it
+
+Each response response-generator records notes the definition it was recorded for:
+
+    "response": {
+      "exit_status": 0,
+      "stdout": "output",
+      "stderr": "error_output",
+      "name": "item-get-example-login",
+      "changes_state": false,
+      "definition": {"name": "item-get-example-login", "fingerprint": "9c1f...", "commands": 1, "run": "5e0b..."}
+    }
+
+A definition's fingerprint is a digest of its parameters, as resolved from the configuration,
+and of the contents of any files they name. A later run skips a definition if every command it
+recorded is in the response directory with its current fingerprint, and their output is still
+where it was recorded. 'commands' is how many commands the definition recorded, so one that
+was interrupted partway through isn't taken for up to date.
+
+Each run is recorded in the response directory's metadata, and marked complete when it
+finishes, so a failed run can be resumed after the last definition it recorded.
+"""
+import hashlib
+import json
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from mock_cli import CommandInvocation
+
+from .command_listing import MockOPResponseSizer, iter_commands
+from .response_directory import MockOPResponseDirectory
+from .response_generator_config import OPresponseDefinition
+
+DEFINITION_KEY = "definition"
+GENERATION_KEY = "generation"
+
+# parameters that name files, whose contents are recorded along with them
+FILE_PARAMETERS = ("new-document-path",)
+# parameters that don't change what a definition records
+UNRECORDED_PARAMETERS = ("enabled",)
+
+
+def definition_fingerprint(query_definition: OPresponseDefinition) -> str:
+    params = {key: value for key, value in query_definition.items() if key not in UNRECORDED_PARAMETERS}
+    for key in FILE_PARAMETERS:
+        if key in params:
+            try:
+                params[f"{key}:sha256"] = hashlib.sha256(Path(params[key]).read_bytes()).hexdigest()
+            except OSError:
+                pass
+    encoded = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def invocation_list(invocation: Any) -> List[CommandInvocation]:
+    """
+    The commands a query function returned, which may be one, or a tuple or list of them
+    """
+    if isinstance(invocation, (tuple, list)):
+        return list(invocation)
+    return [invocation]
+
+
+def mark_invocations(invocation: Any, query_name: str, fingerprint: str, run_id: str):
+    """
+    Note the definition a query function's commands were recorded for, in their responses
+    """
+    commands = invocation_list(invocation)
+    for cmd in commands:
+        cmd.response[DEFINITION_KEY] = {
+            "name": query_name,
+            "fingerprint": fingerprint,
+            "commands": len(commands),
+            "run": run_id
+        }
+
+
+class _RecordedDefinition:
+
+    def __init__(self, expected_count: int):
+        self.expected_count = expected_count
+        self.count = 0
+        self.output_present = True
+        self.runs = set()
+
+    @property
+    def complete(self) -> bool:
+        return self.output_present and self.count >= self.expected_count
+
+
+class OPResponseGenHistory:
+    """
+    What earlier runs recorded in a response directory, by definition
+    """
+
+    def __init__(self, directory: MockOPResponseDirectory):
+        self._directory = directory
+        # (definition name, fingerprint) -> what's recorded for it
+        self._recorded: Dict[Tuple[str, str], _RecordedDefinition] = {}
+        sizer = MockOPResponseSizer(directory)
+        for entry in iter_commands(directory):
+            definition = entry.response.get(DEFINITION_KEY)
+            if not definition:
+                continue
+            key = (definition["name"], definition["fingerprint"])
+            recorded = self._recorded.get(key)
+            if recorded is None:
+                recorded = _RecordedDefinition(definition["commands"])
+                self._recorded[key] = recorded
+            recorded.count += 1
+            if None in sizer.sizes(entry).values():
+                recorded.output_present = False
+            recorded.runs.add(definition["run"])
+
+    def up_to_date(self, query_name: str, fingerprint: str) -> bool:
+        recorded = self._recorded.get((query_name, fingerprint))
+        return recorded is not None and recorded.complete
+
+    def run_recorded(self, run_id: str) -> Set[Tuple[str, str]]:
+        """
+        Names and fingerprints of the definitions a run recorded completely
+        """
+        return {key for key, recorded in self._recorded.items()
+                if run_id in recorded.runs and recorded.complete}
+
+    @property
+    def last_run(self) -> Optional[Dict]:
+        return self._directory.meta.get(GENERATION_KEY)
+
+    def start_run(self, resume: bool = False) -> Tuple[str, bool]:
+        """
+        Record a new run in the response directory's metadata, or if 'resume' is true and the
+        last run didn't finish, carry on with it. Returns the run's ID, and whether it's resumed
+        """
+        last_run = self.last_run
+        if resume and last_run is not None and not last_run.get("complete"):
+            run_id = last_run["run"]
+            resumed = True
+        else:
+            run_id = uuid.uuid4().hex
+            resumed = False
+        self._directory.meta[GENERATION_KEY] = {"run": run_id, "complete": False}
+        self._directory.save()
+        return run_id, resumed
+
+    def finish_run(self, run_id: str):
+        self._directory.meta[GENERATION_KEY] = {"run": run_id, "complete": True}
+        self._directory.save()
+
+
+def select_definitions(history: OPResponseGenHistory,
+                       definitions: Iterable[Tuple[str, OPresponseDefinition]],
+                       fingerprints: Dict[str, str],
+                       force: Iterable[str] = (),
+                       resume_run: Optional[str] = None) -> List[Tuple[str, OPresponseDefinition]]:
+    """
+    The definitions that need generating, in config order
+
+    Definitions named in 'force' are always generated. If resuming 'resume_run', everything up
+    to the last definition it recorded is skipped, unless that definition has changed since
+    """
+    definitions = list(definitions)
+    start = 0
+    if resume_run is not None:
+        resumed = history.run_recorded(resume_run)
+        for i, (query_name, _) in enumerate(definitions):
+            if (query_name, fingerprints[query_name]) in resumed:
+                start = i + 1
+
+    force = set(force)
+    selected = []
+    for query_name, query_definition in definitions[start:]:
+        if query_name in force or not history.up_to_date(query_name, fingerprints[query_name]):
+            selected.append((query_name, query_definition))
+    return selected
@@ -0,0 +1,88 @@
+"""
+Remembering the lookups response definitions make between the commands they record
+
+Some definitions look things up before running the command they record: 'item-edit' with
+'append-tags' gets the item's existing tags, 'document-edit' gets the document's ID, and
+'item-delete-multiple' lists the items to delete. Many definitions look up the same items and
+vaults, so over a run OPResponseGenLookupCache remembers what each lookup returned.
+
+What's remembered is forgotten once it may no longer be true. After a definition with
+'changes-state' set, everything is. After any other definition that changes items, the item it
+changed is, along with every item list.
+"""
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from .response_gen_runner import STATE_CHANGING_QUERY_TYPES
+from .response_generator_config import OPresponseDefinition
+
+# the parameters naming the item a state changing definition changes
+ITEM_PARAMETERS = ("item-identifier", "document_identifier")
+
+
+def _hashable(value: Any) -> Hashable:
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class OPResponseGenLookupCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: Dict[Tuple, Any] = {}
+        self._item_lists: Dict[Tuple, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, cache: Dict[Tuple, Any], key: Tuple, lookup: Callable[[], Any]) -> Any:
+        with self._lock:
+            found = key in cache
+            if found:
+                self.hits += 1
+                result = cache[key]
+            else:
+                self.misses += 1
+        if not found:
+            result = lookup()
+            with self._lock:
+                cache[key] = result
+        # callers may change what they're given, e.g., an item's tags
+        return copy.deepcopy(result)
+
+    def item_get(self, item_get: Callable[..., Any], item_name_or_id: str, vault=None) -> Any:
+        return self._lookup(self._items, (item_name_or_id, vault),
+                            lambda: item_get(item_name_or_id, vault=vault))
+
+    def item_list(self, item_list: Callable[..., Any], **kwargs) -> Any:
+        key = tuple(sorted((name, _hashable(value)) for name, value in kwargs.items()))
+        return self._lookup(self._item_lists, key, lambda: item_list(**kwargs))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._item_lists.clear()
+
+    def forget_item(self, item_name_or_id: str):
+        """
+        Forget an item, however it was looked up, and every item list, which it may have been in
+        """
+        with self._lock:
+            for key, item in list(self._items.items()):
+                names = {key[0], getattr(item, "unique_id", None), getattr(item, "title", None)}
+                if item_name_or_id in names:
+                    del self._items[key]
+            self._item_lists.clear()
+
+    def definition_done(self, query_definition: OPresponseDefinition):
+        """
+        Forget whatever a definition that's just run may have changed
+        """
+        # an item-delete-multiple may have deleted any of the items looked up
+        if query_definition.changes_state or query_definition.type == "item-delete-multiple":
+            self.clear()
+        elif query_definition.type in STATE_CHANGING_QUERY_TYPES:
+            for param in ITEM_PARAMETERS:
+                if param in query_definition:
+                    self.forget_item(query_definition[param])
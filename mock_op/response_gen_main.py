@@ -1,3 +1,4 @@
+import asyncio
 import getpass
 from argparse import ArgumentParser, RawTextHelpFormatter
 from pathlib import Path
@@ -6,8 +7,7 @@ from typing import List
 from mock_cli import (
     CommandInvocation,
     MockCMDNewStateConfig,
-    MockCMDStateConfig,
-    ResponseDirectory
+    MockCMDStateConfig
 )
 
 from ._op import (
@@ -34,9 +34,29 @@ from ._response_gen_item_edit import (
     item_edit_set_url,
     item_edit_set_url_field
 )
+from .async_response_generator import (
+    OPAsyncResponseGenerator,
+    OPResponseGenPlanner
+)
+from .blob_store import MockOPBlobResponseDirectory
+from .compression import COMPRESSIONS
 from .mock_op_env import resp_gen_load_dot_env
+from .response_directory import MockOPResponseDirectory
+from .response_gen_history import (
+    OPResponseGenHistory,
+    definition_fingerprint,
+    mark_invocations,
+    select_definitions
+)
+from .response_gen_lookups import OPResponseGenLookupCache
+from .response_gen_runner import (
+    DEFAULT_WORKERS,
+    OPResponseGenResult,
+    OPResponseGenRunner
+)
 from .response_generator import OPResponseGenerator
 from .response_generator_config import OPResponseGenConfig
+from .response_journal import DEFAULT_SAVE_BATCH_SIZE, MockOPResponseJournal
 
 DEFAULT_CONFIG_PATH = Path(".", "response-generation.cfg")
 
@@ -61,24 +81,41 @@ def resp_gen_parse_args():
     parser.add_argument(
         "-l", "--list-definitions", help="List response definitions and exit", action="store_true"
     )
+    parser.add_argument(
+        "-j", "--workers", type=int,
+        help="""How many definitions to run at once. Overrides 'workers' in the config's [MAIN] section.
+        Definitions that change state always run on their own, in config order. Defaults to 1"""
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Regenerate every definition, rather than only those that are new, changed, or missing output"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="If the last run failed, carry on after the last definition it recorded"
+    )
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="Run 'op' with asyncio rather than on worker threads, up to --workers at a time"
+    )
 
     parsed = parser.parse_args()
     return parsed
 
 
-def do_signin(existing_auth):
+def do_signin(existing_auth, generator_class=OPResponseGenerator):
     # If you've already signed in at least once, you don't need to provide all
     # account details on future sign-ins. Just master password
     logger = op_logging.console_logger("response-generator", op_logging.DEBUG)
     try:
-        op = OPResponseGenerator(
+        op = generator_class(
             existing_auth=existing_auth, password_prompt=False, logger=logger)
     except OPAuthenticationException as e:
         if existing_auth != EXISTING_AUTH_REQD:
             my_password = getpass.getpass(
                 prompt="1Password master password:\n")
-            op = OPResponseGenerator(password=my_password,
-                                     existing_auth=existing_auth, logger=logger)
+            op = generator_class(password=my_password,
+                                 existing_auth=existing_auth, logger=logger)
         else:
             raise e
     return op
@@ -417,16 +454,32 @@ def handle_state_config(mock_op_config: OPResponseGenConfig, respdir_json_path:
             respdir_json_path, state_iteration, set_vars=set_vars, pop_vars=pop_vars)
 
 
-def signin_handle_exceptions(existing_auth, ignore_signin_fail):
+def record_invocation(directory: MockOPResponseJournal, invocation):
+    if isinstance(invocation, tuple):
+        document_invocation, item_filename_invocation = invocation
+        directory.add_command_invocation(
+            document_invocation, overwrite=True)
+        directory.add_command_invocation(
+            item_filename_invocation, overwrite=True, save=True)
+    elif isinstance(invocation, list):
+        for _invocation in invocation:
+            directory.add_command_invocation(
+                _invocation, overwrite=True, save=True)
+    else:
+        directory.add_command_invocation(
+            invocation, overwrite=True, save=True)
+
+
+def signin_handle_exceptions(existing_auth, ignore_signin_fail, generator_class=OPResponseGenerator):
     try:
-        generator = do_signin(existing_auth)
+        generator = do_signin(existing_auth, generator_class=generator_class)
     except (OPSigninException,
             OPWhoAmiException,
             OPCLIPanicException) as e:
         if ignore_signin_fail:
             # some actions only require class methods and don't require sign-in success
             # if this blows up on other actions that's our fault for setting the env variable
-            generator = OPResponseGenerator
+            generator = generator_class
         else:
             signin_fail(e)
     except Exception as e:
@@ -476,18 +529,38 @@ def main():
         raise Exception(
             f"Unknown existing_auth setting: {generator_config.existing_auth}")
 
+    workers = args.workers or generator_config.workers or DEFAULT_WORKERS
+    # with asyncio, query functions are given a planner, and its plans are run asynchronously
+    generator_class = OPResponseGenPlanner if args.use_async else OPResponseGenerator
+    async_generator = OPAsyncResponseGenerator(concurrency=workers)
+
     generator = None
 
     if not skip_signin:
         generator = signin_handle_exceptions(
-            existing_auth, generator_config.ignore_signin_fail)
+            existing_auth, generator_config.ignore_signin_fail, generator_class=generator_class)
+
+    compression = generator_config.compression
+    if compression == "none":
+        compression = None
+    if compression and compression not in COMPRESSIONS:
+        raise Exception(f"Unknown compression setting: {compression}")
+    compression_level = generator_config.compression_level
+
+    if generator_config.blob_path:
+        blob_path = Path(config_dir, generator_config.blob_path)
+        directory = MockOPBlobResponseDirectory(
+            respdir_json_file, blob_path, create=True, response_dir=response_path, input_dir=input_path,
+            compression=compression, compression_level=compression_level)
+    else:
+        directory = MockOPResponseDirectory(
+            respdir_json_file, create=True, response_dir=response_path, input_dir=input_path,
+            compression=compression, compression_level=compression_level)
 
-    directory = ResponseDirectory(
-        respdir_json_file, create=True, response_dir=response_path, input_dir=input_path)
+    # lookups definitions make before the commands they record, shared across the run
+    lookup_cache = OPResponseGenLookupCache()
 
-    for query_name, query_definition in generator_config.items():
-        if not query_definition.enabled:
-            continue
+    def prepare_query(query_name, query_definition):
         try:
             query_func = query_type_map[query_definition['type']]
         except KeyError:
@@ -498,27 +571,59 @@ def main():
         # - didn't create a generator object at the start, but need one for this query
         # - we did create generator object at the start and we can use that one now
         if not query_definition.get("create-instance", True):
-            _gen = OPResponseGenerator
+            _gen = generator_class
         elif not generator:
             _gen = signin_handle_exceptions(
-                existing_auth, generator_config.ignore_signin_fail)
+                existing_auth, generator_config.ignore_signin_fail, generator_class=generator_class)
         else:
             _gen = generator
-
-        invocation = query_func(_gen, query_name, query_definition)
-        if isinstance(invocation, tuple):
-            document_invocation, item_filename_invocation = invocation
-            directory.add_command_invocation(
-                document_invocation, overwrite=True)
-            directory.add_command_invocation(
-                item_filename_invocation, overwrite=True, save=True)
-        elif isinstance(invocation, list):
-            for _invocation in invocation:
-                directory.add_command_invocation(
-                    _invocation, overwrite=True, save=True)
+        if isinstance(_gen, OPResponseGenerator):
+            _gen.lookup_cache = lookup_cache
+
+        if args.use_async:
+            return lambda: async_generator.generate(query_func, _gen, query_name, query_definition)
+        return lambda: query_func(_gen, query_name, query_definition)
+
+    save_batch_size = generator_config.save_batch_size or DEFAULT_SAVE_BATCH_SIZE
+    with MockOPResponseJournal(directory, save_batch_size=save_batch_size) as journal:
+        if journal.replayed_count:
+            print(f"Recovered {journal.replayed_count} responses from an interrupted run")
+
+        history = OPResponseGenHistory(directory)
+        run_id, resumed = history.start_run(resume=args.resume)
+        if args.resume and not resumed:
+            print("The last run finished, so there's nothing to resume")
+
+        definitions = [(query_name, query_definition)
+                       for query_name, query_definition in generator_config.items() if query_definition.enabled]
+        fingerprints = {query_name: definition_fingerprint(query_definition)
+                        for query_name, query_definition in definitions}
+        # definitions asked for by name are always regenerated
+        force = list(fingerprints) if args.force else definition_list
+        selected = select_definitions(history, definitions, fingerprints, force=force,
+                                      resume_run=run_id if resumed else None)
+        if len(selected) < len(definitions):
+            print(f"Skipping {len(definitions) - len(selected)} definitions that are up to date"
+                  f"{' or were recorded before the interruption' if resumed else ''}")
+
+        def record_result(result: OPResponseGenResult):
+            mark_invocations(result.invocation, result.query_name, fingerprints[result.query_name], run_id)
+            record_invocation(journal, result.invocation)
+            # results are recorded in config order, and those that change state on their own,
+            # so nothing after this definition has looked anything up yet
+            lookup_cache.definition_done(generator_config[result.query_name])
+
+        runner = OPResponseGenRunner(prepare_query, record_result, workers=workers)
+        if args.use_async:
+            asyncio.run(runner.run_async(selected))
         else:
-            directory.add_command_invocation(
-                invocation, overwrite=True, save=True)
+            runner.run(selected)
+        journal.save()
+        history.finish_run(run_id)
+
+    if lookup_cache.hits:
+        print(f"{lookup_cache.hits} of {lookup_cache.hits + lookup_cache.misses} lookups "
+              "were answered from earlier ones")
 
     handle_state_config(generator_config, respdir_json_file)
 
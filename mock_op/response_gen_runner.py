@@ -0,0 +1,183 @@
+"""
+Running response definitions, several at a time
+
+Each definition waits on the real 'op', usually over the network, so most of a run is spent
+waiting. Definitions that only read the account are run concurrently by a pool of worker
+threads. Definitions that change it are run on their own, in config order: everything before
+one finishes first, and nothing after it starts until it's done, so reads see the account in
+the state the config describes.
+
+However the work is scheduled, responses are recorded in config order, one definition at a
+time, so a run records the same response directory it would if run serially.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Iterable,
+    List,
+    Optional,
+    TextIO,
+    Tuple
+)
+
+from .response_generator_config import OPresponseDefinition
+
+DEFAULT_WORKERS = 1
+
+# query types that change the account whether or not their definition says so
+STATE_CHANGING_QUERY_TYPES = frozenset([
+    "item-delete",
+    "item-delete-multiple",
+    "item-edit",
+    "document-edit",
+    "document-delete",
+    "user-edit"
+])
+
+
+def definition_changes_state(query_definition: OPresponseDefinition) -> bool:
+    return query_definition.changes_state or query_definition.type in STATE_CHANGING_QUERY_TYPES
+
+
+class OPResponseGenResult:
+
+    def __init__(self, query_name: str, invocation: Any, elapsed: float):
+        self.query_name = query_name
+        # whatever the definition's query function returned
+        self.invocation = invocation
+        self.elapsed = elapsed
+
+
+class OPResponseGenRunner:
+    """
+    Run response definitions on a pool of workers, recording their responses in config order
+
+    'prepare' is called for each definition, in config order and on the calling thread, and
+    returns the function that runs the definition's queries, so anything that mustn't happen
+    concurrently, such as signing in, can happen there. 'record' is called with each
+    definition's result, also in config order and on the calling thread.
+    """
+
+    def __init__(self,
+                 prepare: Callable[[str, OPresponseDefinition], Callable[[], Any]],
+                 record: Callable[[OPResponseGenResult], None],
+                 workers: int = DEFAULT_WORKERS,
+                 progress: Optional[TextIO] = sys.stdout):
+        self._prepare = prepare
+        self._record = record
+        self.workers = max(workers, 1)
+        self._progress = progress
+        self._progress_lock = threading.Lock()
+        self._total = 0
+        self._completed = 0
+
+    def run(self, definitions: Iterable[Tuple[str, OPresponseDefinition]]):
+        definitions = self._start(definitions)
+        start = time.perf_counter()
+        if self.workers == 1:
+            for query_name, query_definition in definitions:
+                self._record(self._run_query(query_name, self._prepare(query_name, query_definition)))
+        else:
+            self._run_pooled(definitions)
+        self._finish(start)
+
+    def _start(self, definitions) -> List[Tuple[str, OPresponseDefinition]]:
+        definitions = [(query_name, query_definition)
+                       for query_name, query_definition in definitions if query_definition.enabled]
+        self._total = len(definitions)
+        self._completed = 0
+        return definitions
+
+    def _finish(self, start: float):
+        self._report(f"{self._total} definitions in {time.perf_counter() - start:.2f}s "
+                     f"({self.workers} at a time)")
+
+    def _run_pooled(self, definitions):
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="response-gen") as executor:
+            try:
+                for query_name, query_definition in definitions:
+                    query = self._prepare(query_name, query_definition)
+                    if definition_changes_state(query_definition):
+                        self._record_pending(pending, wait=True)
+                        self._record(self._run_query(query_name, query))
+                    else:
+                        pending.append(executor.submit(self._run_query, query_name, query))
+                        self._record_pending(pending, wait=False)
+                self._record_pending(pending, wait=True)
+            finally:
+                # if anything failed, don't start anything not already running
+                for future in pending:
+                    future.cancel()
+
+    async def run_async(self, definitions: Iterable[Tuple[str, OPresponseDefinition]]):
+        """
+        Like run(), but 'prepare' returns coroutine functions, e.g., ones that await
+        OPAsyncResponseGenerator.generate(), and up to 'workers' of them run at once
+        """
+        definitions = self._start(definitions)
+        start = time.perf_counter()
+        slots = asyncio.Semaphore(self.workers)
+        pending: Deque[asyncio.Future] = deque()
+        try:
+            for query_name, query_definition in definitions:
+                query = self._prepare(query_name, query_definition)
+                if definition_changes_state(query_definition):
+                    await self._record_pending_async(pending, wait=True)
+                    self._record(await self._run_query_async(query_name, query, slots))
+                else:
+                    pending.append(asyncio.ensure_future(self._run_query_async(query_name, query, slots)))
+                    await self._record_pending_async(pending, wait=False)
+            await self._record_pending_async(pending, wait=True)
+        finally:
+            for future in pending:
+                future.cancel()
+        self._finish(start)
+
+    async def _record_pending_async(self, pending: Deque[asyncio.Future], wait: bool):
+        while pending and (wait or pending[0].done()):
+            self._record(await pending[0])
+            pending.popleft()
+
+    async def _run_query_async(self,
+                               query_name: str,
+                               query: Callable[[], Awaitable[Any]],
+                               slots: asyncio.Semaphore) -> OPResponseGenResult:
+        async with slots:
+            start = time.perf_counter()
+            invocation = await query()
+        return self._finish_query(query_name, invocation, start)
+
+    def _record_pending(self, pending: Deque[Future], wait: bool):
+        # results are recorded in the order they were submitted, so one that finishes early
+        # waits for those ahead of it
+        while pending and (wait or pending[0].done()):
+            self._record(pending[0].result())
+            pending.popleft()
+
+    def _run_query(self, query_name: str, query: Callable[[], Any]) -> OPResponseGenResult:
+        start = time.perf_counter()
+        invocation = query()
+        return self._finish_query(query_name, invocation, start)
+
+    def _finish_query(self, query_name: str, invocation: Any, start: float) -> OPResponseGenResult:
+        result = OPResponseGenResult(query_name, invocation, time.perf_counter() - start)
+        with self._progress_lock:
+            self._completed += 1
+            completed = self._completed
+        self._report(f"[{completed}/{self._total}] {query_name}: {result.elapsed:.2f}s")
+        return result
+
+    def _report(self, msg: str):
+        if self._progress is None:
+            return
+        with self._progress_lock:
+            print(msg, file=self._progress, flush=True)
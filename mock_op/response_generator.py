@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, Union
+from typing import TYPE_CHECKING, List, Optional, Union
 
 from mock_cli import CommandInvocation
 
@@ -10,6 +10,7 @@ from ._op import OP, OPItemList, _OPArgv, op_logging
 
 if TYPE_CHECKING:
     from ._op import OPFieldTypeEnum, OPPasswordRecipe
+    from .response_gen_lookups import OPResponseGenLookupCache
 
 
 class OPResponseGenerationException(Exception):
@@ -18,6 +19,19 @@ class OPResponseGenerationException(Exception):
 
 class OPResponseGenerator(OP):
     logger = op_logging.console_logger("OPresponseGenerator", op_logging.DEBUG)
+    # if set, lookups made before recording a command are remembered there,
+    # e.g., by response-generator for the length of a run
+    lookup_cache: Optional[OPResponseGenLookupCache] = None
+
+    def _lookup_item(self, item_name_or_uuid, vault=None):
+        if self.lookup_cache is None:
+            return self.item_get(item_name_or_uuid, vault=vault)
+        return self.lookup_cache.item_get(self.item_get, item_name_or_uuid, vault=vault)
+
+    def _lookup_item_list(self, **kwargs):
+        if self.lookup_cache is None:
+            return self.item_list(**kwargs)
+        return self.lookup_cache.item_list(self.item_list, **kwargs)
 
     @classmethod
     def _generate_response_dict(cls, argv_obj,
@@ -79,11 +93,11 @@ class OPResponseGenerator(OP):
             categories = list()
         if tags is None:
             tags = list()
-        item_list = self.item_list(categories=categories,
-                                   include_archive=include_archive,
-                                   tags=tags,
-                                   title_glob=title_glob,
-                                   vault=vault, generic_okay=True)
+        item_list = self._lookup_item_list(categories=categories,
+                                           include_archive=include_archive,
+                                           tags=tags,
+                                           title_glob=title_glob,
+                                           vault=vault, generic_okay=True)
         start = 0
         end = len(item_list)
 
@@ -156,7 +170,7 @@ class OPResponseGenerator(OP):
         # tags should already be a List[str], OPConfigParser handled that for us
 
         if append_tags:
-            item = self.item_get(item_name_or_uuid, vault=vault)
+            item = self._lookup_item(item_name_or_uuid, vault=vault)
             existing_tags = item.tags
             for tag in tag_list:
                 if tag not in existing_tags:
@@ -270,7 +284,7 @@ class OPResponseGenerator(OP):
             # under normal circumstances op.document_edit() first does an item_get()
             # then looks up the item id to do the document edit
             # so we need to simulate that here
-            document_item = self.item_get(document_name_or_uuid, vault=vault)
+            document_item = self._lookup_item(document_name_or_uuid, vault=vault)
             document_id = document_item.unique_id
         else:
             document_id = document_name_or_uuid
@@ -445,11 +459,20 @@ class OPResponseGenerator(OP):
     @classmethod
     def _generate_response(cls, run_argv, query_name, expected_return, changes_state, record_argv=None, input=None):
         cls.logger.info(f"About to run: {run_argv.cmd_str()}")
-        if record_argv is None:
-            record_argv = run_argv
         stdout, stderr, returncode = cls._run_raw(
             run_argv, capture_stdout=True, ignore_error=True, input=input)
 
+        resp_dict = cls._response_invocation(run_argv, query_name, expected_return, changes_state,
+                                             stdout, stderr, returncode, record_argv=record_argv, input=input)
+
+        return resp_dict
+
+    @classmethod
+    def _response_invocation(cls, run_argv, query_name, expected_return, changes_state,
+                             stdout, stderr, returncode, record_argv=None, input=None):
+        if record_argv is None:
+            record_argv = run_argv
+
         if returncode != expected_return:
             cls.logger.error(
                 f"Unexpected return code: expected {expected_return}, got {returncode}")
@@ -20,7 +20,10 @@ class OPConfigParser(ConfigParser):
         "append-tags": "getboolean",
         "travel-mode": "getboolean",
         "emails": "getcsvlist",
-        "view-once": "getboolean"
+        "view-once": "getboolean",
+        "compression-level": "getint",
+        "workers": "getint",
+        "save-batch-size": "getint"
     }
 
     def items(self, section):
@@ -79,12 +82,19 @@ class OPresponseDefinition(dict):
     def enabled(self) -> bool:
         return self.get('enabled', True)
 
+    @property
+    def changes_state(self) -> bool:
+        return self.get('changes-state', False)
+
 
 class OPResponseGenConfig(dict[str, OPresponseDefinition]):
     MAIN_SECTION = "MAIN"
     CONF_PATH_KEY = "config-path"
     RESP_PATH_KEY = "response-path"
     INPUT_PATH_KEY = "input-path"
+    BLOB_PATH_KEY = "blob-path"
+    COMPRESSION_KEY = "compression"
+    COMPRESSION_LEVEL_KEY = "compression-level"
     RESP_DIR_KEY = "response-dir-file"
     IGN_SIGNIN_FAIL_KEY = "ignore-signin-fail"
     EXISTING_AUTH_KEY = "existing-auth"
@@ -93,6 +103,8 @@ class OPResponseGenConfig(dict[str, OPresponseDefinition]):
     SET_VARS_KEY = "set-env-vars"
     POP_VARS_KEY = "pop-env-vars"
     SKIP_GLOBAL_SIGNIN_KEY = "skip-global-signin"
+    WORKERS_KEY = "workers"
+    SAVE_BATCH_SIZE_KEY = "save-batch-size"
 
     def __init__(self, config_path, definition_whitelist=[]):
         super().__init__()
@@ -106,6 +118,12 @@ class OPResponseGenConfig(dict[str, OPresponseDefinition]):
             self.MAIN_SECTION, self.IGN_SIGNIN_FAIL_KEY, fallback=False)
         self.input_path = conf.get(
             self.MAIN_SECTION, self.INPUT_PATH_KEY, fallback=None)
+        self.blob_path = conf.get(
+            self.MAIN_SECTION, self.BLOB_PATH_KEY, fallback=None)
+        self.compression = conf.get(
+            self.MAIN_SECTION, self.COMPRESSION_KEY, fallback=None)
+        self.compression_level = conf.get(
+            self.MAIN_SECTION, self.COMPRESSION_LEVEL_KEY, fallback=None)
         self.existing_auth = conf.get(
             self.MAIN_SECTION, self.EXISTING_AUTH_KEY, fallback="available")
         self.state_conf = conf.get(
@@ -120,6 +138,10 @@ class OPResponseGenConfig(dict[str, OPresponseDefinition]):
             self.MAIN_SECTION, self.POP_VARS_KEY, fallback=None)
         self.skip_global_signin = conf.get(
             self.MAIN_SECTION, self.SKIP_GLOBAL_SIGNIN_KEY, fallback=False)
+        self.workers = conf.get(
+            self.MAIN_SECTION, self.WORKERS_KEY, fallback=None)
+        self.save_batch_size = conf.get(
+            self.MAIN_SECTION, self.SAVE_BATCH_SIZE_KEY, fallback=None)
 
         response_defs = self._get_response_defs(conf, definition_whitelist)
         self.update(response_defs)
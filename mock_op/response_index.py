@@ -0,0 +1,387 @@
+"""
+An indexed, on-disk form of a response directory
+
+Rather than parsing an entire response-directory.json file to look up a single
+command, responses are stored in a SQLite database keyed on input hash and
+argument string. The index records the modification time, size and digest of the
+JSON file it was compiled from, so it can be rebuilt when the JSON file changes.
+
+The index also holds the words of each command's arguments, so the closest recorded
+commands can be suggested when a lookup fails without scanning every command.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from mock_cli import (
+    CommandResponse,
+    ResponseDirectory,
+    ResponseDirectoryException,
+    ResponseLookupException
+)
+from mock_cli.argv_conversion import (
+    arg_shlex_from_string,
+    argv_from_string,
+    argv_to_string
+)
+from mock_cli.hashing import digest_input
+
+from ._meta_paths import relative_meta_path, resolve_meta_path
+from .mock_op_arg_validator import mock_op_arg_validator
+
+INDEX_FORMAT_VERSION = 1
+INDEX_SUFFIX = ".index.sqlite"
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+_SCHEMA = [
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)",
+    # plain commands are stored with an empty input hash
+    # rowid order preserves the order of the original JSON file
+    ("CREATE TABLE commands (input_hash TEXT NOT NULL, args TEXT NOT NULL, response TEXT NOT NULL, "
+     "PRIMARY KEY (input_hash, args))"),
+    # the rowids of the commands each word of their arguments appears in, as little endian int64s
+    "CREATE TABLE tokens (token TEXT PRIMARY KEY, count INTEGER NOT NULL, commands BLOB NOT NULL)"
+]
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class MockOPResponseIndexException(Exception):
+    pass
+
+
+def response_index_path(respdir_json_file: Union[str, Path]) -> Path:
+    respdir_json_file = Path(respdir_json_file)
+    index_name = f"{respdir_json_file.stem}{INDEX_SUFFIX}"
+    return Path(respdir_json_file.parent, index_name)
+
+
+def is_response_index(path: Union[str, Path]) -> bool:
+    try:
+        with open(path, "rb") as f:
+            header = f.read(len(SQLITE_HEADER))
+    except OSError:
+        return False
+    return header == SQLITE_HEADER
+
+
+def subcommand_token(words: List[str]) -> str:
+    # can't be mistaken for a word, which never contains ':'
+    return "subcommand:" + " ".join(words)
+
+
+def command_tokens(arg_string: str) -> Set[str]:
+    """
+    The distinct lower case words of a command's arguments, e.g., 'vault' and 'private'
+    for '--vault Private', along with a token for its subcommand, e.g., 'item get'
+    """
+    # the separator isn't a word character, so there's no need to split the arguments apart
+    tokens = set(_TOKEN_RE.findall(arg_string.lower()))
+    words = mock_op_arg_validator().subcommand_path(argv_from_string(arg_string))
+    if words:
+        tokens.add(subcommand_token(words))
+    return tokens
+
+
+def _pack_commands(commands: List[int]) -> bytes:
+    packed = array("q", commands)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_commands(blob: bytes) -> List[int]:
+    commands = array("q")
+    commands.frombytes(blob)
+    if sys.byteorder != "little":
+        commands.byteswap()
+    return commands.tolist()
+
+
+def _insert_tokens(conn: sqlite3.Connection):
+    token_commands: Dict[str, List[int]] = {}
+    for rowid, args in conn.execute("SELECT rowid, args FROM commands").fetchall():
+        for token in command_tokens(args):
+            token_commands.setdefault(token, []).append(rowid)
+    conn.executemany("INSERT INTO tokens VALUES (?, ?, ?)",
+                     ((token, len(commands), _pack_commands(commands))
+                      for token, commands in sorted(token_commands.items())))
+
+
+def _file_digest(path) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def compile_response_index(respdir_json_file: Union[str, Path],
+                           index_path: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Build an index from a response directory JSON file, replacing any existing index
+    """
+    respdir_json_file = Path(respdir_json_file)
+    if index_path is None:
+        index_path = response_index_path(respdir_json_file)
+    index_path = Path(index_path)
+
+    try:
+        st = os.stat(respdir_json_file)
+        with open(respdir_json_file, "rb") as f:
+            json_bytes = f.read()
+        directory = json.loads(json_bytes)
+    except (OSError, ValueError) as e:
+        raise ResponseDirectoryException(
+            f"Directory path not found {respdir_json_file}") from e
+
+    meta = directory["meta"]
+    blob_dir = meta.get("blob_dir")
+    if blob_dir:
+        # the index may not be next to the JSON file
+        blob_dir = relative_meta_path(resolve_meta_path(blob_dir, respdir_json_file), index_path)
+    index_meta = {
+        "format-version": str(INDEX_FORMAT_VERSION),
+        "source-mtime-ns": str(st.st_mtime_ns),
+        "source-size": str(st.st_size),
+        "source-digest": hashlib.md5(json_bytes).hexdigest(),
+        "response_dir": meta["response_dir"],
+        "input_dir": meta.get("input_dir"),
+        "blob_dir": blob_dir
+    }
+
+    # build the index alongside the final location then rename it into place,
+    # so concurrent readers never see a partially written index
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=index_path.parent, prefix=f".{index_path.name}-")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", index_meta.items())
+            conn.executemany("INSERT INTO commands VALUES ('', ?, ?)",
+                             ((args, json.dumps(response))
+                              for args, response in directory.get("commands", {}).items()))
+            for input_hash, commands in directory.get("commands_with_input", {}).items():
+                conn.executemany("INSERT INTO commands VALUES (?, ?, ?)",
+                                 ((input_hash, args, json.dumps(response))
+                                  for args, response in commands.items()))
+            _insert_tokens(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return index_path
+
+
+class MockOPIndexedResponseDirectory(ResponseDirectory):
+    """
+    A read-only response directory backed by a compiled response index
+    """
+
+    def __init__(self, index_path: Union[str, Path]):
+        # We deliberately don't call the superclass's constructor,
+        # since that would load the entire JSON directory
+        index_path = Path(index_path)
+        self._index_path = index_path
+        self._response_responsedir_json_filename = None
+        self._input_dir = None
+        try:
+            self._conn = sqlite3.connect(f"{index_path.absolute().as_uri()}?mode=ro", uri=True)
+            self._meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        except sqlite3.Error as e:
+            raise ResponseDirectoryException(
+                f"Unable to open response index {index_path}: {e}") from e
+        if self._meta.get("format-version") != str(INDEX_FORMAT_VERSION):
+            raise ResponseDirectoryException(
+                f"Unsupported response index format: {index_path}")
+        if self._meta.get("input_dir"):
+            self._input_dir = Path(self._meta["input_dir"])
+
+    @property
+    def index_path(self) -> Path:
+        return self._index_path
+
+    @property
+    def meta(self) -> Dict[str, str]:
+        return self._meta
+
+    @property
+    def response_dir(self):
+        return self._meta["response_dir"]
+
+    @property
+    def blob_dir(self) -> Optional[str]:
+        blob_dir = self._meta.get("blob_dir")
+        if blob_dir:
+            blob_dir = resolve_meta_path(blob_dir, self._index_path)
+        return blob_dir
+
+    @property
+    def commands(self) -> Dict[str, Dict]:
+        commands = {}
+        for _, args, response in self.iter_commands(input_hash=""):
+            commands[args] = response
+        return commands
+
+    @property
+    def commands_with_input(self) -> Dict[str, Dict[str, Dict]]:
+        commands_with_input = {}
+        for input_hash, args, response in self.iter_commands():
+            if input_hash:
+                commands_with_input.setdefault(input_hash, {})[args] = response
+        return commands_with_input
+
+    def iter_commands(self, input_hash: Optional[str] = None,
+                      args_contain: Iterable[str] = (),
+                      decode: bool = True) -> Iterator[Tuple[str, str, Union[Dict, str]]]:
+        """
+        Iterate over (input hash, argument string, response dictionary) entries,
+        optionally only for the given input hash, and only those whose argument string
+        contains each of 'args_contain'. Plain commands have an empty input hash
+
+        If 'decode' is False, responses are left as JSON text, for callers that may not need them
+        """
+        conditions = []
+        params = []
+        if input_hash is not None:
+            conditions.append("input_hash = ?")
+            params.append(input_hash)
+        for substring in args_contain:
+            conditions.append("instr(args, ?) > 0")
+            params.append(substring)
+        query = "SELECT input_hash, args, response FROM commands"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY rowid"
+        cursor = self._conn.execute(query, params)
+        for _input_hash, args, response in cursor:
+            if decode:
+                response = json.loads(response)
+            yield _input_hash, args, response
+
+    @property
+    def has_tokens(self) -> bool:
+        # indexes compiled by earlier versions have no token table
+        row = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tokens'").fetchone()
+        return row is not None
+
+    def command_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM commands").fetchone()[0]
+
+    def token_frequencies(self, tokens: Iterable[str]) -> Dict[str, int]:
+        """
+        How many commands each of 'tokens' appears in
+        """
+        frequencies = {}
+        for token in tokens:
+            row = self._conn.execute("SELECT count FROM tokens WHERE token = ?", (token,)).fetchone()
+            frequencies[token] = row[0] if row is not None else 0
+        return frequencies
+
+    def token_commands(self, token: str, limit: int) -> List[int]:
+        """
+        Up to 'limit' of the commands a token appears in
+        """
+        row = self._conn.execute("SELECT commands FROM tokens WHERE token = ?", (token,)).fetchone()
+        if row is None:
+            return []
+        return _unpack_commands(row[0][:limit * 8])
+
+    def command_at(self, command: int) -> Tuple[str, str]:
+        """
+        The input hash and argument string of a command returned by token_commands()
+        """
+        return self._conn.execute(
+            "SELECT input_hash, args FROM commands WHERE rowid = ?", (command,)).fetchone()
+
+    def response_lookup(self, args, input=None) -> CommandResponse:
+        return self.response_lookup_digest(args, digest_input(input))
+
+    def response_lookup_digest(self, args, input_hash: Optional[str]) -> CommandResponse:
+        """
+        Look up a response by the digest of its input rather than the input itself
+        """
+        arg_string = argv_to_string(args)
+        row = self._conn.execute(
+            "SELECT response FROM commands WHERE input_hash = ? AND args = ?",
+            (input_hash or "", arg_string)).fetchone()
+        if row is None:
+            escaped_arg_str = arg_shlex_from_string(arg_string)
+            raise ResponseLookupException(
+                "No response for command args: {}".format(escaped_arg_str))
+
+        response_dict = json.loads(row[0])
+        response = CommandResponse(response_dict, self.response_dir)
+        return response
+
+    def add_command_invocation(self, *args, **kwargs):
+        raise MockOPResponseIndexException(
+            "Response indexes are read-only. Add invocations to the JSON response directory and recompile")
+
+    def close(self):
+        self._conn.close()
+
+
+def _index_is_current(index_path: Path, respdir_json_file: Path) -> bool:
+    try:
+        st = os.stat(respdir_json_file)
+        conn = sqlite3.connect(index_path)
+    except (OSError, sqlite3.Error):
+        return False
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        if meta.get("format-version") != str(INDEX_FORMAT_VERSION):
+            return False
+        if (meta.get("source-mtime-ns") == str(st.st_mtime_ns)
+                and meta.get("source-size") == str(st.st_size)):
+            return True
+        # The JSON file was touched (e.g., by a fresh checkout), but may not have changed.
+        # If the contents are the same, update the recorded time so we don't have
+        # to digest it again next time
+        if meta.get("source-digest") != _file_digest(respdir_json_file):
+            return False
+        try:
+            with conn:
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'source-mtime-ns'",
+                             (str(st.st_mtime_ns),))
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'source-size'",
+                             (str(st.st_size),))
+        except sqlite3.OperationalError:
+            # e.g., index is read-only; it's still current since the contents match
+            pass
+        return True
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
+
+def open_indexed_response_directory(respdir_json_file: Union[str, Path]) -> Optional[MockOPIndexedResponseDirectory]:
+    """
+    Open the compiled index for a response directory JSON file, rebuilding it first if the
+    JSON file has changed since it was compiled
+
+    Returns None if the response directory has never been compiled
+    """
+    respdir_json_file = Path(respdir_json_file)
+    index_path = response_index_path(respdir_json_file)
+    if not index_path.exists():
+        return None
+    # if there's only an index, e.g., because the JSON file isn't distributed, use it as is
+    if respdir_json_file.exists() and not _index_is_current(index_path, respdir_json_file):
+        compile_response_index(respdir_json_file, index_path=index_path)
+    return MockOPIndexedResponseDirectory(index_path)
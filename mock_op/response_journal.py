@@ -0,0 +1,129 @@
+"""
+Recording responses without rewriting the whole response directory after each one
+
+Saving a response directory rewrites its entire JSON file, so saving after every response
+makes generating a large directory take time proportional to the square of its size.
+MockOPResponseJournal instead appends each newly recorded command to a journal alongside
+the JSON file (e.g., response-directory.json.journal), one JSON object per line, synced to
+disk before moving on. The JSON file itself is only rewritten, atomically, once a batch of
+commands has built up, and when the journal is closed, after which the journal is removed.
+
+A command's output files are written before it's journaled, so if a run is interrupted,
+everything but the query in flight is in the journal. The next time the response directory is
+journaled, e.g., by response-generator, any commands left in the journal are replayed into it.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict
+
+from mock_cli import CommandInvocation
+from mock_cli.argv_conversion import argv_to_string
+
+from .response_directory import MockOPResponseDirectory
+
+JOURNAL_SUFFIX = ".journal"
+DEFAULT_SAVE_BATCH_SIZE = 100
+
+
+def response_journal_path(respdir_json_file) -> Path:
+    respdir_json_file = Path(respdir_json_file)
+    return Path(respdir_json_file.parent, f"{respdir_json_file.name}{JOURNAL_SUFFIX}")
+
+
+class MockOPResponseJournal:
+    """
+    Journal the commands added to a response directory, saving the directory in batches
+
+    Use add_command_invocation() in place of the directory's own, and close() when done, e.g.,
+    by using the journal as a context manager. Opening a journal replays any commands a previous
+    one left behind when interrupted.
+    """
+
+    def __init__(self, directory: MockOPResponseDirectory, save_batch_size: int = DEFAULT_SAVE_BATCH_SIZE):
+        self._directory = directory
+        self.save_batch_size = max(save_batch_size, 1)
+        self.path = response_journal_path(directory.json_file)
+        self._journal = None
+        self._unsaved_count = 0
+        self.replayed_count = self._replay()
+
+    def _replay(self) -> int:
+        try:
+            with open(self.path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return 0
+
+        replayed = 0
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line may have been cut short, but everything before it is complete
+                continue
+            self._directory.restore_recorded_command(entry["args"], entry["input_hash"], entry["response"])
+            replayed += 1
+        if replayed:
+            self._directory.save()
+        self._discard()
+        return replayed
+
+    def add_command_invocation(self, cmd: CommandInvocation, overwrite=False, save=False):
+        """
+        Add a command to the directory and journal it. If 'save' is true, the journal is synced
+        to disk, and if a batch has built up, the directory is saved
+        """
+        self._directory.add_command_invocation(cmd, overwrite=overwrite, save=False)
+        # the directory may have recorded it under a different argument list, e.g., a canonical one
+        arg_string = argv_to_string(cmd.cmd_args)
+        input_hash = cmd.input_hash or None
+        self._append({
+            "args": arg_string,
+            "input_hash": input_hash,
+            "response": self._directory.recorded_command(arg_string, input_hash)
+        })
+        self._unsaved_count += 1
+        if save:
+            self._sync()
+            if self._unsaved_count >= self.save_batch_size:
+                self.save()
+
+    def _append(self, entry: Dict):
+        if self._journal is None:
+            self._journal = open(self.path, "a")
+        self._journal.write(json.dumps(entry) + "\n")
+
+    def _sync(self):
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def _discard(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        """
+        Save the directory, after which its journal is no longer needed
+        """
+        if not self._unsaved_count:
+            return
+        self._directory.save()
+        self._discard()
+        self._unsaved_count = 0
+
+    def close(self):
+        self.save()
+        self._discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,293 @@
+"""
+A packed archive of a response directory's output files
+
+Rather than one 'output' & 'error_output' file per recorded response, a response
+pack holds every file from a response directory tree in a single blob file:
+
+    [header: magic, version][blob][blob]...[offset table (JSON)][footer: table offset, table length, magic]
+
+Blobs are only ever appended. The offset table maps each file's path, relative to
+the response directory, to its offset and length in the pack. Packs are read via mmap,
+so serving a response is just a slice of the mapping.
+
+A pack for a response directory lives next to it, e.g., 'responses.pack' for 'responses'.
+Loose files in the response directory take precedence over packed ones, so responses
+recorded after packing are still found.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+from .command_response import MockOPCommandResponse
+from .output_stream import OutputSource
+
+PACK_SUFFIX = ".pack"
+PACK_MAGIC = b"MOCKOPPK"
+PACK_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("!8sI")
+_FOOTER = struct.Struct("!QQ8s")
+
+
+class MockOPResponsePackException(Exception):
+    pass
+
+
+def response_pack_path(response_dir: Union[str, Path]) -> Path:
+    response_dir = Path(response_dir)
+    return Path(response_dir.parent, f"{response_dir.name}{PACK_SUFFIX}")
+
+
+class MockOPResponsePack:
+
+    def __init__(self, pack_path: Union[str, Path]):
+        self._pack_path = Path(pack_path)
+        with open(self._pack_path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._file_id = (st.st_ino, st.st_mtime_ns, st.st_size)
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise MockOPResponsePackException(
+                    f"Invalid response pack: {self._pack_path}") from e
+        self._table = self._read_table()
+
+    def _read_table(self) -> Dict[str, Tuple[int, int]]:
+        _map = self._map
+        if len(_map) < _HEADER.size + _FOOTER.size:
+            raise MockOPResponsePackException(
+                f"Invalid response pack: {self._pack_path}")
+        magic, version = _HEADER.unpack_from(_map, 0)
+        table_offset, table_len, footer_magic = _FOOTER.unpack_from(
+            _map, len(_map) - _FOOTER.size)
+        if magic != PACK_MAGIC or footer_magic != PACK_MAGIC:
+            raise MockOPResponsePackException(
+                f"Invalid response pack: {self._pack_path}")
+        if version != PACK_FORMAT_VERSION:
+            raise MockOPResponsePackException(
+                f"Unsupported response pack version {version}: {self._pack_path}")
+        table = json.loads(_map[table_offset:table_offset + table_len])
+        return table
+
+    @property
+    def pack_path(self) -> Path:
+        return self._pack_path
+
+    @property
+    def file_id(self) -> Tuple[int, int, int]:
+        return self._file_id
+
+    def __contains__(self, relpath: str) -> bool:
+        return relpath in self._table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def entries(self) -> Iterator[Tuple[str, int]]:
+        """
+        Iterate over (relative path, length) for each packed file
+        """
+        for relpath, (_, length) in self._table.items():
+            yield relpath, length
+
+    def size(self, relpath: str) -> Optional[int]:
+        entry = self._table.get(relpath)
+        return entry[1] if entry is not None else None
+
+    def view(self, relpath: str) -> memoryview:
+        try:
+            offset, length = self._table[relpath]
+        except KeyError:
+            raise FileNotFoundError(
+                f"{relpath} not found in response pack {self._pack_path}") from None
+        return memoryview(self._map)[offset:offset + length]
+
+    def read(self, relpath: str) -> bytes:
+        with self.view(relpath) as view:
+            data = view.tobytes()
+        return data
+
+    def close(self):
+        self._map.close()
+
+
+class MockOPResponsePackWriter:
+    """
+    Writes a new response pack, which replaces any existing pack at the same path
+    once the writer is closed
+    """
+
+    def __init__(self, pack_path: Union[str, Path]):
+        self._pack_path = Path(pack_path)
+        self._pack_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(
+            dir=self._pack_path.parent, prefix=f".{self._pack_path.name}-")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(_HEADER.pack(PACK_MAGIC, PACK_FORMAT_VERSION))
+        self._offset = _HEADER.size
+        self._table: Dict[str, Tuple[int, int]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, relpath: str, data: Union[bytes, memoryview]):
+        self._file.write(data)
+        self._table[relpath] = (self._offset, len(data))
+        self._offset += len(data)
+
+    def close(self):
+        table = json.dumps(self._table).encode("utf-8")
+        try:
+            self._file.write(table)
+            self._file.write(_FOOTER.pack(self._offset, len(table), PACK_MAGIC))
+            self._file.close()
+            os.replace(self._tmp_path, self._pack_path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        self._file.close()
+        os.unlink(self._tmp_path)
+
+
+_open_packs: Dict[str, Tuple[Tuple[int, int], MockOPResponsePack]] = {}
+
+
+def open_response_pack(response_dir: Union[str, Path]) -> Optional[MockOPResponsePack]:
+    """
+    Open the pack for a response directory if there is one, reusing an already open pack
+    if it hasn't changed on disk
+    """
+    pack_path = str(response_pack_path(response_dir))
+    try:
+        st = os.stat(pack_path)
+    except OSError:
+        return None
+    file_id = (st.st_mtime_ns, st.st_size)
+    cached = _open_packs.get(pack_path)
+    if cached and cached[0] == file_id:
+        pack = cached[1]
+    else:
+        pack = MockOPResponsePack(pack_path)
+        _open_packs[pack_path] = (file_id, pack)
+    return pack
+
+
+def pack_response_dir(response_dir: Union[str, Path], remove: bool = False) -> Tuple[int, int]:
+    """
+    Pack every file in a response directory tree
+
+    Files already in the response directory's pack are kept, unless replaced by a loose file
+    of the same name. Returns the number of files and total number of bytes in the new pack.
+    If 'remove' is True, the packed files are deleted afterward, along with any directories
+    left empty
+    """
+    response_dir = Path(response_dir)
+    pack_path = response_pack_path(response_dir)
+    file_count = 0
+    byte_count = 0
+    packed_files = []
+    loose_files = {}
+    for dirpath, dirnames, filenames in os.walk(response_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(dirpath, filename)
+            loose_files[path.relative_to(response_dir).as_posix()] = path
+
+    existing_pack = MockOPResponsePack(pack_path) if pack_path.exists() else None
+    try:
+        with MockOPResponsePackWriter(pack_path) as writer:
+            if existing_pack is not None:
+                for relpath, length in existing_pack.entries():
+                    if relpath in loose_files:
+                        continue
+                    with existing_pack.view(relpath) as view:
+                        writer.add(relpath, view)
+                    file_count += 1
+                    byte_count += length
+            for relpath, path in loose_files.items():
+                data = path.read_bytes()
+                writer.add(relpath, data)
+                packed_files.append(path)
+                file_count += 1
+                byte_count += len(data)
+    finally:
+        if existing_pack is not None:
+            existing_pack.close()
+
+    if remove:
+        for path in packed_files:
+            path.unlink()
+        for dirpath, _, _ in sorted(os.walk(response_dir), reverse=True):
+            if not os.listdir(dirpath):
+                os.rmdir(dirpath)
+    return file_count, byte_count
+
+
+def unpack_response_dir(response_dir: Union[str, Path], remove: bool = False) -> Tuple[int, int]:
+    """
+    Extract every file in a response directory's pack, overwriting existing files
+
+    Returns the number of files and total number of bytes extracted. If 'remove' is True,
+    the pack is deleted afterward
+    """
+    response_dir = Path(response_dir)
+    pack_path = response_pack_path(response_dir)
+    pack = MockOPResponsePack(pack_path)
+    file_count = 0
+    byte_count = 0
+    try:
+        for relpath, length in pack.entries():
+            path = Path(response_dir, relpath)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with pack.view(relpath) as view:
+                path.write_bytes(view)
+            file_count += 1
+            byte_count += length
+    finally:
+        pack.close()
+    if remove:
+        pack_path.unlink()
+    return file_count, byte_count
+
+
+class MockOPPackedCommandResponse(MockOPCommandResponse):
+    """
+    A command response whose output files may be in a response pack
+
+    Loose files take precedence over packed ones
+    """
+
+    def __init__(self, response_dict, response_dir, pack: MockOPResponsePack, output=None, error_output=None,
+                 blob_store=None, decompression_cache=None):
+        super().__init__(response_dict, response_dir, output=output, error_output=error_output,
+                         blob_store=blob_store, decompression_cache=decompression_cache)
+        self._pack = pack
+
+    def _pack_relpath(self, out_name) -> str:
+        return f"{self['name']}/{out_name}"
+
+    def _open_stored(self, out_name) -> OutputSource:
+        try:
+            output = super()._open_stored(out_name)
+        except FileNotFoundError:
+            output = self._pack.view(self._pack_relpath(out_name))
+        return output
+
+    def _stored_id(self, out_name):
+        try:
+            stored_id = super()._stored_id(out_name)
+        except FileNotFoundError:
+            stored_id = (str(self._pack.pack_path), self._pack.file_id, self._pack_relpath(out_name))
+        return stored_id
@@ -2,10 +2,11 @@ from datetime import datetime
 from random import choice
 from string import ascii_letters, digits
 
-from mock_cli import CommandResponse, MockCommand
+from .command_response import MockOPCommandResponse
+from .mock_op_command import MockOPCommand
 
 
-class MockOPSigninResponse(MockCommand):
+class MockOPSigninResponse(MockOPCommand):
     TOKEN_LEN = 43
     ERROR_STATUS = 1
     SUCCESS_STATUS = 0
@@ -17,7 +18,7 @@ class MockOPSigninResponse(MockCommand):
         "# Use the --raw flag to only output the session token.\n"
     )
 
-    def __init__(self, account_identifier, signin_success=True, raw=True):
+    def __init__(self, account_identifier, signin_success=True, raw=True, stdout=None, stderr=None):
         changes_state = False
         if signin_success:
             if account_identifier:
@@ -51,15 +52,15 @@ class MockOPSigninResponse(MockCommand):
             "exit_status": exit_status,
             "name": "op sign-in response"
         }
-        super().__init__()
-        response = CommandResponse(
+        super().__init__(stdout=stdout, stderr=stderr)
+        response = MockOPCommandResponse(
             resp_dict, None, output=output, error_output=error_output)
         self._response = response
 
     def _get_response_directory(self, *args):
         return None
 
-    def get_response(self, *args, **kwargs) -> CommandResponse:
+    def get_response(self, *args, **kwargs) -> MockOPCommandResponse:
         return self._response
 
     def _generate_token(self):
@@ -0,0 +1,268 @@
+"""
+A state configuration store that's safe to share between concurrent mock-op processes
+
+mock_cli's state handling reads the state configuration once, and later rewrites it
+in place with its in-memory iteration plus one. Concurrent mock-ops sharing a state
+configuration can therefore lose transitions, or read a half-written file.
+
+Here, every iteration advance happens with an exclusive lock held on a lock file
+next to the state configuration ('config.json.lock' for 'config.json'), re-reading the
+current iteration from disk first. The configuration is replaced atomically, so readers
+never need a lock to see a complete file.
+
+With a state session, the state configuration isn't modified at all. Instead, each session
+keeps its own iteration in a cursor file in a sessions directory alongside the state
+configuration ('config.json.sessions' for 'config.json'). A session that has no cursor
+file yet starts at the configuration's iteration, so creating a session costs nothing,
+and resetting one is just deleting its cursor file. A session's lock file is kept next to
+its cursor file, so nothing is ever written alongside the state configuration, which may
+be read-only.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+
+from mock_cli.mock_cmd_state import (
+    STATE_DIR_ENV_NAME,
+    MockCMDState,
+    MockCMDStateConfig,
+    MockCMDStateDirException,
+    MockCMDStateNoDirectoryException
+)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_SUFFIX = ".lock"
+SESSIONS_SUFFIX = ".sessions"
+
+STATE_SESSION_DIR_ENV_NAME = "MOCK_OP_STATE_SESSION_DIR"
+
+
+class MockOPStateException(Exception):
+    pass
+
+
+def write_json_atomic(path: Union[str, Path], obj, indent=2):
+    """
+    Replace a JSON file in a single step, so it's never seen partially written
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            # one write is a lot faster than json.dump()'s many small ones
+            f.write(json.dumps(obj, indent=indent))
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def state_config_path(state_dir: Union[str, Path]) -> Path:
+    """
+    The state configuration file for a state directory, or for a state configuration file
+    """
+    state_dir = Path(state_dir)
+    if state_dir.is_dir():
+        state_path = Path(state_dir, MockCMDState.CONFIG_FILE_NAME)
+    else:
+        state_path = state_dir
+    return state_path
+
+
+def state_session_path(state_path: Union[str, Path], session: str) -> Path:
+    """
+    The cursor file for a state session
+    """
+    state_path = Path(state_path)
+    sessions_dir = os.environ.get(STATE_SESSION_DIR_ENV_NAME)
+    if not sessions_dir:
+        sessions_dir = Path(state_path.parent, f"{state_path.name}{SESSIONS_SUFFIX}")
+    # session identifiers can be anything, e.g., a pytest node ID, so don't use them as file names
+    cursor_name = hashlib.md5(session.encode("utf-8")).hexdigest()
+    return Path(sessions_dir, cursor_name)
+
+
+def reset_state_session(state_dir: Union[str, Path], session: str):
+    """
+    Return a state session to the state configuration's starting iteration
+    """
+    cursor_path = state_session_path(state_config_path(state_dir), session)
+    try:
+        cursor_path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _read_cursor(cursor_path: Path) -> Optional[int]:
+    try:
+        with open(cursor_path, "r") as f:
+            iteration = int(f.read())
+    except FileNotFoundError:
+        iteration = None
+    return iteration
+
+
+class MockOPStateConfig(MockCMDStateConfig):
+
+    def save_config(self):
+        write_json_atomic(self._config_path, self)
+
+    def release_env(self):
+        """
+        Undo this configuration's environment changes
+        """
+        if self._env_config is not None:
+            self._env_config.restore_env()
+            self._env_config = None
+
+
+class MockOPSessionStateConfig(MockOPStateConfig):
+    """
+    A state configuration whose iteration belongs to a state session rather than to the
+    configuration file, which is never written to
+    """
+
+    def __init__(self, config_path, cursor_path: Path, config=None):
+        # the superclass's constructor needs the iteration to set up the environment
+        self._cursor_path = cursor_path
+        self._session_iteration = _read_cursor(cursor_path)
+        super().__init__(config_path, config=config)
+
+    @property
+    def iteration(self) -> int:
+        iteration = self._session_iteration
+        if iteration is None:
+            iteration = self["iteration"]
+        return iteration
+
+    @iteration.setter
+    def iteration(self, iteration):
+        self._session_iteration = iteration
+
+    @property
+    def session_iteration(self) -> Optional[int]:
+        return self._session_iteration
+
+    def save_config(self):
+        self._cursor_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self._cursor_path.parent, prefix=f".{self._cursor_path.name}-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{self.iteration}\n")
+            os.replace(tmp_path, self._cursor_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class MockOPState(MockCMDState):
+    """
+    A mock_cli MockCMDState whose state configuration can be shared by concurrent processes
+
+    If 'session' is provided, iterations are tracked per session, and the state
+    configuration is left untouched
+    """
+
+    def __init__(self, state_dir: Union[str, Path] = None, session: Optional[str] = None):
+        if state_dir is None:
+            state_dir = os.environ.get(STATE_DIR_ENV_NAME)
+
+        if state_dir is None:
+            raise MockCMDStateNoDirectoryException(
+                "No state directory path provided")
+
+        state_dir = Path(state_dir)
+
+        if not state_dir.exists():
+            raise MockCMDStateDirException(
+                f"Invalid state directory: {state_dir}")
+        state_path = state_config_path(state_dir)
+        self._state_path = state_path
+        self._lock_path = Path(state_path.parent, f"{state_path.name}{LOCK_SUFFIX}")
+        self._lock_mode = None
+        self._cursor_path = None
+        if session:
+            self._cursor_path = state_session_path(state_path, session)
+            self._lock_path = Path(self._cursor_path.parent, f"{self._cursor_path.name}{LOCK_SUFFIX}")
+        self._config = self._load_config()
+
+    def _load_config(self, config=None) -> MockOPStateConfig:
+        if self._cursor_path is None:
+            state_config = MockOPStateConfig(self._state_path, config=config)
+        else:
+            state_config = MockOPSessionStateConfig(
+                self._state_path, self._cursor_path, config=config)
+        return state_config
+
+    @property
+    def iteration(self) -> int:
+        return self._config.iteration
+
+    @contextmanager
+    def lock(self, exclusive: bool = False):
+        """
+        Hold a shared, or exclusive, lock on the state configuration
+
+        Locks may be nested, except that an exclusive lock can't be taken while only
+        holding a shared lock
+        """
+        if self._lock_mode is not None:
+            if exclusive and self._lock_mode != fcntl.LOCK_EX:
+                raise MockOPStateException(
+                    "Can't take an exclusive state lock while holding a shared one")
+            yield
+            return
+
+        if fcntl is None:
+            # no advisory locking on this platform; fall back to mock_cli's behavior
+            yield
+            return
+
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if self._cursor_path is not None:
+            self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, mode)
+            self._lock_mode = mode
+            yield
+        finally:
+            self._lock_mode = None
+            os.close(fd)
+
+    def refresh(self) -> bool:
+        """
+        Reload the state configuration if another process has changed it,
+        returning True if it was reloaded
+        """
+        # it's a small file, and timestamps are too coarse to tell back-to-back updates apart
+        with open(self._state_path, "r") as f:
+            config = json.load(f)
+        changed = config != self._config
+        if self._cursor_path is not None:
+            changed = changed or _read_cursor(self._cursor_path) != self._config.session_iteration
+        if not changed:
+            return False
+        self._config.release_env()
+        self._config = self._load_config(config=config)
+        return True
+
+    def iterate_config(self):
+        with self.lock(exclusive=True):
+            # advance from wherever the state is now, not from where it was when we loaded it
+            self.refresh()
+            self._config.iterate()
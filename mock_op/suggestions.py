@@ -0,0 +1,157 @@
+"""
+Suggesting the recorded commands closest to one that wasn't found
+
+Suggestions are only worked out after a lookup has failed, so they cost successful lookups
+nothing. Commands are found through the words of their arguments: compiled response indexes
+store each word's commands, while for response directory JSON files the same is built in
+memory on the first miss, and kept for as long as the directory is.
+
+Candidates sharing the query's rarest words are ranked by how similar their arguments are to
+the query's. Commands for other subcommands are only suggested if none are for the same one.
+A command recorded with different input is still suggested, along with the input hash it was
+recorded with.
+"""
+import difflib
+import math
+import os
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mock_cli.argv_conversion import argv_from_string, argv_to_string
+
+from .command_listing import iter_commands
+from .mock_op_arg_validator import canonical_argv, mock_op_arg_validator
+from .response_index import (
+    MockOPIndexedResponseDirectory,
+    command_tokens,
+    subcommand_token
+)
+
+SUGGESTIONS_ENV_NAME = "MOCK_OP_SUGGESTIONS"
+DEFAULT_SUGGESTIONS = 3
+
+# words appearing in more commands than this are only used to find candidates
+# if rarer ones didn't find enough, and then only this many of their commands
+MAX_TOKEN_COMMANDS = 2000
+# candidates ranked by similarity, after a first cut by shared words
+MAX_CANDIDATES = 100
+MIN_SIMILARITY = 0.5
+
+
+def suggestion_limit_from_env() -> int:
+    try:
+        limit = int(os.environ.get(SUGGESTIONS_ENV_NAME, DEFAULT_SUGGESTIONS))
+    except ValueError:
+        limit = DEFAULT_SUGGESTIONS
+    return max(limit, 0)
+
+
+class MockOPCommandCorpus:
+    """
+    The words of each command in a response directory, held in memory
+    """
+
+    def __init__(self, directory):
+        self._commands: List[Tuple[str, str]] = []
+        self._token_commands: Dict[str, List[int]] = {}
+        for entry in iter_commands(directory):
+            command = len(self._commands)
+            self._commands.append((entry.input_hash or "", entry.args))
+            for token in command_tokens(entry.args):
+                self._token_commands.setdefault(token, []).append(command)
+
+    def command_count(self) -> int:
+        return len(self._commands)
+
+    def token_frequencies(self, tokens: Iterable[str]) -> Dict[str, int]:
+        return {token: len(self._token_commands.get(token, [])) for token in tokens}
+
+    def token_commands(self, token: str, limit: int) -> List[int]:
+        return self._token_commands.get(token, [])[:limit]
+
+    def command_at(self, command: int) -> Tuple[str, str]:
+        return self._commands[command]
+
+
+_corpora = weakref.WeakKeyDictionary()
+
+
+def command_corpus(directory):
+    """
+    Something to find a directory's commands by word: its compiled index if it has one,
+    otherwise an in-memory corpus
+    """
+    if isinstance(directory, MockOPIndexedResponseDirectory) and directory.has_tokens:
+        return directory
+    corpus = _corpora.get(directory)
+    if corpus is None:
+        corpus = MockOPCommandCorpus(directory)
+        _corpora[directory] = corpus
+    return corpus
+
+
+class MockOPSuggestion:
+
+    def __init__(self, input_hash: Optional[str], args: str, similarity: float):
+        self.input_hash = input_hash
+        self.args = args
+        self.similarity = similarity
+
+    @property
+    def argv(self) -> List[str]:
+        return argv_from_string(self.args)
+
+
+def _candidates(corpus, tokens, words: Optional[List[str]]) -> List[int]:
+    command_count = corpus.command_count()
+    frequencies = {token: count for token, count in corpus.token_frequencies(tokens).items() if count}
+
+    # commands for the same subcommand are always candidates, however common their words are
+    ordered = sorted(frequencies, key=frequencies.get)
+    if words and subcommand_token(words) in frequencies:
+        ordered.remove(subcommand_token(words))
+        ordered.insert(0, subcommand_token(words))
+
+    # rare words say more about which command was meant than common ones
+    scores: Dict[int, float] = {}
+    for i, token in enumerate(ordered):
+        if i and frequencies[token] > MAX_TOKEN_COMMANDS and len(scores) >= MAX_CANDIDATES:
+            break
+        weight = math.log(1 + command_count / frequencies[token])
+        for command in corpus.token_commands(token, MAX_TOKEN_COMMANDS):
+            scores[command] = scores.get(command, 0.0) + weight
+    return sorted(scores, key=scores.get, reverse=True)[:MAX_CANDIDATES]
+
+
+def suggest_commands(directory, argv: List[str], input_hash: Optional[str] = None,
+                     limit: int = DEFAULT_SUGGESTIONS) -> List[MockOPSuggestion]:
+    """
+    The recorded commands most like 'argv', most similar first
+    """
+    if limit <= 0:
+        return []
+    canonical = canonical_argv(argv)
+    if canonical is not None:
+        argv = canonical
+    query = " ".join(argv)
+    validator = mock_op_arg_validator()
+    words = validator.subcommand_path(argv)
+    corpus = command_corpus(directory)
+
+    ranked = []
+    for command in _candidates(corpus, command_tokens(argv_to_string(argv)), words):
+        candidate_hash, args = corpus.command_at(command)
+        suggestion = MockOPSuggestion(candidate_hash or None, args, 0.0)
+        candidate_argv = suggestion.argv
+        suggestion.similarity = difflib.SequenceMatcher(None, query, " ".join(candidate_argv)).ratio()
+        if suggestion.similarity < MIN_SIMILARITY:
+            continue
+        same_subcommand = words is not None and validator.subcommand_path(candidate_argv) == words
+        same_input = (candidate_hash or None) == (input_hash or None)
+        ranked.append(((same_subcommand, suggestion.similarity, same_input), suggestion))
+
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    # other subcommands are only worth suggesting if there's nothing closer
+    if ranked and ranked[0][0][0]:
+        ranked = [item for item in ranked if item[0][0]]
+    return [suggestion for _, suggestion in ranked[:limit]]
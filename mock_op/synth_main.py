@@ -0,0 +1,95 @@
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from .response_index import compile_response_index
+from .synthetic import (
+    LAYOUT_LOOSE,
+    LAYOUT_PACK,
+    MockOPSyntheticException,
+    MockOPSyntheticSpec,
+    synthesize_response_directories,
+    synthesize_vault_model
+)
+from .vault_model import VAULT_MODEL_ENV_NAME
+
+
+def synth_parse_args():
+    parser = ArgumentParser(
+        description="Create a synthetic response directory of any size, for scale & soak testing")
+    parser.add_argument(
+        "output_dir", help="Directory to create the response directory in")
+    parser.add_argument(
+        "--items", type=int, default=1000, help="Number of items. Default is 1000")
+    parser.add_argument(
+        "--vaults", type=int, default=10, help="Number of vaults items are spread across. Default is 10")
+    parser.add_argument(
+        "--users", type=int, default=100, help="Number of users. Default is 100")
+    parser.add_argument(
+        "--groups", type=int, default=20, help="Number of groups. Default is 20")
+    parser.add_argument(
+        "--documents", type=int, default=0, help="Number of documents, each with a 'document edit' command that takes input. Default is 0")
+    parser.add_argument(
+        "--payload-bytes", type=int, default=0, help="Size of a notes field added to each item. Default is none")
+    parser.add_argument(
+        "--document-bytes", type=int, default=1024, help="Size of each document. Default is 1024")
+    parser.add_argument(
+        "--error-ratio", type=float, default=0.05,
+        help="Lookups of things that don't exist, per thing that does. Default is 0.05")
+    parser.add_argument(
+        "--iterations", type=int, default=1,
+        help="Number of state iterations. If more than 1, a state configuration is created too. Default is 1")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed. The same seed gives the same response directory")
+    parser.add_argument(
+        "--loose", action="store_true", help="Write loose output files rather than a response pack")
+    parser.add_argument(
+        "--compile", action="store_true", help="Also compile a response index for each response directory")
+    parser.add_argument(
+        "--model", action="store_true",
+        help=f"Write a vault model, 'vault-model.json', for use with {VAULT_MODEL_ENV_NAME}, instead of response directories")
+
+    parsed = parser.parse_args()
+    return parsed
+
+
+def main():
+    args = synth_parse_args()
+    try:
+        spec = MockOPSyntheticSpec(items=args.items,
+                                   vaults=args.vaults,
+                                   users=args.users,
+                                   groups=args.groups,
+                                   documents=args.documents,
+                                   payload_bytes=args.payload_bytes,
+                                   document_bytes=args.document_bytes,
+                                   error_ratio=args.error_ratio,
+                                   iterations=args.iterations,
+                                   seed=args.seed,
+                                   layout=LAYOUT_LOOSE if args.loose else LAYOUT_PACK)
+    except MockOPSyntheticException as e:
+        print(f"Invalid synthetic response directory: {e}")
+        return 1
+
+    start = time.perf_counter()
+    if args.model:
+        model_path = synthesize_vault_model(Path(args.output_dir, "vault-model.json"), spec)
+        print(f"Vault model: {model_path}, in {time.perf_counter() - start:.2f}s")
+        return 0
+    stats = synthesize_response_directories(args.output_dir, spec)
+    if args.compile:
+        for respdir_json_file in stats.response_directories:
+            compile_response_index(respdir_json_file)
+    elapsed = time.perf_counter() - start
+
+    for respdir_json_file in stats.response_directories:
+        print(f"Response directory: {respdir_json_file}")
+    if stats.state_config:
+        print(f"State configuration: {stats.state_config}")
+    print(f"{stats.command_count} commands, {stats.commands_with_input_count} commands with input, "
+          f"{stats.output_bytes} bytes of output, in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""
+Synthetic response directories, for scale & soak testing
+
+response-generator can only record what a real 1Password account holds, and accounts
+with tens of thousands of items, users, and groups aren't easy to come by. Instead, a
+synthetic response directory is made up from scratch, in the same shapes
+response-generator records: the same argument lists, JSON output modeled on op's, error
+output for things that don't exist, 'document edit' commands with recorded input, and
+optionally a state configuration whose iterations each delete an item.
+
+The same account can instead be written as a vault model (see vault_model.py), a single
+file mock-op answers queries from directly.
+
+Output is deterministic for a given MockOPSyntheticSpec, including its seed. Output files
+are written straight to a response pack unless loose files are asked for, since creating
+hundreds of thousands of small files takes far longer than generating their contents.
+"""
+import hashlib
+import json
+import random
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from mock_cli.argv_conversion import argv_to_string
+
+from .response_pack import MockOPResponsePackWriter, response_pack_path
+from .state import write_json_atomic
+
+LAYOUT_PACK = "pack"
+LAYOUT_LOOSE = "loose"
+LAYOUTS = [LAYOUT_PACK, LAYOUT_LOOSE]
+
+_TIMESTAMP = "2023-04-11T02:47:12Z"
+_ERROR_TIMESTAMP = "2023/04/11 02:47:12"
+# something to cut payloads from that doesn't compress to nothing
+_PAYLOAD_WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+                  "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis nostrud ")
+
+
+class MockOPSyntheticException(Exception):
+    pass
+
+
+class MockOPSyntheticSpec:
+    """
+    What a synthetic response directory should hold
+
+    'error_ratio' is how many lookups of things that don't exist there are, per thing that
+    does, e.g., 0.05 adds 50 failing 'item get's for 1000 items. With 'iterations' greater
+    than 1, a state configuration is also created, and each iteration but the last has an
+    'item delete' that moves on to the next, in which that item no longer exists
+    """
+
+    def __init__(self,
+                 items: int = 1000,
+                 vaults: int = 10,
+                 users: int = 100,
+                 groups: int = 20,
+                 documents: int = 0,
+                 payload_bytes: int = 0,
+                 document_bytes: int = 1024,
+                 error_ratio: float = 0.05,
+                 iterations: int = 1,
+                 seed: int = 0,
+                 layout: str = LAYOUT_PACK):
+        if vaults < 1:
+            raise MockOPSyntheticException("At least one vault is required")
+        if iterations < 1:
+            raise MockOPSyntheticException("At least one iteration is required")
+        if iterations - 1 > items:
+            raise MockOPSyntheticException(
+                f"{iterations} iterations need at least {iterations - 1} items to delete")
+        if not 0 <= error_ratio <= 1:
+            raise MockOPSyntheticException("Error ratio must be between 0 and 1")
+        if layout not in LAYOUTS:
+            raise MockOPSyntheticException(f"Unknown layout: {layout}")
+        self.items = items
+        self.vaults = vaults
+        self.users = users
+        self.groups = groups
+        self.documents = documents
+        self.payload_bytes = payload_bytes
+        self.document_bytes = document_bytes
+        self.error_ratio = error_ratio
+        self.iterations = iterations
+        self.seed = seed
+        self.layout = layout
+
+
+class MockOPSynthesisStats:
+
+    def __init__(self):
+        self.response_directories: List[Path] = []
+        self.state_config: Optional[Path] = None
+        self.command_count = 0
+        self.commands_with_input_count = 0
+        self.output_bytes = 0
+
+
+def _payload(rand: random.Random, size: int) -> str:
+    words = _PAYLOAD_WORDS * (size // len(_PAYLOAD_WORDS) + 2)
+    start = rand.randrange(len(_PAYLOAD_WORDS))
+    return words[start:start + size]
+
+
+def _error(message: str) -> bytes:
+    return f"[ERROR] {_ERROR_TIMESTAMP} {message}\n".encode("utf-8")
+
+
+def _json_output(obj) -> bytes:
+    # op pretty-prints its JSON, but indenting rules out json's C encoder, which is many times faster
+    return f"{json.dumps(obj)}\n".encode("utf-8")
+
+
+class _Account:
+    """
+    The made-up contents of an account, and op's output for each thing in it
+    """
+
+    def __init__(self, spec: MockOPSyntheticSpec):
+        self._spec = spec
+        self._rand = random.Random(spec.seed)
+        self.user_id = self._id()
+        self.vaults = [self._vault(i) for i in range(spec.vaults)]
+        self.items = [self._item(i) for i in range(spec.items)]
+        self.users = [self._user(i) for i in range(spec.users)]
+        self.groups = [self._group(i) for i in range(spec.groups)]
+        self.documents = [self._document(i) for i in range(spec.documents)]
+        for item in self.items:
+            item["vault"]["vault_summary"]["items"] += 1
+
+    def _id(self) -> str:
+        return f"{self._rand.getrandbits(104):026x}"
+
+    def _vault(self, i: int) -> Dict:
+        vault = {
+            "id": self._id(),
+            "name": f"Test Vault {i}",
+            "content_version": self._rand.randint(1, 500),
+            "created_at": _TIMESTAMP,
+            "updated_at": _TIMESTAMP,
+            "items": 0
+        }
+        return {"vault_summary": vault, "name": vault["name"]}
+
+    def _item(self, i: int) -> Dict:
+        vault = self.vaults[i % len(self.vaults)]
+        title = f"Example Login {i}"
+        username = f"example_user_{i}"
+        reference = f"op://{vault['name']}/{title}"
+        summary = {
+            "id": self._id(),
+            "title": title,
+            "version": self._rand.randint(1, 20),
+            "vault": {"id": vault["vault_summary"]["id"], "name": vault["name"]},
+            "category": "LOGIN",
+            "last_edited_by": self.user_id.upper(),
+            "created_at": _TIMESTAMP,
+            "updated_at": _TIMESTAMP,
+            "additional_information": username,
+            "urls": [{"label": "website", "primary": True, "href": f"https://example.com/login/{i}"}]
+        }
+        fields = [
+            {"id": "username", "type": "STRING", "purpose": "USERNAME", "label": "username",
+             "value": username, "reference": f"{reference}/username"},
+            {"id": "password", "type": "CONCEALED", "purpose": "PASSWORD", "label": "password",
+             "value": self._id()[:20], "entropy": 100.0,
+             "reference": f"{reference}/password", "password_details": {"strength": "FANTASTIC"}}
+        ]
+        if self._spec.payload_bytes:
+            fields.append({"id": "notesPlain", "type": "STRING", "purpose": "NOTES", "label": "notesPlain",
+                           "value": _payload(self._rand, self._spec.payload_bytes),
+                           "reference": f"{reference}/notesPlain"})
+        # item list output is made of the same summaries, so each is only encoded once
+        summary_json = json.dumps(summary)
+        output = f'{summary_json[:-1]}, "fields": {json.dumps(fields)}}}\n'.encode("utf-8")
+        return {"summary_json": summary_json, "output": output, "vault": vault, "title": title, "index": i}
+
+    def _user(self, i: int) -> Dict:
+        user = {
+            "id": self._id().upper(),
+            "name": f"Example User {i}",
+            "email": f"example_user_{i}@example.com",
+            "type": "MEMBER",
+            "state": "ACTIVE",
+            "created_at": _TIMESTAMP,
+            "updated_at": _TIMESTAMP,
+            "last_auth_at": _TIMESTAMP
+        }
+        return user
+
+    def _group(self, i: int) -> Dict:
+        group = {
+            "id": self._id(),
+            "name": f"Example Group {i}",
+            "description": f"Example group {i}",
+            "state": "ACTIVE",
+            "created_at": _TIMESTAMP,
+            "updated_at": _TIMESTAMP,
+            "type": "USER_DEFINED"
+        }
+        return group
+
+    def whoami(self) -> Dict:
+        user = self.users[0] if self.users else None
+        whoami = {
+            "url": "example.1password.com",
+            "email": user["email"] if user else "example_user@example.com",
+            "user_uuid": self.user_id.upper(),
+            "account_uuid": "".join(reversed(self.user_id.upper())),
+            "user_type": "HUMAN"
+        }
+        return whoami
+
+    def _document(self, i: int) -> Dict:
+        vault = self.vaults[i % len(self.vaults)]
+        size = self._spec.document_bytes
+        data = self._rand.getrandbits(size * 8).to_bytes(size, "little") if size else b""
+        return {"id": self._id(), "name": f"Example Document {i}", "vault": vault, "data": data}
+
+
+def _format_json(*args) -> List[str]:
+    return ["--format", "json", *args]
+
+
+class _ResponseDirectoryWriter:
+    """
+    Builds up one response directory, writing output as responses are added
+    """
+
+    def __init__(self, respdir_json_file: Path, response_path: Path, input_path: Path, layout: str,
+                 stats: MockOPSynthesisStats):
+        self._respdir_json_file = respdir_json_file
+        self._response_path = response_path
+        self._input_path = input_path
+        self._layout = layout
+        self._stats = stats
+        self._commands: Dict[str, Dict] = {}
+        self._commands_with_input: Dict[str, Dict[str, Dict]] = {}
+        self._pack_writer = None
+        if layout == LAYOUT_PACK:
+            self._pack_writer = MockOPResponsePackWriter(response_pack_path(response_path))
+
+    def add(self, argv: List[str], name: str, output: bytes, error_output: bytes = b"",
+            exit_status: int = 0, changes_state: bool = False, input: Optional[bytes] = None):
+        response = {
+            "exit_status": exit_status,
+            "stdout": "output",
+            "stderr": "error_output",
+            "name": name,
+            "changes_state": changes_state
+        }
+        commands = self._commands
+        if input:
+            input_hash = hashlib.md5(input).hexdigest()
+            commands = self._commands_with_input.setdefault(input_hash, {})
+            input_file = Path(self._input_path, input_hash, "input.bin")
+            if not input_file.exists():
+                input_file.parent.mkdir(parents=True, exist_ok=True)
+                input_file.write_bytes(input)
+            self._stats.commands_with_input_count += 1
+        else:
+            self._stats.command_count += 1
+        commands[argv_to_string(argv)] = response
+
+        if self._pack_writer is not None:
+            self._pack_writer.add(f"{name}/output", output)
+            self._pack_writer.add(f"{name}/error_output", error_output)
+        else:
+            out_dir = Path(self._response_path, name)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            Path(out_dir, "output").write_bytes(output)
+            Path(out_dir, "error_output").write_bytes(error_output)
+        self._stats.output_bytes += len(output) + len(error_output)
+
+    def close(self):
+        if self._pack_writer is not None:
+            self._pack_writer.close()
+        directory = {
+            "meta": {"response_dir": str(self._response_path), "input_dir": str(self._input_path)},
+            "commands": self._commands,
+            "commands_with_input": self._commands_with_input
+        }
+        # not indented, for the same reason as output
+        write_json_atomic(self._respdir_json_file, directory, indent=None)
+
+    def abort(self):
+        if self._pack_writer is not None:
+            self._pack_writer.abort()
+
+
+def _error_count(spec: MockOPSyntheticSpec, count: int) -> int:
+    return round(count * spec.error_ratio)
+
+
+def _write_iteration(writer: _ResponseDirectoryWriter, account: _Account, spec: MockOPSyntheticSpec,
+                     iteration: int):
+    # items deleted in earlier iterations no longer exist
+    deleted = {item["title"] for item in account.items[:iteration]}
+    writer.add(_format_json("whoami"), "whoami", _json_output(account.whoami()))
+
+    vault_summaries = [vault["vault_summary"] for vault in account.vaults]
+    writer.add(_format_json("vault", "list"), "vault-list", _json_output(vault_summaries))
+    for i, vault in enumerate(account.vaults):
+        writer.add(_format_json("vault", "get", vault["name"]), f"vault-get-{i}",
+                   _json_output(vault["vault_summary"]))
+    for i in range(_error_count(spec, len(account.vaults))):
+        name = f"Missing Vault {i}"
+        writer.add(_format_json("vault", "get", name), f"vault-get-missing-{i}", b"",
+                   error_output=_error(f"\"{name}\" isn't a vault in this account. "
+                                       "Specify the vault with its ID or name."),
+                   exit_status=1)
+
+    vault_items: Dict[str, List[str]] = {vault["name"]: [] for vault in account.vaults}
+    for item in account.items:
+        if item["title"] not in deleted:
+            vault_items[item["vault"]["name"]].append(item["summary_json"])
+    for i, vault in enumerate(account.vaults):
+        item_list = f"[{', '.join(vault_items[vault['name']])}]\n".encode("utf-8")
+        writer.add(_format_json("item", "list", "--vault", vault["name"]), f"item-list-{i}", item_list)
+
+    for item in account.items:
+        argv = _format_json("item", "get", item["title"], "--vault", item["vault"]["name"])
+        name = f"item-get-{item['index']}"
+        if item["title"] in deleted:
+            writer.add(argv, name, b"", error_output=_error(
+                f"\"{item['title']}\" isn't an item in the \"{item['vault']['name']}\" vault. "
+                "Specify the item with its UUID, name, or domain."), exit_status=1)
+        else:
+            writer.add(argv, name, item["output"])
+    for i in range(_error_count(spec, len(account.items))):
+        vault_name = account.vaults[i % len(account.vaults)]["name"]
+        title = f"Missing Item {i}"
+        writer.add(_format_json("item", "get", title, "--vault", vault_name), f"item-get-missing-{i}", b"",
+                   error_output=_error(f"\"{title}\" isn't an item in the \"{vault_name}\" vault. "
+                                       "Specify the item with its UUID, name, or domain."),
+                   exit_status=1)
+    if iteration < spec.iterations - 1:
+        item = account.items[iteration]
+        writer.add(_format_json("item", "delete", item["title"], "--vault", item["vault"]["name"]),
+                   f"item-delete-{item['index']}", b"", changes_state=True)
+
+    writer.add(_format_json("user", "list"), "user-list",
+               _json_output([{key: user[key] for key in ["id", "name", "email", "type", "state"]}
+                             for user in account.users]))
+    for i, user in enumerate(account.users):
+        writer.add(_format_json("user", "get", user["email"]), f"user-get-{i}", _json_output(user))
+    for i in range(_error_count(spec, len(account.users))):
+        name = f"missing_user_{i}@example.com"
+        writer.add(_format_json("user", "get", name), f"user-get-missing-{i}", b"",
+                   error_output=_error(f"\"{name}\" isn't a user in this account. "
+                                       "Specify the user by their e-mail address, name, or ID."),
+                   exit_status=1)
+
+    writer.add(_format_json("group", "list"), "group-list",
+               _json_output([{key: group[key] for key in ["id", "name", "description", "state", "created_at"]}
+                             for group in account.groups]))
+    for i, group in enumerate(account.groups):
+        writer.add(_format_json("group", "get", group["name"]), f"group-get-{i}", _json_output(group))
+    for i in range(_error_count(spec, len(account.groups))):
+        name = f"Missing Group {i}"
+        writer.add(_format_json("group", "get", name), f"group-get-missing-{i}", b"",
+                   error_output=_error(f"\"{name}\" isn't a group in this account. "
+                                       "Specify the group with its ID or name."),
+                   exit_status=1)
+
+    for i, document in enumerate(account.documents):
+        vault_name = document["vault"]["name"]
+        writer.add(_format_json("document", "get", document["name"], "--vault", vault_name),
+                   f"document-get-{i}", document["data"])
+        # replacing a document's contents with its reverse, as a test might
+        writer.add(_format_json("document", "edit", document["id"], "--vault", vault_name),
+                   f"document-edit-{i}", b"", input=document["data"][::-1])
+
+
+def synthesize_response_directories(output_dir: Union[str, Path],
+                                    spec: Optional[MockOPSyntheticSpec] = None) -> MockOPSynthesisStats:
+    """
+    Create a synthetic response directory in 'output_dir'
+
+    With one iteration, this is 'response-directory.json', plus 'responses' ('responses.pack'
+    if packed) and 'input'. With more, each iteration has its own numbered response directory,
+    and 'state/config.json' is the state configuration
+    """
+    if spec is None:
+        spec = MockOPSyntheticSpec()
+    output_dir = Path(output_dir).expanduser().resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    input_path = Path(output_dir, "input")
+    stats = MockOPSynthesisStats()
+    account = _Account(spec)
+
+    paths: List[Tuple[Path, Path]] = []
+    if spec.iterations == 1:
+        paths.append((Path(output_dir, "response-directory.json"), Path(output_dir, "responses")))
+    else:
+        for i in range(spec.iterations):
+            paths.append((Path(output_dir, f"response-directory-{i}.json"), Path(output_dir, f"responses-{i}")))
+
+    for iteration, (respdir_json_file, response_path) in enumerate(paths):
+        writer = _ResponseDirectoryWriter(respdir_json_file, response_path, input_path, spec.layout, stats)
+        try:
+            _write_iteration(writer, account, spec, iteration)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        stats.response_directories.append(respdir_json_file)
+
+    if spec.iterations > 1:
+        state_config_path = Path(output_dir, "state", "config.json")
+        state_config = {
+            "iteration": 0,
+            "max-iterations": spec.iterations,
+            "state-list": [{"response-directory": str(respdir_json_file), "env-vars": {"set": {}, "pop": []}}
+                           for respdir_json_file, _ in paths]
+        }
+        write_json_atomic(state_config_path, state_config)
+        stats.state_config = state_config_path
+    return stats
+
+
+def synthesize_vault_model(model_path: Union[str, Path],
+                           spec: Optional[MockOPSyntheticSpec] = None) -> Path:
+    """
+    Write the account a synthetic response directory would hold as a vault model instead
+
+    Documents, lookups of things that don't exist, and iterations don't apply, since the
+    model answers whatever is asked of it, and item deletions change it directly
+    """
+    if spec is None:
+        spec = MockOPSyntheticSpec()
+    account = _Account(spec)
+    model = {
+        "account": account.whoami(),
+        "vaults": [{key: value for key, value in vault["vault_summary"].items() if key != "items"}
+                   for vault in account.vaults],
+        "items": [json.loads(item["output"]) for item in account.items],
+        "users": account.users,
+        "groups": account.groups
+    }
+    model_path = Path(model_path).expanduser().resolve()
+    # not indented, for the same reason as output
+    write_json_atomic(model_path, model, indent=None)
+    return model_path
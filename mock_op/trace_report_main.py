@@ -0,0 +1,58 @@
+import json
+from argparse import ArgumentParser
+
+from .invocation_trace import PERCENTILES, read_traces, summarize_traces
+
+
+def trace_report_parse_args():
+    parser = ArgumentParser(
+        description="Summarize the invocation traces mock-op records when MOCK_OP_PROFILE is set")
+    parser.add_argument(
+        "trace_file", nargs="+", help="Path to a trace file. May be given more than once")
+    parser.add_argument(
+        "--by", choices=["subcommand", "argv"], default="subcommand",
+        help="Group commands by subcommand, e.g., 'item get', or by full argument list. Default is subcommand")
+    parser.add_argument(
+        "--json", action="store_true", help="Print the summary as JSON")
+
+    parsed = parser.parse_args()
+    return parsed
+
+
+def _print_table(title, rows):
+    columns = [f"p{pct}_ms" for pct in PERCENTILES]
+    width = max([len(title)] + [len(name) for name in rows])
+    header = "".join(f"{column:>12}" for column in ["count"] + columns)
+    print(f"{title:<{width}}{header}")
+    # slowest first
+    for name, stats in sorted(rows.items(), key=lambda row: row[1][columns[-1]], reverse=True):
+        values = f"{stats['count']:>12}" + "".join(f"{stats[column]:>12.3f}" for column in columns)
+        print(f"{name:<{width}}{values}")
+
+
+def main():
+    args = trace_report_parse_args()
+    try:
+        summary = summarize_traces(read_traces(args.trace_file), by=args.by)
+    except (OSError, KeyError) as e:
+        print(f"Error reading trace file: {e}")
+        return 1
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    print(f"Invocations: {summary['invocations']}")
+    if not summary["invocations"]:
+        return 0
+    print("")
+    _print_table("total", {"all invocations": summary["total"]})
+    print("")
+    _print_table("phase", summary["phases"])
+    print("")
+    _print_table("command", summary["commands"])
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,659 @@
+"""
+Answering op queries from a model of an account's contents, rather than from recordings
+
+A vault model is a single JSON (or, if PyYAML is installed, YAML) file describing an
+account's vaults, items, users, and groups, e.g.:
+
+    {
+      "account": {"url": "example.1password.com", "email": "user@example.com",
+                  "user_uuid": "...", "account_uuid": "...", "user_type": "HUMAN"},
+      "vaults": [{"name": "Test Data", "groups": ["Example Group"]}],
+      "items": [{"title": "Example Login", "vault": "Test Data", "category": "LOGIN",
+                 "fields": [{"id": "password", "type": "CONCEALED", "label": "password",
+                             "value": "..."}]}],
+      "users": [{"name": "Example User", "email": "user@example.com"}],
+      "groups": [{"name": "Example Group", "members": ["user@example.com"]}]
+    }
+
+Anything op would report that the model leaves out, such as IDs and timestamps, is filled
+in. Items refer to their vault, groups to their members, and vaults to the users and groups
+with access to them, by ID or name.
+
+With MOCK_OP_VAULT_MODEL set to a model file, mock-op answers 'item get/list/delete/edit',
+'vault get/list', 'user get/list', 'group get/list', and, if the model has an account,
+'whoami', in the shape of op's JSON output. Anything the model can't answer, such as
+commands without '--format json', falls through to the response directory.
+
+Deleted and edited items change the model in memory, which lasts as long as a process
+keeps it in a MockOPVaultModelCache, e.g., mock-op-server's. If MOCK_OP_VAULT_MODEL_STATE
+names a file, changes are saved there instead, and later invocations start from it rather
+than from the model. Deleting the state file starts over.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import string
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from .mock_op_arg_validator import mock_op_arg_validator, parse_mock_op_args
+from .state import LOCK_SUFFIX, write_json_atomic
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+VAULT_MODEL_ENV_NAME = "MOCK_OP_VAULT_MODEL"
+VAULT_MODEL_STATE_ENV_NAME = "MOCK_OP_VAULT_MODEL_STATE"
+
+_TIMESTAMP = "2023-04-11T02:47:12Z"
+# item details that 'item list' leaves out
+_ITEM_DETAIL_KEYS = ("fields", "sections", "files")
+# model-only keys that op's output doesn't include
+_VAULT_ACCESS_KEYS = ("users", "groups")
+_GROUP_MEMBERS_KEY = "members"
+
+_VAULT_LIST_KEYS = ["id", "name", "content_version", "created_at", "updated_at", "items"]
+_USER_LIST_KEYS = ["id", "name", "email", "type", "state"]
+_GROUP_LIST_KEYS = ["id", "name", "description", "state", "created_at"]
+
+_CHANGES_STATE = [("item", "delete"), ("item", "edit")]
+
+# [<section>.]<field>[[<type>]]=<value>, or [<section>.]<field>[delete]
+_ASSIGNMENT_RE = re.compile(
+    r"^(?:(?P<section>[^.=\[\]]+)\.)?(?P<field>[^.=\[\]]+)(?:\[(?P<type>[^\]]+)\])?(?:=(?P<value>.*))?$",
+    re.DOTALL)
+_FIELD_TYPES = {
+    "password": "CONCEALED",
+    "concealed": "CONCEALED",
+    "text": "STRING",
+    "string": "STRING",
+    "email": "EMAIL",
+    "url": "URL",
+    "date": "DATE",
+    "monthYear": "MONTH_YEAR",
+    "phone": "PHONE",
+    "otp": "OTP"
+}
+_PASSWORD_CHARACTERS = {
+    "letters": string.ascii_letters,
+    "digits": string.digits,
+    "symbols": "!#$%&()*+,-./:;<=>?@[]^_{|}~"
+}
+
+
+class MockOPVaultModelException(Exception):
+    pass
+
+
+class MockOPVaultModelResponse:
+    """
+    The model's answer to a command, as op would give it
+    """
+
+    def __init__(self, exit_status: int, output: bytes = b"", error_output: bytes = b"",
+                 changes_state: bool = False):
+        self.exit_status = exit_status
+        self.output = output
+        self.error_output = error_output
+        self.changes_state = changes_state
+
+
+class _NotFound(Exception):
+    # an op error, reported as such rather than falling through to the response directory
+    pass
+
+
+def _derived_id(kind: str, key: str) -> str:
+    # stable, so the same model always reports the same IDs
+    return hashlib.md5(f"{kind}:{key}".encode("utf-8")).hexdigest()[:26]
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def _json_output(obj) -> bytes:
+    # compact rather than indented like op's, since indenting rules out json's C encoder
+    return f"{json.dumps(obj)}\n".encode("utf-8")
+
+
+def _error(message: str) -> MockOPVaultModelResponse:
+    timestamp = time.strftime("%Y/%m/%d %H:%M:%S")
+    return MockOPVaultModelResponse(1, error_output=f"[ERROR] {timestamp} {message}\n".encode("utf-8"))
+
+
+def _without(obj: Dict, keys) -> Dict:
+    return {key: value for key, value in obj.items() if key not in keys}
+
+
+def _split_list(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return [entry.strip() for entry in value.split(",") if entry.strip()]
+
+
+def load_vault_model_file(model_path: Union[str, Path]) -> Dict:
+    model_path = Path(model_path)
+    try:
+        with open(model_path, "r") as f:
+            text = f.read()
+        if model_path.suffix in (".yaml", ".yml"):
+            # optional, and only needed for YAML models
+            try:
+                import yaml
+            except ImportError as e:
+                raise MockOPVaultModelException(
+                    "YAML vault models require the 'PyYAML' package") from e
+            return yaml.safe_load(text)
+        return json.loads(text)
+    except (OSError, ValueError) as e:
+        raise MockOPVaultModelException(f"Unable to load vault model {model_path}: {e}") from e
+
+
+class MockOPVaultModel:
+    """
+    An account's vaults, items, users, and groups, and op's answers to queries about them
+    """
+
+    def __init__(self, model: Dict):
+        self.account: Optional[Dict] = model.get("account")
+        self._vaults: Dict[str, Dict] = {}
+        self._users: Dict[str, Dict] = {}
+        self._groups: Dict[str, Dict] = {}
+        # insertion order is the order 'item list' reports them in
+        self._items: Dict[str, Dict] = {}
+        self._item_titles: Dict[str, List[str]] = {}
+        self._vault_item_counts: Optional[Dict[str, int]] = None
+        # names & e-mail addresses -> IDs, for each kind of thing
+        self._aliases: Dict[str, Dict[str, str]] = {"vault": {}, "user": {}, "group": {}}
+
+        try:
+            for vault in model.get("vaults", []):
+                self._add_vault(dict(vault))
+            for user in model.get("users", []):
+                self._add_user(dict(user))
+            for group in model.get("groups", []):
+                self._add_group(dict(group))
+            for item in model.get("items", []):
+                self._add_item(dict(item))
+            # access is resolved once all users and groups are known
+            for vault in self._vaults.values():
+                vault["users"] = [self._resolve_user(ref)["id"] for ref in vault.get("users", [])]
+                vault["groups"] = [self._resolve_group(ref)["id"] for ref in vault.get("groups", [])]
+        except _NotFound as e:
+            raise MockOPVaultModelException(f"Invalid vault model: {e}") from e
+
+    def _add_vault(self, vault: Dict):
+        if "name" not in vault:
+            raise MockOPVaultModelException(f"Vault has no name: {vault}")
+        vault.setdefault("id", _derived_id("vault", vault["name"]))
+        vault.setdefault("content_version", 1)
+        vault.setdefault("created_at", _TIMESTAMP)
+        vault.setdefault("updated_at", _TIMESTAMP)
+        vault.pop("items", None)
+        self._vaults[vault["id"]] = vault
+        self._aliases["vault"].setdefault(vault["name"], vault["id"])
+
+    def _add_user(self, user: Dict):
+        if "email" not in user:
+            raise MockOPVaultModelException(f"User has no e-mail address: {user}")
+        user.setdefault("id", _derived_id("user", user["email"]).upper())
+        user.setdefault("name", user["email"])
+        user.setdefault("type", "MEMBER")
+        user.setdefault("state", "ACTIVE")
+        user.setdefault("created_at", _TIMESTAMP)
+        user.setdefault("updated_at", _TIMESTAMP)
+        self._users[user["id"]] = user
+        self._aliases["user"].setdefault(user["email"], user["id"])
+        self._aliases["user"].setdefault(user["name"], user["id"])
+
+    def _add_group(self, group: Dict):
+        if "name" not in group:
+            raise MockOPVaultModelException(f"Group has no name: {group}")
+        group.setdefault("id", _derived_id("group", group["name"]))
+        group.setdefault("description", "")
+        group.setdefault("state", "ACTIVE")
+        group.setdefault("type", "USER_DEFINED")
+        group.setdefault("created_at", _TIMESTAMP)
+        group.setdefault("updated_at", _TIMESTAMP)
+        group[_GROUP_MEMBERS_KEY] = [self._resolve_user(ref)["id"] for ref in group.get(_GROUP_MEMBERS_KEY, [])]
+        self._groups[group["id"]] = group
+        self._aliases["group"].setdefault(group["name"], group["id"])
+
+    def _add_item(self, item: Dict):
+        if "title" not in item or "vault" not in item:
+            raise MockOPVaultModelException(f"Item needs a title and a vault: {item}")
+        vault_ref = item["vault"]
+        if isinstance(vault_ref, dict):
+            vault_ref = vault_ref.get("id") or vault_ref.get("name")
+        vault = self._resolve_vault(vault_ref)
+        item["vault"] = {"id": vault["id"], "name": vault["name"]}
+        item.setdefault("id", _derived_id("item", f"{vault['id']}/{item['title']}"))
+        item.setdefault("version", 1)
+        item.setdefault("category", "LOGIN")
+        item.setdefault("created_at", _TIMESTAMP)
+        item.setdefault("updated_at", _TIMESTAMP)
+        item.setdefault("fields", [])
+        self._items[item["id"]] = item
+        self._item_titles.setdefault(item["title"], []).append(item["id"])
+
+    def _resolve(self, things: Dict[str, Dict], kind: str, ref: str) -> Optional[Dict]:
+        thing = things.get(ref)
+        if thing is None and ref in self._aliases[kind]:
+            thing = things[self._aliases[kind][ref]]
+        return thing
+
+    def _resolve_vault(self, ref: str) -> Dict:
+        vault = self._resolve(self._vaults, "vault", ref)
+        if vault is None:
+            raise _NotFound(f"\"{ref}\" isn't a vault in this account. Specify the vault with its ID or name.")
+        return vault
+
+    def _resolve_user(self, ref: str) -> Dict:
+        user = self._resolve(self._users, "user", ref)
+        if user is None:
+            raise _NotFound(f"\"{ref}\" isn't a user in this account. "
+                            "Specify the user by their e-mail address, name, or ID.")
+        return user
+
+    def _resolve_group(self, ref: str) -> Dict:
+        group = self._resolve(self._groups, "group", ref)
+        if group is None:
+            raise _NotFound(f"\"{ref}\" isn't a group in this account. Specify the group with its ID or name.")
+        return group
+
+    def _resolve_item(self, ref: str, vault_ref: Optional[str], include_archive: bool = False) -> Dict:
+        vault = self._resolve_vault(vault_ref) if vault_ref else None
+        candidates = [self._items[ref]] if ref in self._items else [
+            self._items[item_id] for item_id in self._item_titles.get(ref, [])]
+        matches = [item for item in candidates
+                   if (vault is None or item["vault"]["id"] == vault["id"])
+                   and (include_archive or item.get("state") != "ARCHIVED")]
+        if not matches:
+            if vault is not None:
+                raise _NotFound(f"\"{ref}\" isn't an item in the \"{vault['name']}\" vault. "
+                                "Specify the item with its UUID, name, or domain.")
+            raise _NotFound(f"\"{ref}\" isn't an item. Specify the item with its UUID, name, or domain.")
+        if len(matches) > 1:
+            listed = "".join(f"\n\t* for the item \"{item['title']}\" in vault {item['vault']['name']}: {item['id']}"
+                             for item in matches)
+            raise _NotFound(f"More than one item matches \"{ref}\". Try again and specify the item by its ID:{listed}")
+        return matches[0]
+
+    def _item_counts(self) -> Dict[str, int]:
+        if self._vault_item_counts is None:
+            counts = {vault_id: 0 for vault_id in self._vaults}
+            for item in self._items.values():
+                if item.get("state") != "ARCHIVED":
+                    counts[item["vault"]["id"]] += 1
+            self._vault_item_counts = counts
+        return self._vault_item_counts
+
+    def _vault_output(self, vault: Dict) -> Dict:
+        output = _without(vault, _VAULT_ACCESS_KEYS)
+        output["items"] = self._item_counts()[vault["id"]]
+        return output
+
+    def _vault_user_ids(self, vault: Dict) -> List[str]:
+        user_ids = list(vault["users"])
+        for group_id in vault["groups"]:
+            user_ids.extend(self._groups[group_id][_GROUP_MEMBERS_KEY])
+        return list(dict.fromkeys(user_ids))
+
+    def to_dict(self) -> Dict:
+        model = {
+            "vaults": list(self._vaults.values()),
+            "items": list(self._items.values()),
+            "users": list(self._users.values()),
+            "groups": list(self._groups.values())
+        }
+        if self.account is not None:
+            model["account"] = self.account
+        return model
+
+    def respond(self, argv: List[str], input: Optional[bytes] = None) -> Optional[MockOPVaultModelResponse]:
+        """
+        op's answer to a command, or None if the model can't answer it
+        """
+        parsed = parse_mock_op_args(argv)
+        if parsed is None or getattr(parsed, "format", None) != "json":
+            return None
+        handler = _HANDLERS.get((getattr(parsed, "command", None), getattr(parsed, "subcommand", None)))
+        if handler is None:
+            return None
+        try:
+            response = handler(self, parsed, input)
+        except _NotFound as e:
+            response = _error(str(e))
+        return response
+
+    def _whoami(self, parsed, input):
+        if self.account is None:
+            return None
+        return MockOPVaultModelResponse(0, _json_output(self.account))
+
+    def _vault_get(self, parsed, input):
+        return MockOPVaultModelResponse(0, _json_output(self._vault_output(self._resolve_vault(parsed.vault))))
+
+    def _vault_list(self, parsed, input):
+        vaults = list(self._vaults.values())
+        if parsed.group:
+            group = self._resolve_group(parsed.group)
+            vaults = [vault for vault in vaults if group["id"] in vault["groups"]]
+        if parsed.user:
+            user = self._resolve_user(parsed.user)
+            vaults = [vault for vault in vaults if user["id"] in self._vault_user_ids(vault)]
+        output = [{key: self._vault_output(vault).get(key) for key in _VAULT_LIST_KEYS} for vault in vaults]
+        return MockOPVaultModelResponse(0, _json_output(output))
+
+    def _user_get(self, parsed, input):
+        return MockOPVaultModelResponse(0, _json_output(self._resolve_user(parsed.user)))
+
+    def _user_list(self, parsed, input):
+        users = list(self._users.values())
+        if parsed.group:
+            members = set(self._resolve_group(parsed.group)[_GROUP_MEMBERS_KEY])
+            users = [user for user in users if user["id"] in members]
+        if parsed.vault:
+            user_ids = set(self._vault_user_ids(self._resolve_vault(parsed.vault)))
+            users = [user for user in users if user["id"] in user_ids]
+        output = [{key: user.get(key) for key in _USER_LIST_KEYS} for user in users]
+        return MockOPVaultModelResponse(0, _json_output(output))
+
+    def _group_get(self, parsed, input):
+        group = self._resolve_group(parsed.group)
+        return MockOPVaultModelResponse(0, _json_output(_without(group, [_GROUP_MEMBERS_KEY])))
+
+    def _group_list(self, parsed, input):
+        groups = list(self._groups.values())
+        if parsed.user:
+            user = self._resolve_user(parsed.user)
+            groups = [group for group in groups if user["id"] in group[_GROUP_MEMBERS_KEY]]
+        if parsed.vault:
+            vault = self._resolve_vault(parsed.vault)
+            groups = [group for group in groups if group["id"] in vault["groups"]]
+        output = [{key: group.get(key) for key in _GROUP_LIST_KEYS} for group in groups]
+        return MockOPVaultModelResponse(0, _json_output(output))
+
+    def _item_get(self, parsed, input):
+        if parsed.fields:
+            # e.g., just an item's TOTP; not modeled
+            return None
+        item = self._resolve_item(parsed.item, parsed.vault, include_archive=parsed.include_archive)
+        return MockOPVaultModelResponse(0, _json_output(item))
+
+    def _item_list(self, parsed, input):
+        vault = self._resolve_vault(parsed.vault) if parsed.vault else None
+        categories = {category.upper().replace(" ", "_") for category in _split_list(parsed.categories)}
+        tags = set(_split_list(parsed.tags))
+        summaries = []
+        for item in self._items.values():
+            if vault is not None and item["vault"]["id"] != vault["id"]:
+                continue
+            if not parsed.include_archive and item.get("state") == "ARCHIVED":
+                continue
+            if categories and item["category"] not in categories:
+                continue
+            if tags and not tags.intersection(item.get("tags", [])):
+                continue
+            summaries.append(_without(item, _ITEM_DETAIL_KEYS))
+        return MockOPVaultModelResponse(0, _json_output(summaries))
+
+    def _item_delete(self, parsed, input):
+        if parsed.item == "-":
+            # items piped from, e.g., 'item list'
+            if not input:
+                return None
+            try:
+                piped = json.loads(input)
+            except ValueError:
+                return None
+            if isinstance(piped, dict):
+                piped = [piped]
+            items = [self._resolve_item(entry["id"], parsed.vault) for entry in piped]
+            # the same item may be piped more than once
+            items = list({item["id"]: item for item in items}.values())
+        else:
+            items = [self._resolve_item(parsed.item, parsed.vault)]
+
+        for item in items:
+            if parsed.archive:
+                item["state"] = "ARCHIVED"
+            else:
+                del self._items[item["id"]]
+                self._item_titles[item["title"]].remove(item["id"])
+        self._vault_item_counts = None
+        return MockOPVaultModelResponse(0, changes_state=True)
+
+    def _item_edit(self, parsed, input):
+        item = self._resolve_item(parsed.item, parsed.vault)
+        # work on a copy, so nothing changes if the edit turns out not to be one we can make
+        edited = json.loads(json.dumps(item))
+        if parsed.title is not None:
+            # before any assignment, so fields it adds refer to the new title
+            edited["title"] = parsed.title
+            _retitle_references(edited, item["title"])
+        if parsed.assignment is not None and not self._assign(edited, parsed.assignment):
+            return None
+        if parsed.generate_password is not None and not _generate_password(edited, parsed.generate_password):
+            return None
+        if parsed.favorite is not None:
+            if parsed.favorite not in ("true", "false"):
+                return None
+            edited["favorite"] = parsed.favorite == "true"
+        if parsed.tags is not None:
+            edited["tags"] = _split_list(parsed.tags)
+        if parsed.url is not None:
+            urls = [url for url in edited.get("urls", []) if not url.get("primary")]
+            edited["urls"] = [{"label": "website", "primary": True, "href": parsed.url}] + urls
+        if parsed.title is not None:
+            self._item_titles[item["title"]].remove(item["id"])
+            self._item_titles.setdefault(parsed.title, []).append(item["id"])
+        edited["version"] = edited.get("version", 1) + 1
+        edited["updated_at"] = _now()
+        self._items[item["id"]] = edited
+        return MockOPVaultModelResponse(0, _json_output(edited), changes_state=True)
+
+    def _assign(self, item: Dict, assignment: str) -> bool:
+        match = _ASSIGNMENT_RE.match(assignment)
+        if match is None:
+            return False
+        section_label, label, field_type, value = match.group("section", "field", "type", "value")
+        if field_type == "delete":
+            value = None
+        elif value is None:
+            return False
+        elif field_type is not None:
+            if field_type not in _FIELD_TYPES:
+                return False
+            field_type = _FIELD_TYPES[field_type]
+
+        fields = item.setdefault("fields", [])
+        for field in fields:
+            if label not in (field.get("label"), field.get("id")):
+                continue
+            if section_label is not None and field.get("section", {}).get("label") != section_label:
+                continue
+            if value is None:
+                fields.remove(field)
+            else:
+                field["value"] = value
+                if field_type is not None:
+                    field["type"] = field_type
+            return True
+
+        if value is None:
+            return False
+        field = {"id": _derived_id("field", f"{section_label}.{label}"), "type": field_type or "STRING",
+                 "label": label, "value": value}
+        reference = f"op://{item['vault']['name']}/{item['title']}/{label}"
+        if section_label is not None:
+            sections = item.setdefault("sections", [])
+            section = next((section for section in sections if section.get("label") == section_label), None)
+            if section is None:
+                section = {"id": _derived_id("section", section_label), "label": section_label}
+                sections.append(section)
+            field["section"] = section
+            reference = f"op://{item['vault']['name']}/{item['title']}/{section_label}/{label}"
+        field["reference"] = reference
+        fields.append(field)
+        return True
+
+
+_HANDLERS = {
+    ("whoami", None): MockOPVaultModel._whoami,
+    ("vault", "get"): MockOPVaultModel._vault_get,
+    ("vault", "list"): MockOPVaultModel._vault_list,
+    ("user", "get"): MockOPVaultModel._user_get,
+    ("user", "list"): MockOPVaultModel._user_list,
+    ("group", "get"): MockOPVaultModel._group_get,
+    ("group", "list"): MockOPVaultModel._group_list,
+    ("item", "get"): MockOPVaultModel._item_get,
+    ("item", "list"): MockOPVaultModel._item_list,
+    ("item", "delete"): MockOPVaultModel._item_delete,
+    ("item", "edit"): MockOPVaultModel._item_edit
+}
+
+
+def _retitle_references(item: Dict, old_title: str):
+    # secret references name the item by its title
+    old_prefix = f"op://{item['vault']['name']}/{old_title}/"
+    new_prefix = f"op://{item['vault']['name']}/{item['title']}/"
+    for field in item.get("fields", []):
+        reference = field.get("reference")
+        if reference and reference.startswith(old_prefix):
+            field["reference"] = new_prefix + reference[len(old_prefix):]
+
+
+def command_changes_model(argv: List[str]) -> bool:
+    words = mock_op_arg_validator().subcommand_path(argv)
+    return words is not None and tuple(words) in _CHANGES_STATE
+
+
+def _generate_password(item: Dict, recipe: str) -> bool:
+    # e.g., 'letters,digits,symbols,32'
+    characters = ""
+    length = 32
+    for ingredient in _split_list(recipe):
+        if ingredient.isdigit():
+            length = int(ingredient)
+        elif ingredient in _PASSWORD_CHARACTERS:
+            characters += _PASSWORD_CHARACTERS[ingredient]
+        else:
+            return False
+    if not characters:
+        characters = _PASSWORD_CHARACTERS["letters"] + _PASSWORD_CHARACTERS["digits"]
+    # the same edit always generates the same password
+    rand = random.Random(f"{item['id']}:{item.get('version', 1)}:{recipe}")
+    password = "".join(rand.choice(characters) for _ in range(length))
+    for field in item.get("fields", []):
+        if field.get("purpose") == "PASSWORD" or field.get("id") == "password":
+            field["value"] = password
+            return True
+    item.setdefault("fields", []).append(
+        {"id": "password", "type": "CONCEALED", "purpose": "PASSWORD", "label": "password", "value": password})
+    return True
+
+
+@contextmanager
+def _locked(lock_path: Path):
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class MockOPVaultModelCache:
+    """
+    Keeps vault models resident, along with any changes made to them in memory
+
+    Models saved to a state file are reloaded if the state file's modification time or size
+    changes, e.g., because another process changed it
+    """
+
+    def __init__(self):
+        self._models: Dict[str, MockOPVaultModel] = {}
+        self._state_models: Dict[str, Tuple[Tuple[int, int], MockOPVaultModel]] = {}
+
+    def _key(self, path: Union[str, Path]) -> str:
+        return os.path.realpath(os.path.expanduser(path))
+
+    def get(self, model_path: Union[str, Path]) -> MockOPVaultModel:
+        key = self._key(model_path)
+        model = self._models.get(key)
+        if model is None:
+            model = MockOPVaultModel(load_vault_model_file(key))
+            self._models[key] = model
+        return model
+
+    def get_state(self, state_path: Union[str, Path]) -> Optional[MockOPVaultModel]:
+        key = self._key(state_path)
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            self._state_models.pop(key, None)
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = self._state_models.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        model = MockOPVaultModel(load_vault_model_file(key))
+        self._state_models[key] = (signature, model)
+        return model
+
+    def put_state(self, state_path: Union[str, Path], model: MockOPVaultModel):
+        key = self._key(state_path)
+        st = os.stat(key)
+        self._state_models[key] = ((st.st_mtime_ns, st.st_size), model)
+
+    def clear(self):
+        self._models.clear()
+        self._state_models.clear()
+
+
+def vault_model_respond(model_path: Union[str, Path],
+                        argv: List[str],
+                        input: Optional[bytes] = None,
+                        state_path: Optional[Union[str, Path]] = None,
+                        cache: Optional[MockOPVaultModelCache] = None) -> Optional[MockOPVaultModelResponse]:
+    """
+    Answer a command from a vault model, or return None if the model can't answer it
+
+    With a state file, the model is read from it if it exists, and any changes are saved to it.
+    Without a cache, the model is read afresh, so changes made without a state file are lost
+    """
+    if cache is None:
+        cache = MockOPVaultModelCache()
+    if state_path is None:
+        return cache.get(model_path).respond(argv, input=input)
+
+    state_path = Path(state_path).expanduser()
+    if not command_changes_model(argv):
+        model = cache.get_state(state_path)
+        if model is None:
+            model = cache.get(model_path)
+        return model.respond(argv, input=input)
+
+    # changes start from the latest state with the lock held, so concurrent changes aren't lost
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    with _locked(Path(state_path.parent, f"{state_path.name}{LOCK_SUFFIX}")):
+        model = cache.get_state(state_path)
+        if model is None:
+            # a copy of the model, so the one in the cache stays as it was
+            model = MockOPVaultModel(load_vault_model_file(model_path))
+        response = model.respond(argv, input=input)
+        if response is not None and response.changes_state:
+            write_json_atomic(state_path, model.to_dict(), indent=None)
+            cache.put_state(state_path, model)
+    return response
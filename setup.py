@@ -20,9 +20,21 @@ setup(name='mock-op',
       entry_points={
           'console_scripts': [
               'mock-op=mock_op.mock_op_main:main',
+              'mock-op-server=mock_op.mock_op_server:main',
+              'mock-op-client=mock_op.mock_op_client:main',
+              'mock-op-compile=mock_op.compile_main:main',
+              'mock-op-pack=mock_op.pack_main:main',
+              'mock-op-dedupe=mock_op.dedupe_main:main',
+              'mock-op-canonicalize=mock_op.canonicalize_main:main',
+              'mock-op-bench=mock_op.bench_main:main',
+              'mock-op-trace-report=mock_op.trace_report_main:main',
+              'mock-op-synth=mock_op.synth_main:main',
               'list-cmds=mock_op.list_cmd_main:main',
-              'response-generator=mock_op.response_gen_main:main'], },
+              'response-generator=mock_op.response_gen_main:main'],
+          'pytest11': [
+              'mock_op=mock_op.pytest_plugin'], },
       python_requires='>=3.7',
       install_requires=['mock-cli-framework>=0.8.0', 'python-dotenv'],
+      extras_require={'zstd': ['zstandard'], 'yaml': ['PyYAML']},
       package_data={'mock_op': ['config/*']},
       )
@@ -0,0 +1,118 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from mock_cli import CommandInvocation, ResponseDirectory
+from mock_cli.argv_conversion import argv_to_string
+
+from mock_op._server_protocol import FORWARDED_ENV_PREFIXES
+from mock_op.state import write_json_atomic
+
+ITEM_GET_ARGV = ["--format", "json", "item", "get", "Example Login", "--vault", "Test Data"]
+ITEM_GET_OUTPUT = b'{"title": "Example Login"}\n'
+
+STATE_CHANGING_ARGV = ["item", "delete", "state-test-item"]
+
+VAULT_MODEL = {
+    "account": {"url": "example.1password.com", "email": "user@example.com", "user_type": "HUMAN"},
+    "vaults": [{"name": "Test Data", "groups": ["Example Group"]}, {"name": "Other Data"}],
+    "items": [
+        {"title": "Example Login", "vault": "Test Data", "category": "LOGIN", "tags": ["example"],
+         "fields": [{"id": "username", "type": "STRING", "label": "username", "value": "user"},
+                    {"id": "password", "type": "CONCEALED", "label": "password", "value": "secret"}]},
+        {"title": "Example Login 2", "vault": "Test Data", "category": "LOGIN"},
+        {"title": "Other Login", "vault": "Other Data", "category": "LOGIN"}
+    ],
+    "users": [{"name": "Example User", "email": "user@example.com"}],
+    "groups": [{"name": "Example Group", "members": ["user@example.com"]}]
+}
+
+
+def clean_environment() -> Dict[str, str]:
+    # so the caller's mock-op configuration doesn't leak into tests
+    env = {name: value for name, value in os.environ.items()
+           if not name.startswith(tuple(FORWARDED_ENV_PREFIXES))}
+    return env
+
+
+def run_python(argv: List[str], env: Dict[str, str], cwd=None, input: bytes = None) -> subprocess.CompletedProcess:
+    stdin = subprocess.DEVNULL if input is None else None
+    result = subprocess.run([sys.executable] + argv, env=env, cwd=cwd, input=input, stdin=stdin,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return result
+
+
+def run_entry_point(module: str, argv: List[str], env: Dict[str, str], cwd=None,
+                    input: bytes = None) -> subprocess.CompletedProcess:
+    """
+    Run a console script's main(), exiting with what it returns, as the installed script would
+    """
+    script = f"import sys; from {module} import main; sys.exit(main())"
+    return run_python(["-c", script] + argv, env, cwd=cwd, input=input)
+
+
+@pytest.fixture
+def vault_model_path(tmp_path) -> Path:
+    model_path = Path(tmp_path, "vault-model.json")
+    model_path.write_text(json.dumps(VAULT_MODEL))
+    return model_path
+
+
+@pytest.fixture
+def response_directory(tmp_path) -> Path:
+    """
+    A response directory with a single 'item get' command
+    """
+    respdir_json_file = Path(tmp_path, "response-directory.json")
+    response_path = Path(tmp_path, "responses")
+    Path(response_path, "item-get").mkdir(parents=True)
+    Path(response_path, "item-get", "output").write_bytes(ITEM_GET_OUTPUT)
+    Path(response_path, "item-get", "error_output").write_bytes(b"")
+    directory = {
+        "meta": {"response_dir": str(response_path), "input_dir": "input"},
+        "commands": {
+            argv_to_string(ITEM_GET_ARGV): {
+                "exit_status": 0,
+                "stdout": "output",
+                "stderr": "error_output",
+                "name": "item-get",
+                "changes_state": False
+            }
+        },
+        "commands_with_input": {}
+    }
+    write_json_atomic(respdir_json_file, directory)
+    return respdir_json_file
+
+
+def write_state_config(workdir: Path, state_count: int) -> Path:
+    """
+    A state configuration where each state's response to STATE_CHANGING_ARGV is its own
+    iteration number
+    """
+    state_list = []
+    for i in range(state_count):
+        respdir_json_file = Path(workdir, f"response-directory-{i}.json")
+        directory = ResponseDirectory(
+            respdir_json_file, create=True, response_dir=Path(workdir, f"responses-{i}"))
+        invocation = CommandInvocation(
+            STATE_CHANGING_ARGV, f"{i}\n".encode("utf-8"), b"", 0, "item-delete", True)
+        # mock_cli's new, empty response directories share a dictionary, so this command
+        # looks like it's already been added
+        directory.add_command_invocation(invocation, overwrite=True, save=True)
+        state_list.append({
+            "response-directory": str(respdir_json_file),
+            "env-vars": {"set": {}, "pop": []}
+        })
+
+    state_config_path = Path(workdir, "state", "config.json")
+    write_json_atomic(state_config_path, {
+        "iteration": 0,
+        "max-iterations": state_count,
+        "state-list": state_list
+    })
+    return state_config_path
@@ -0,0 +1,237 @@
+"""
+The argument table stands in for mock-op's argparse parser tree, so these check the two agree:
+an argument list the table accepts must be one argparse accepts, with the same namespace, and
+one argparse rejects must never be accepted by the table. Playback also accepts what op allows
+but argparse doesn't, which must mean what the argument list's canonical form means to argparse
+"""
+import io
+import json
+import random
+from argparse import ArgumentParser, Namespace, _HelpAction, _SubParsersAction
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from mock_op.mock_op_arg_validator import (
+    ARG_TABLE_FORMAT_VERSION,
+    ARG_TABLE_PATH,
+    MockOPArgValidator,
+    canonical_argv,
+    compile_arg_table,
+    load_arg_table,
+    parse_mock_op_args
+)
+from mock_op.mock_op_argument_parser import mock_op_arg_parser
+
+CORPUS_SIZE = 20000
+CORPUS_SEED = 1
+
+# positional and option values, including ones argparse might take for options
+VALUES = ["Example Login", "Test Data", "user@example.com", "-", "--", "-1", "-x", "--bogus",
+          "json", "human-readable", "label=password", "type=otp", "=", ""]
+UNKNOWN_OPTIONS = ["--bogus", "-z", "--bogus=1", "---", "-"]
+
+
+@pytest.fixture(scope="module")
+def arg_parser() -> ArgumentParser:
+    return mock_op_arg_parser(prog="mock-op")
+
+
+@pytest.fixture(scope="module")
+def validator() -> MockOPArgValidator:
+    return MockOPArgValidator(load_arg_table())
+
+
+def _argparse_parse(parser: ArgumentParser, argv: List[str]) -> Optional[Namespace]:
+    # None if argparse rejects the argument list (or prints help, which isn't a namespace either)
+    try:
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            parsed = parser.parse_args(argv)
+    except SystemExit:
+        parsed = None
+    return parsed
+
+
+def _option_args(rng: random.Random, action) -> List[str]:
+    option_string = rng.choice(action.option_strings)
+    if option_string.startswith("--") and rng.random() < 0.1:
+        # an abbreviation, which argparse may or may not accept
+        option_string = option_string[:rng.randint(3, len(option_string))]
+    if action.nargs == 0:
+        return [option_string]
+    if action.choices is not None and rng.random() < 0.8:
+        value = rng.choice(list(action.choices))
+    else:
+        value = rng.choice(VALUES)
+    if rng.random() < 0.3:
+        return [f"{option_string}={value}"]
+    return [option_string, value]
+
+
+def _level_args(rng: random.Random, parser: ArgumentParser, parents: List[ArgumentParser]) -> List[str]:
+    """
+    Arguments for one level of the parser tree, followed by those of a subcommand, if it has any
+    """
+    groups = []
+    subparsers = None
+    for action in parser._actions:
+        if isinstance(action, _HelpAction):
+            if rng.random() < 0.02:
+                groups.append([rng.choice(action.option_strings)])
+        elif isinstance(action, _SubParsersAction):
+            subparsers = action
+        elif action.option_strings:
+            if rng.random() < 0.4:
+                groups.append(_option_args(rng, action))
+        elif rng.random() < 0.95:
+            if action.choices is not None and rng.random() < 0.8:
+                groups.append([rng.choice(list(action.choices))])
+            else:
+                groups.append([rng.choice(VALUES)])
+    # a parent's option after the subcommand, which op accepts but argparse doesn't
+    for parent in parents:
+        options = [action for action in parent._actions
+                   if action.option_strings and not isinstance(action, _HelpAction)]
+        if options and rng.random() < 0.05:
+            groups.append(_option_args(rng, rng.choice(options)))
+    rng.shuffle(groups)
+    args = [arg for group in groups for arg in group]
+
+    if subparsers is not None and rng.random() < 0.95:
+        name = rng.choice(list(subparsers.choices))
+        if rng.random() < 0.02:
+            name = rng.choice(VALUES)
+        args.append(name)
+        subparser = subparsers.choices.get(name)
+        if subparser is not None:
+            args.extend(_level_args(rng, subparser, parents + [parser]))
+    return args
+
+
+def _mutate(rng: random.Random, argv: List[str]) -> List[str]:
+    argv = list(argv)
+    mutation = rng.randrange(5)
+    position = rng.randint(0, len(argv))
+    if mutation == 0 and argv:
+        del argv[min(position, len(argv) - 1)]
+    elif mutation == 1:
+        argv.insert(position, rng.choice(UNKNOWN_OPTIONS + VALUES))
+    elif mutation == 2 and len(argv) > 1:
+        i, j = rng.sample(range(len(argv)), 2)
+        argv[i], argv[j] = argv[j], argv[i]
+    elif mutation == 3 and argv:
+        argv = argv[:position]
+    else:
+        argv.append(rng.choice(VALUES))
+    return argv
+
+
+def generate_argv_corpus(parser: ArgumentParser, size: int, seed: int) -> List[List[str]]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        argv = _level_args(rng, parser, [])
+        # about half are left as generated, and most of those should be valid
+        while rng.random() < 0.5:
+            argv = _mutate(rng, argv)
+        corpus.append(argv)
+    return corpus
+
+
+def test_arg_table_up_to_date():
+    with open(ARG_TABLE_PATH, "r") as f:
+        saved = json.load(f)
+    # as it would be saved
+    compiled = json.loads(json.dumps(compile_arg_table()))
+    assert saved == compiled, \
+        f"{ARG_TABLE_PATH} is out of date. Recompile it with 'python -m mock_op.mock_op_arg_validator'"
+
+
+def test_stale_arg_table_compiled_in_memory(tmp_path):
+    table_path = Path(tmp_path, "arg-table.json")
+    stale = json.dumps({"format-version": ARG_TABLE_FORMAT_VERSION, "source-digest": "stale", "parser": {}})
+    table_path.write_text(stale)
+    table = load_arg_table(table_path=table_path)
+    assert table == compile_arg_table()
+    # only the explicit compile step writes the table
+    assert table_path.read_text() == stale
+
+
+def test_validator_matches_argparse(arg_parser, validator):
+    mismatches = []
+    accepted = 0
+    table_accepted = 0
+    for argv in generate_argv_corpus(arg_parser, CORPUS_SIZE, CORPUS_SEED):
+        expected = _argparse_parse(arg_parser, argv)
+        parsed = validator.parse_args(argv)
+        if expected is not None:
+            accepted += 1
+        if parsed is None:
+            # left to argparse, so whatever argparse does is what mock-op does
+            continue
+        table_accepted += 1
+        if expected is None or vars(parsed) != vars(expected):
+            mismatches.append((argv, expected, parsed))
+
+    assert mismatches == []
+    # the corpus exercises both outcomes, and the table doesn't simply leave everything to argparse
+    assert 0 < accepted < CORPUS_SIZE
+    assert table_accepted >= accepted * 0.7
+
+
+@pytest.mark.parametrize("argv,canonical", [
+    # global options after the subcommand, as op allows, move up to the command they belong to
+    (["item", "get", "X", "--format", "json"], ["--format", "json", "item", "get", "X"]),
+    (["item", "get", "X", "--vault", "V", "--fields", "type=otp", "--format=json"],
+     ["--format", "json", "item", "get", "X", "--fields", "type=otp", "--vault", "V"]),
+    # options are sorted, and given as separate arguments
+    (["--format", "json", "item", "get", "X", "--vault", "V", "--fields=type=otp"],
+     ["--format", "json", "item", "get", "X", "--fields", "type=otp", "--vault", "V"]),
+    # short options are given by their long name
+    (["signin", "-r", "--account", "acct"], ["--account", "acct", "signin", "--raw"]),
+    # as with argparse, the last of a repeated option wins
+    (["item", "get", "X", "--vault", "A", "--vault", "B"], ["item", "get", "X", "--vault", "B"]),
+])
+def test_canonical_args(arg_parser, argv, canonical):
+    assert canonical_argv(argv) == canonical
+    assert canonical_argv(canonical) == canonical
+    # playback parses the argument list as argparse would parse its canonical form
+    assert vars(parse_mock_op_args(argv)) == vars(arg_parser.parse_args(canonical))
+
+
+@pytest.mark.parametrize("argv", [
+    ["item", "get", "X", "--bogus"],
+    # a global option after the subcommand still needs its value
+    ["item", "get", "X", "--format"],
+    # a subcommand's option doesn't belong to the command before it
+    ["--vault", "V", "item", "get", "X"],
+    ["item", "get", "X", "--fields", "bad"],
+    ["item", "get", "--format", "json"],
+    ["item", "get", "X", "Y"],
+])
+def test_parse_mock_op_args_rejects(argv):
+    assert canonical_argv(argv) is None
+    assert parse_mock_op_args(argv) is None
+
+
+def test_parse_mock_op_args_matches_argparse(arg_parser):
+    mismatches = []
+    reordered = 0
+    for argv in generate_argv_corpus(arg_parser, CORPUS_SIZE, CORPUS_SEED + 1):
+        parsed = parse_mock_op_args(argv)
+        if parsed is None:
+            continue
+        canonical = canonical_argv(argv)
+        expected = _argparse_parse(arg_parser, argv)
+        if expected is None:
+            # accepted only because op allows what argparse doesn't, e.g., global options
+            # after the subcommand, so it must mean what its canonical form does to argparse
+            reordered += 1
+            expected = _argparse_parse(arg_parser, canonical)
+        if expected is None or vars(parsed) != vars(expected) or canonical_argv(canonical) != canonical:
+            mismatches.append((argv, canonical, expected, parsed))
+
+    assert mismatches == []
+    assert reordered > 0
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+from mock_op._op import _OPArgv
+from mock_op.async_response_generator import (
+    OPAsyncResponseGenerator,
+    OPResponseGenPlanner,
+    OPResponseGenRequest
+)
+from mock_op.response_generator import (
+    OPResponseGenerationException,
+    OPResponseGenerator
+)
+
+# stands in for 'op', answering from a vault model, optionally logging when each run
+# starts and finishes, and taking a while about it so overlapping runs can be seen
+FAKE_OP = f"""#!{sys.executable}
+import os
+import sys
+import time
+
+log = os.environ.get("FAKE_OP_LOG")
+if log:
+    with open(log, "a") as f:
+        f.write(f"{{time.monotonic()}} 1\\n")
+    time.sleep(0.3)
+    with open(log, "a") as f:
+        f.write(f"{{time.monotonic()}} -1\\n")
+from mock_op.mock_op_main import main
+sys.exit(main())
+"""
+
+
+@pytest.fixture
+def fake_op(tmp_path, monkeypatch, vault_model_path) -> str:
+    op_path = Path(tmp_path, "op")
+    op_path.write_text(FAKE_OP)
+    op_path.chmod(op_path.stat().st_mode | stat.S_IXUSR)
+    for name in list(os.environ):
+        if name.startswith("MOCK_OP_"):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("MOCK_OP_VAULT_MODEL", str(vault_model_path))
+    return str(op_path)
+
+
+def _request(op_path, title="Example Login", query_name="item-get", expected_return=0):
+    return OPResponseGenRequest(_OPArgv.item_get_argv(op_path, title, vault="Test Data"),
+                                query_name, expected_return, False)
+
+
+def _comparable(invocation):
+    return (invocation.cmd_args, invocation.input_hash, dict(invocation.response),
+            invocation.response.output, invocation.response.error_output)
+
+
+def test_same_invocation_as_synchronous(fake_op):
+    request = _request(fake_op)
+    invocation = asyncio.run(OPAsyncResponseGenerator().run_request(request))
+    assert invocation.cmd_args[:4] == ["--format", "json", "item", "get"]
+    assert json.loads(invocation.response.output)["title"] == "Example Login"
+    expected = OPResponseGenerator._generate_response(request.run_argv, "item-get", 0, False)
+    assert _comparable(invocation) == _comparable(expected)
+
+
+def test_request_with_input(fake_op):
+    # no such item, so the recorded response is op's error
+    input = json.dumps([{"id": "unused", "title": "Example Login"}])
+    request = OPResponseGenRequest(_OPArgv.item_delete_argv(fake_op, "-"), "item-delete", 1, True, input=input)
+    invocation = asyncio.run(OPAsyncResponseGenerator().run_request(request))
+    assert invocation.input_hash is not None
+    assert invocation.response["changes_state"]
+
+
+def test_unexpected_return(fake_op):
+    with pytest.raises(OPResponseGenerationException):
+        asyncio.run(OPAsyncResponseGenerator().run_request(_request(fake_op, title="Missing Login")))
+
+
+def test_planner_returns_requests(fake_op):
+    planned = OPResponseGenPlanner._generate_response(
+        _OPArgv.item_get_argv(fake_op, "Example Login"), "item-get", 0, False)
+    assert isinstance(planned, OPResponseGenRequest)
+    assert planned.query_name == "item-get"
+
+
+def test_run_shapes(fake_op):
+    generator = OPAsyncResponseGenerator()
+    planned = (_request(fake_op), [_request(fake_op, title="Example Login 2", query_name="item-get-2")])
+    invocation, (listed,) = asyncio.run(generator.run(planned))
+    assert invocation.response["name"] == "item-get"
+    assert listed.response["name"] == "item-get-2"
+    with pytest.raises(TypeError):
+        asyncio.run(generator.run("not planned"))
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_concurrency_limit(tmp_path, monkeypatch, fake_op, concurrency):
+    log_path = Path(tmp_path, "runs.log")
+    monkeypatch.setenv("FAKE_OP_LOG", str(log_path))
+    generator = OPAsyncResponseGenerator(concurrency=concurrency)
+
+    async def generate_all():
+        return await asyncio.gather(*[generator.generate(_request, fake_op, query_name=f"item-get-{i}")
+                                      for i in range(4)])
+
+    invocations = asyncio.run(generate_all())
+    assert [invocation.response["name"] for invocation in invocations] == [f"item-get-{i}" for i in range(4)]
+    events = sorted(tuple(map(float, line.split())) for line in log_path.read_text().splitlines())
+    running = max_running = 0
+    for _, change in events:
+        running += int(change)
+        max_running = max(max_running, running)
+    assert max_running == concurrency
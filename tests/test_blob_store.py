@@ -0,0 +1,87 @@
+import json
+import shutil
+from pathlib import Path
+
+from conftest import (
+    ITEM_GET_ARGV,
+    ITEM_GET_OUTPUT,
+    clean_environment,
+    run_entry_point
+)
+from mock_cli import CommandInvocation
+
+from mock_op.blob_store import (
+    BLOB_DIR_KEY,
+    MockOPBlobResponseDirectory,
+    MockOPBlobStore,
+    blob_digest,
+    dedupe_response_directories,
+    dedupe_response_directory
+)
+from mock_op.response_index import compile_response_index
+
+
+def _playback(respdir_json_file, cwd):
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(respdir_json_file)
+    result = run_entry_point("mock_op.mock_op_main", ITEM_GET_ARGV, env, cwd=cwd)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    return result.stdout
+
+
+def test_blob_path_fans_out():
+    store = MockOPBlobStore("unused")
+    assert store.blob_path("3fa2").as_posix() == "unused/3f/a2"
+
+
+def test_recorded_blob_round_trip(tmp_path, monkeypatch):
+    config_dir = Path(tmp_path, "config")
+    respdir_json_file = Path(config_dir, "response-directory.json")
+    monkeypatch.chdir(tmp_path)
+    directory = MockOPBlobResponseDirectory(
+        respdir_json_file, Path(config_dir, "blobs"), create=True, response_dir=Path(config_dir, "responses"))
+    invocation = CommandInvocation(ITEM_GET_ARGV, ITEM_GET_OUTPUT, b"", 0, "item-get", False)
+    directory.add_command_invocation(invocation, save=True)
+
+    recorded = json.loads(respdir_json_file.read_text())
+    assert recorded["meta"][BLOB_DIR_KEY] == "blobs"
+    assert MockOPBlobStore(Path(config_dir, "blobs")).read(blob_digest(ITEM_GET_OUTPUT)) == ITEM_GET_OUTPUT
+    # the blob store is found relative to the JSON file, wherever mock-op runs from
+    assert _playback(respdir_json_file, cwd=Path(tmp_path, "config", "blobs")) == ITEM_GET_OUTPUT
+    assert _playback(compile_response_index(respdir_json_file), cwd="/") == ITEM_GET_OUTPUT
+
+
+def test_dedupe_response_directory(tmp_path, response_directory):
+    blob_dir = Path(tmp_path, "blobs")
+    stats = dedupe_response_directory(response_directory, blob_dir)
+    assert (stats.file_count, stats.stored_count, stats.skipped_count) == (2, 2, 0)
+    assert not Path(tmp_path, "responses").exists()
+    assert json.loads(response_directory.read_text())["meta"][BLOB_DIR_KEY] == "blobs"
+    assert _playback(response_directory, cwd="/") == ITEM_GET_OUTPUT
+
+    # already converted, so there's nothing left to store
+    stats = dedupe_response_directory(response_directory, blob_dir)
+    assert (stats.file_count, stats.skipped_count) == (0, 0)
+
+
+def test_dedupe_shared_response_dir(tmp_path, response_directory):
+    # e.g., two iterations of a state configuration, recorded into the same response path
+    other_json_file = Path(tmp_path, "response-directory-2.json")
+    shutil.copy(response_directory, other_json_file)
+
+    results = list(dedupe_response_directories(
+        [response_directory, other_json_file], Path(tmp_path, "blobs")))
+    assert [stats.file_count for _, stats in results] == [2, 2]
+    assert [stats.stored_count for _, stats in results] == [2, 0]
+    assert not Path(tmp_path, "responses").exists()
+    for respdir_json_file in [response_directory, other_json_file]:
+        assert _playback(respdir_json_file, cwd=tmp_path) == ITEM_GET_OUTPUT
+
+
+def test_dedupe_dry_run(tmp_path, response_directory):
+    original = response_directory.read_bytes()
+    results = list(dedupe_response_directories([response_directory], Path(tmp_path, "blobs"), dry_run=True))
+    assert results[0][1].stored_count == 2
+    assert response_directory.read_bytes() == original
+    assert not Path(tmp_path, "blobs").exists()
+    assert Path(tmp_path, "responses", "item-get", "output").exists()
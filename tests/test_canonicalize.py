@@ -0,0 +1,51 @@
+import json
+
+from conftest import (
+    ITEM_GET_ARGV,
+    ITEM_GET_OUTPUT,
+    clean_environment,
+    run_entry_point
+)
+from mock_cli.argv_conversion import argv_to_string
+
+from mock_op.canonicalize import canonicalize_response_directory
+from mock_op.mock_op_arg_validator import canonical_argv
+from mock_op.state import write_json_atomic
+
+REORDERED_ARGV = ["item", "get", "Example Login", "--vault", "Test Data", "--format", "json"]
+DASH_VALUE_ARGV = ["whoami", "--account=-1"]
+
+
+def _add_commands(respdir_json_file, argvs):
+    directory = json.loads(respdir_json_file.read_text())
+    response = directory["commands"][argv_to_string(ITEM_GET_ARGV)]
+    for argv in argvs:
+        directory["commands"][argv_to_string(argv)] = dict(response)
+    write_json_atomic(respdir_json_file, directory)
+
+
+def test_canonicalize_merges_equivalent_commands(response_directory):
+    _add_commands(response_directory, [REORDERED_ARGV, DASH_VALUE_ARGV])
+    stats = canonicalize_response_directory(response_directory)
+    assert stats.command_count == 3
+    assert stats.merged_count == 1
+    assert stats.skipped_count == 0
+    assert stats.conflicts == []
+
+    commands = json.loads(response_directory.read_text())["commands"]
+    assert sorted(commands) == sorted([argv_to_string(canonical_argv(ITEM_GET_ARGV)),
+                                       argv_to_string(canonical_argv(DASH_VALUE_ARGV))])
+    # option values starting with '-' stay attached to their option, so they can be parsed again
+    assert canonical_argv(DASH_VALUE_ARGV) == ["--account=-1", "whoami"]
+
+    # already canonical, so there's nothing left to do
+    assert not canonicalize_response_directory(response_directory).changed
+
+
+def test_canonicalized_response_answers_reordered_argv(response_directory):
+    canonicalize_response_directory(response_directory)
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(response_directory)
+    result = run_entry_point("mock_op.mock_op_main", REORDERED_ARGV, env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert result.stdout == ITEM_GET_OUTPUT
@@ -0,0 +1,119 @@
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from conftest import (
+    ITEM_GET_ARGV,
+    ITEM_GET_OUTPUT,
+    clean_environment,
+    run_entry_point
+)
+from mock_cli.argv_conversion import argv_to_string
+from mock_cli.hashing import digest_input
+
+from mock_op.command_input import (
+    INPUT_CHUNK_SIZE,
+    STDIN_MODE_ALWAYS,
+    STDIN_MODE_ENV_NAME,
+    STDIN_MODE_POLL,
+    STDIN_MODE_SUBCOMMAND,
+    STDIN_TIMEOUT_ENV_NAME,
+    MockOPCommandInput,
+    command_reads_input,
+    read_command_input
+)
+from mock_op.mock_op_arg_validator import parse_mock_op_args
+from mock_op.state import write_json_atomic
+
+ITEM_DELETE_ARGV = ["item", "delete", "-"]
+# spans several chunks, and doesn't end on a chunk boundary
+LARGE_INPUT = os.urandom(5 * INPUT_CHUNK_SIZE + 3)
+
+
+@pytest.mark.parametrize("data", [LARGE_INPUT, b"[]\n", b""])
+def test_read_matches_digest_input(data):
+    read = MockOPCommandInput.read(io.BytesIO(data), retain=True)
+    assert read.digest == MockOPCommandInput.from_bytes(data).digest == digest_input(data)
+    assert read.data == data
+    # empty input counts as no input
+    assert bool(read) == bool(data)
+
+
+def test_read_without_retaining():
+    read = MockOPCommandInput.read(io.BytesIO(LARGE_INPUT))
+    assert read.digest == digest_input(LARGE_INPUT)
+    assert read.data is None
+
+
+def test_mock_op_looks_up_input_digest(tmp_path, response_directory):
+    directory = json.loads(response_directory.read_text())
+    Path(tmp_path, "responses", "item-delete").mkdir()
+    Path(tmp_path, "responses", "item-delete", "output").write_bytes(b"")
+    Path(tmp_path, "responses", "item-delete", "error_output").write_bytes(b"")
+    directory["commands_with_input"][digest_input(LARGE_INPUT)] = {
+        argv_to_string(ITEM_DELETE_ARGV): {
+            "exit_status": 0,
+            "stdout": "output",
+            "stderr": "error_output",
+            "name": "item-delete",
+            "changes_state": False
+        }
+    }
+    write_json_atomic(response_directory, directory)
+
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(response_directory)
+    result = run_entry_point("mock_op.mock_op_main", ITEM_DELETE_ARGV, env, input=LARGE_INPUT)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    result = run_entry_point("mock_op.mock_op_main", ITEM_DELETE_ARGV, env, input=LARGE_INPUT[1:])
+    assert result.returncode != 0
+
+
+@pytest.mark.parametrize("argv, reads_input", [
+    (["item", "delete", "-"], True),
+    (["item", "delete", "Example Login"], False),
+    (["document", "edit", "Example Document"], True),
+    (["--format", "json", "item", "get", "Example Login"], False)
+])
+def test_command_reads_input(argv, reads_input):
+    assert command_reads_input(parse_mock_op_args(argv)) == reads_input
+
+
+@pytest.mark.parametrize("mode, input_written, read", [
+    (STDIN_MODE_SUBCOMMAND, True, False),
+    (STDIN_MODE_ALWAYS, True, True),
+    (STDIN_MODE_POLL, True, True),
+    (STDIN_MODE_POLL, False, False)
+])
+def test_read_command_input_modes(monkeypatch, mode, input_written, read):
+    monkeypatch.setenv(STDIN_MODE_ENV_NAME, mode)
+    monkeypatch.setenv(STDIN_TIMEOUT_ENV_NAME, "0.01")
+    parsed_args = parse_mock_op_args(["--format", "json", "item", "get", "Example Login"])
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(read_fd, "rb") as stream, os.fdopen(write_fd, "wb") as pipe:
+        if input_written:
+            pipe.write(b"[]\n")
+            # otherwise reading would never finish
+            pipe.close()
+        command_input = read_command_input(stream, parsed_args, retain=True)
+    assert command_input.data == (b"[]\n" if read else None)
+
+
+def test_mock_op_doesnt_wait_for_unneeded_input(response_directory):
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(response_directory)
+    script = "import sys; from mock_op.mock_op_main import main; sys.exit(main())"
+    # stdin is a pipe that's never closed, as when run from something that doesn't close it
+    with subprocess.Popen([sys.executable, "-c", script] + ITEM_GET_ARGV, env=env, stdin=subprocess.PIPE,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE) as mock_op:
+        try:
+            returncode = mock_op.wait(timeout=30)
+            stdout = mock_op.stdout.read()
+        finally:
+            mock_op.kill()
+    assert returncode == 0
+    assert stdout == ITEM_GET_OUTPUT
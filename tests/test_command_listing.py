@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import pytest
+from conftest import ITEM_GET_ARGV, ITEM_GET_OUTPUT
+from mock_cli.argv_conversion import argv_to_string
+
+from mock_op.command_listing import (
+    MockOPCommandFilter,
+    MockOPResponseSizer,
+    iter_commands,
+    subcommand_words
+)
+from mock_op.response_directory import open_response_directory
+from mock_op.response_index import compile_response_index
+from mock_op.state import write_json_atomic
+
+TRAILING_OPTIONS_ARGV = ["item", "get", "Example Login", "--format", "json"]
+VAULT_LIST_ARGV = ["vault", "list", "--format=json"]
+
+
+@pytest.mark.parametrize("argv, words", [
+    (ITEM_GET_ARGV, ["item", "get"]),
+    # global options after the subcommand, as op accepts them
+    (TRAILING_OPTIONS_ARGV, ["item", "get"]),
+    (VAULT_LIST_ARGV, ["vault", "list"]),
+    (["whoami"], ["whoami"]),
+    (["item", "get"], None),
+    (["item", "get", "Example Login", "--bogus"], None)
+])
+def test_subcommand_words(argv, words):
+    assert subcommand_words(argv) == words
+
+
+@pytest.fixture(params=[False, True], ids=["json", "index"])
+def listed_directory(request, response_directory):
+    directory_dict = json.loads(response_directory.read_text())
+    response = directory_dict["commands"][argv_to_string(ITEM_GET_ARGV)]
+    for argv in [TRAILING_OPTIONS_ARGV, VAULT_LIST_ARGV]:
+        directory_dict["commands"][argv_to_string(argv)] = dict(response)
+    write_json_atomic(response_directory, directory_dict)
+    respdir_path = response_directory
+    if request.param:
+        respdir_path = compile_response_index(response_directory)
+    directory = open_response_directory(respdir_path)
+    yield directory
+    close = getattr(directory, "close", None)
+    if close is not None:
+        close()
+
+
+@pytest.mark.parametrize("subcommand, expected", [
+    ("item get", [ITEM_GET_ARGV, TRAILING_OPTIONS_ARGV]),
+    ("item", [ITEM_GET_ARGV, TRAILING_OPTIONS_ARGV]),
+    ("vault list", [VAULT_LIST_ARGV]),
+    ("item list", [])
+])
+def test_filter_by_subcommand(listed_directory, subcommand, expected):
+    entries = iter_commands(listed_directory, MockOPCommandFilter(subcommand=subcommand))
+    assert [entry.argv for entry in entries] == expected
+
+
+def test_filter_by_contents(listed_directory):
+    entries = iter_commands(listed_directory, MockOPCommandFilter(contains="--format=json"))
+    assert [entry.argv for entry in entries] == [VAULT_LIST_ARGV]
+    entries = iter_commands(listed_directory, MockOPCommandFilter(regex=r"Login\b.*--format"))
+    assert [entry.argv for entry in entries] == [TRAILING_OPTIONS_ARGV]
+    assert list(iter_commands(listed_directory, MockOPCommandFilter(input_hash="0" * 32))) == []
+
+
+def test_response_sizes(tmp_path, listed_directory):
+    sizer = MockOPResponseSizer(listed_directory)
+    entry = next(iter_commands(listed_directory))
+    assert sizer.sizes(entry) == {"output_bytes": len(ITEM_GET_OUTPUT), "error_output_bytes": 0}
+    Path(tmp_path, "responses", "item-get", "output").unlink()
+    assert sizer.sizes(entry)["output_bytes"] is None
@@ -0,0 +1,92 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+from conftest import ITEM_GET_ARGV, clean_environment, run_entry_point
+from mock_cli import CommandInvocation
+
+from mock_op.compression import (
+    COMPRESSION_GZIP,
+    COMPRESSION_KEY,
+    COMPRESSION_ZSTD,
+    MockOPCompressionException,
+    MockOPDecompressionCache,
+    compress,
+    compress_outputs,
+    decompress,
+    open_decompressed
+)
+from mock_op.response_directory import MockOPResponseDirectory
+from mock_op.response_pack import pack_response_dir
+
+LARGE_OUTPUT = json.dumps([{"title": f"Example Login {i}", "vault": "Test Data"}
+                           for i in range(5000)]).encode("utf-8")
+
+
+@pytest.fixture(params=[COMPRESSION_GZIP, COMPRESSION_ZSTD])
+def compression(request):
+    if request.param == COMPRESSION_ZSTD:
+        pytest.importorskip("zstandard")
+    return request.param
+
+
+def test_compress_round_trip(compression):
+    compressed = compress(LARGE_OUTPUT, compression)
+    assert len(compressed) < len(LARGE_OUTPUT)
+    # identical output always compresses identically
+    assert compress(LARGE_OUTPUT, compression) == compressed
+    assert decompress(compressed, compression) == LARGE_OUTPUT
+    assert decompress(memoryview(compressed), compression) == LARGE_OUTPUT
+
+
+@pytest.mark.parametrize("wrap", [bytes, memoryview, io.BytesIO])
+def test_open_decompressed(compression, wrap):
+    with open_decompressed(wrap(compress(LARGE_OUTPUT, compression)), compression) as source:
+        assert source.read() == LARGE_OUTPUT
+
+
+def test_compress_outputs_only_when_smaller(compression):
+    response = {COMPRESSION_KEY: {"stale": COMPRESSION_GZIP}}
+    outputs = compress_outputs(response, {"output": LARGE_OUTPUT, "error_output": b""}, compression)
+    assert response[COMPRESSION_KEY] == {"output": compression}
+    assert outputs["error_output"] == b""
+    assert decompress(outputs["output"], compression) == LARGE_OUTPUT
+
+
+def test_unknown_compression():
+    with pytest.raises(MockOPCompressionException):
+        compress(LARGE_OUTPUT, "lz4")
+
+
+def test_decompression_cache():
+    cache = MockOPDecompressionCache(max_size=10)
+    assert cache.get("a", lambda: b"aaaa") == b"aaaa"
+    assert cache.get("a", lambda: pytest.fail("should be cached")) == b"aaaa"
+    cache.get("b", lambda: b"bbbb")
+    cache.get("a", lambda: b"aaaa")
+    # evicts the least recently used, 'b'
+    cache.get("c", lambda: b"cccc")
+    assert (cache.hits, cache.misses, len(cache), cache.size) == (2, 3, 2, 8)
+    # too big to cache at all
+    cache.get("d", lambda: b"d" * 11)
+    assert len(cache) == 2
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_compressed_playback(tmp_path, compression, packed):
+    respdir_json_file = Path(tmp_path, "response-directory.json")
+    response_dir = Path(tmp_path, "responses")
+    directory = MockOPResponseDirectory(
+        respdir_json_file, create=True, response_dir=response_dir, compression=compression)
+    invocation = CommandInvocation(ITEM_GET_ARGV, LARGE_OUTPUT, b"", 0, "item-get", False)
+    directory.add_command_invocation(invocation, save=True)
+    assert len(Path(response_dir, "item-get", "output").read_bytes()) < len(LARGE_OUTPUT)
+    if packed:
+        pack_response_dir(response_dir, remove=True)
+
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(respdir_json_file)
+    result = run_entry_point("mock_op.mock_op_main", ITEM_GET_ARGV, env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert result.stdout == LARGE_OUTPUT
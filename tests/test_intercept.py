@@ -0,0 +1,69 @@
+import json
+import subprocess
+import sys
+
+import pytest
+from conftest import (
+    ITEM_GET_ARGV,
+    ITEM_GET_OUTPUT,
+    clean_environment,
+    run_entry_point
+)
+
+from mock_op.intercept import MockOPInterceptException, MockOPInterceptor
+
+
+@pytest.fixture
+def respdir_env(monkeypatch, response_directory):
+    monkeypatch.setenv("MOCK_OP_RESPONSE_DIRECTORY", str(response_directory))
+
+
+def test_intercepted_run(respdir_env, mock_op_intercept):
+    result = subprocess.run(["op"] + ITEM_GET_ARGV, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ITEM_GET_OUTPUT
+    assert mock_op_intercept.calls == [["op"] + ITEM_GET_ARGV]
+
+    output = subprocess.check_output(["/usr/local/bin/op"] + ITEM_GET_ARGV, text=True)
+    assert output == ITEM_GET_OUTPUT.decode("utf-8")
+
+
+def test_intercepted_error_matches_mock_op(response_directory, respdir_env, mock_op_intercept):
+    argv = ["--format", "json", "item", "get", "Unrecorded Login"]
+    intercepted = subprocess.run(["op"] + argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(response_directory)
+    stand_alone = run_entry_point("mock_op.mock_op_main", argv, env)
+    assert intercepted.returncode == stand_alone.returncode != 0
+    assert intercepted.stdout == stand_alone.stdout
+    assert intercepted.stderr == stand_alone.stderr
+
+
+def test_intercepted_input(monkeypatch, vault_model_path, mock_op_intercept):
+    monkeypatch.setenv("MOCK_OP_VAULT_MODEL", str(vault_model_path))
+    list_argv = ["op", "--format", "json", "item", "list", "--vault", "Test Data"]
+    items = json.loads(subprocess.check_output(list_argv))
+    with subprocess.Popen(["op", "--format", "json", "item", "delete", "-"], stdin=subprocess.PIPE,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        _, stderr = process.communicate(json.dumps(items[:1]).encode("utf-8"))
+    assert process.returncode == 0, stderr
+    remaining = json.loads(subprocess.check_output(list_argv))
+    assert [item["id"] for item in remaining] == [items[1]["id"]]
+
+
+def test_other_programs_pass_through(mock_op_intercept):
+    output = subprocess.check_output([sys.executable, "-c", "print('not op')"])
+    assert output == b"not op\n"
+    # shell commands are left to the shell
+    assert subprocess.check_output("echo op", shell=True) == b"op\n"
+    assert mock_op_intercept.calls == []
+
+
+def test_interceptor_restores_popen():
+    real_popen = subprocess.Popen
+    with MockOPInterceptor():
+        assert subprocess.Popen is not real_popen
+        with pytest.raises(MockOPInterceptException):
+            with MockOPInterceptor():
+                pass
+    assert subprocess.Popen is real_popen
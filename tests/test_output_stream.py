@@ -0,0 +1,81 @@
+import io
+import os
+import threading
+from pathlib import Path
+
+import pytest
+from conftest import ITEM_GET_ARGV, clean_environment, run_entry_point
+
+from mock_op.output_stream import CHUNK_SIZE, copy_fd, write_output
+
+# spans several chunks, and doesn't end on a chunk boundary
+LARGE_OUTPUT = os.urandom(3 * CHUNK_SIZE + 17)
+
+
+@pytest.fixture
+def large_file(tmp_path) -> Path:
+    path = Path(tmp_path, "output")
+    path.write_bytes(LARGE_OUTPUT)
+    return path
+
+
+@pytest.mark.parametrize("source", [LARGE_OUTPUT, memoryview(LARGE_OUTPUT), bytearray(LARGE_OUTPUT)])
+def test_write_buffer(tmp_path, source):
+    out_path = Path(tmp_path, "out")
+    with open(out_path, "wb") as out:
+        # anything already buffered has to come out first
+        out.write(b"before\n")
+        assert write_output(out, source) == len(LARGE_OUTPUT)
+    assert out_path.read_bytes() == b"before\n" + LARGE_OUTPUT
+
+
+def test_write_file_to_fd(tmp_path, large_file):
+    out_path = Path(tmp_path, "out")
+    source = open(large_file, "rb")
+    with open(out_path, "wb") as out:
+        assert write_output(out, source) == len(LARGE_OUTPUT)
+    assert source.closed
+    assert out_path.read_bytes() == LARGE_OUTPUT
+
+
+def test_write_without_fds(large_file):
+    # neither end has a file descriptor, so output is copied a chunk at a time
+    out = io.BytesIO()
+    assert write_output(out, io.BytesIO(LARGE_OUTPUT)) == len(LARGE_OUTPUT)
+    assert out.getvalue() == LARGE_OUTPUT
+
+    out = io.BytesIO()
+    assert write_output(out, open(large_file, "rb")) == len(LARGE_OUTPUT)
+    assert out.getvalue() == LARGE_OUTPUT
+
+
+def test_copy_fd_to_pipe(large_file):
+    read_fd, write_fd = os.pipe()
+    copied = []
+
+    def _copy():
+        try:
+            with open(large_file, "rb") as f:
+                copied.append(copy_fd(f.fileno(), write_fd))
+        finally:
+            os.close(write_fd)
+
+    # a pipe holds far less than the output, so something has to read it while it's copied
+    copier = threading.Thread(target=_copy)
+    copier.start()
+    received = bytearray()
+    with os.fdopen(read_fd, "rb") as pipe:
+        for chunk in iter(lambda: pipe.read(CHUNK_SIZE), b""):
+            received += chunk
+    copier.join()
+    assert copied == [len(LARGE_OUTPUT)]
+    assert bytes(received) == LARGE_OUTPUT
+
+
+def test_mock_op_streams_large_output(tmp_path, response_directory):
+    Path(tmp_path, "responses", "item-get", "output").write_bytes(LARGE_OUTPUT)
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(response_directory)
+    result = run_entry_point("mock_op.mock_op_main", ITEM_GET_ARGV, env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert result.stdout == LARGE_OUTPUT
@@ -0,0 +1,100 @@
+from pathlib import Path
+
+from mock_cli import CommandInvocation
+
+from mock_op.response_directory import MockOPResponseDirectory
+from mock_op.response_gen_history import (
+    OPResponseGenHistory,
+    definition_fingerprint,
+    mark_invocations,
+    select_definitions
+)
+from mock_op.response_generator_config import OPresponseDefinition
+
+
+def _definition(name, **params):
+    return OPresponseDefinition(name, {"type": "item-get", **params})
+
+
+def _invocation(name, i=0):
+    return CommandInvocation(["--format", "json", "item", "get", f"{name} {i}"],
+                             b'{"title": "Example Login"}\n', b"", 0, f"{name}-{i}", False)
+
+
+def _directory(tmp_path):
+    return MockOPResponseDirectory(Path(tmp_path, "response-directory.json"), create=True,
+                                   response_dir=Path(tmp_path, "responses"))
+
+
+def _record(directory, name, fingerprint, run_id, count, recorded=None):
+    invocations = [_invocation(name, i) for i in range(count)]
+    mark_invocations(invocations, name, fingerprint, run_id)
+    for invocation in invocations[:recorded]:
+        directory.add_command_invocation(invocation)
+
+
+def test_definition_fingerprint(tmp_path):
+    document_path = Path(tmp_path, "document.txt")
+    document_path.write_text("first")
+    definition = _definition("item-get", **{"item-identifier": "Example Login",
+                                            "new-document-path": str(document_path)})
+    fingerprint = definition_fingerprint(definition)
+    assert definition_fingerprint(dict(definition, enabled=False)) == fingerprint
+    assert definition_fingerprint(dict(definition, **{"item-identifier": "Other"})) != fingerprint
+    # the contents of files a definition names are part of it
+    document_path.write_text("second")
+    assert definition_fingerprint(definition) != fingerprint
+
+
+def test_history_up_to_date(tmp_path):
+    directory = _directory(tmp_path)
+    _record(directory, "complete", "f1", "run-1", 2)
+    _record(directory, "interrupted", "f1", "run-1", 2, recorded=1)
+    _record(directory, "missing-output", "f1", "run-1", 1)
+    Path(tmp_path, "responses", "missing-output-0", "output").unlink()
+
+    history = OPResponseGenHistory(directory)
+    assert history.up_to_date("complete", "f1")
+    assert not history.up_to_date("complete", "f2")
+    assert not history.up_to_date("interrupted", "f1")
+    assert not history.up_to_date("missing-output", "f1")
+    assert not history.up_to_date("never-recorded", "f1")
+    assert history.run_recorded("run-1") == {("complete", "f1")}
+
+
+def test_runs_resumed_until_finished(tmp_path):
+    directory = _directory(tmp_path)
+    history = OPResponseGenHistory(directory)
+    assert history.last_run is None
+    run_id, resumed = history.start_run(resume=True)
+    assert not resumed
+    assert history.start_run(resume=True) == (run_id, True)
+
+    history.finish_run(run_id)
+    # saved along with the directory, so the next run sees it
+    reopened = MockOPResponseDirectory(directory.json_file)
+    assert OPResponseGenHistory(reopened).last_run == {"run": run_id, "complete": True}
+    new_run_id, resumed = history.start_run(resume=True)
+    assert new_run_id != run_id
+    assert not resumed
+
+
+def test_select_definitions(tmp_path):
+    directory = _directory(tmp_path)
+    names = ["first", "second", "third", "fourth"]
+    definitions = [(name, _definition(name)) for name in names]
+    fingerprints = {name: definition_fingerprint(definition) for name, definition in definitions}
+    _record(directory, "first", fingerprints["first"], "run-1", 1)
+    _record(directory, "third", fingerprints["third"], "run-1", 1)
+    _record(directory, "fourth", "outdated", "run-1", 1)
+    history = OPResponseGenHistory(directory)
+
+    def selected(**kwargs):
+        return [name for name, _ in select_definitions(history, definitions, fingerprints, **kwargs)]
+
+    assert selected() == ["second", "fourth"]
+    assert selected(force=["first"]) == ["first", "second", "fourth"]
+    # resuming skips everything up to the last definition the run recorded, even if forced,
+    # but not a definition that has changed since it was recorded
+    assert selected(force=names, resume_run="run-1") == ["fourth"]
+    assert selected(force=names, resume_run="run-2") == names
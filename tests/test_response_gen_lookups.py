@@ -0,0 +1,99 @@
+from mock_op.response_gen_lookups import OPResponseGenLookupCache
+from mock_op.response_generator import OPResponseGenerator
+from mock_op.response_generator_config import OPresponseDefinition
+
+
+class _Item:
+
+    def __init__(self, title, unique_id):
+        self.title = title
+        self.unique_id = unique_id
+        self.tags = ["example"]
+
+
+class _FakeOP:
+
+    def __init__(self):
+        self.item_gets = []
+        self.item_lists = []
+
+    def item_get(self, item_name_or_id, vault=None):
+        self.item_gets.append((item_name_or_id, vault))
+        return _Item("Example Login", "abc123")
+
+    def item_list(self, **kwargs):
+        self.item_lists.append(kwargs)
+        return [_Item("Example Login", "abc123")]
+
+
+def _definition(query_type, **params):
+    return OPresponseDefinition(f"{query_type}-example", {"type": query_type, **params})
+
+
+def test_lookups_remembered():
+    op = _FakeOP()
+    cache = OPResponseGenLookupCache()
+    item = cache.item_get(op.item_get, "Example Login", vault="Test Data")
+    # callers may change what they're given without changing what's remembered
+    item.tags.append("new-tag")
+    assert cache.item_get(op.item_get, "Example Login", vault="Test Data").tags == ["example"]
+    cache.item_get(op.item_get, "Example Login", vault="Other Data")
+    assert op.item_gets == [("Example Login", "Test Data"), ("Example Login", "Other Data")]
+
+    cache.item_list(op.item_list, tags=["example"], vault="Test Data")
+    cache.item_list(op.item_list, vault="Test Data", tags=["example"])
+    cache.item_list(op.item_list, vault="Test Data")
+    assert len(op.item_lists) == 2
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_definitions_forget_what_they_may_have_changed():
+    op = _FakeOP()
+    cache = OPResponseGenLookupCache()
+
+    def lookup_all():
+        cache.item_get(op.item_get, "Example Login")
+        cache.item_get(op.item_get, "abc123")
+        cache.item_get(op.item_get, "Other Login")
+        cache.item_list(op.item_list)
+
+    lookup_all()
+    cache.definition_done(_definition("item-get", **{"item-identifier": "Example Login"}))
+    lookup_all()
+    assert (len(op.item_gets), len(op.item_lists)) == (3, 1)
+
+    # forgotten however it was looked up, along with every item list
+    cache.definition_done(_definition("item-edit", **{"item-identifier": "abc123"}))
+    lookup_all()
+    assert op.item_gets[3:] == [("Example Login", None), ("abc123", None), ("Other Login", None)]
+    assert len(op.item_lists) == 2
+
+    op.item_gets.clear()
+    cache.definition_done(_definition("item-list", **{"changes-state": True}))
+    lookup_all()
+    assert len(op.item_gets) == 3
+
+    op.item_gets.clear()
+    cache.definition_done(_definition("item-delete-multiple"))
+    lookup_all()
+    assert len(op.item_gets) == 3
+
+
+def test_generator_lookups_use_cache(monkeypatch):
+    op = _FakeOP()
+    # lookups don't need a signed in 'op'
+    generator = OPResponseGenerator.__new__(OPResponseGenerator)
+    monkeypatch.setattr(generator, "item_get", op.item_get, raising=False)
+    monkeypatch.setattr(generator, "item_list", op.item_list, raising=False)
+
+    generator._lookup_item("Example Login")
+    generator._lookup_item("Example Login")
+    assert len(op.item_gets) == 2
+
+    monkeypatch.setattr(generator, "lookup_cache", OPResponseGenLookupCache(), raising=False)
+    generator._lookup_item("Example Login")
+    generator._lookup_item("Example Login")
+    generator._lookup_item_list(vault="Test Data")
+    generator._lookup_item_list(vault="Test Data")
+    assert len(op.item_gets) == 3
+    assert len(op.item_lists) == 1
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from mock_op.response_gen_runner import OPResponseGenRunner
+from mock_op.response_generator_config import OPresponseDefinition
+
+# a state-changing definition between two runs of read-only ones, the earlier of which
+# take longer the earlier they are, so they'd finish in reverse order if run concurrently
+DEFINITIONS = [
+    ("get-0", {"type": "item-get"}),
+    ("get-1", {"type": "item-get"}),
+    ("get-2", {"type": "item-get"}),
+    ("disabled", {"type": "item-get", "enabled": False}),
+    ("delete", {"type": "item-delete"}),
+    ("list-0", {"type": "item-list"}),
+    ("list-1", {"type": "item-list", "changes-state": True}),
+    ("list-2", {"type": "item-list"}),
+    ("list-3", {"type": "item-list"})
+]
+ENABLED_NAMES = [name for name, section in DEFINITIONS if section.get("enabled", True)]
+STATE_CHANGING = {"delete", "list-1"}
+
+
+def _definitions():
+    return [(name, OPresponseDefinition(name, section)) for name, section in DEFINITIONS]
+
+
+class _Recorder:
+    """
+    Tracks which definitions are running at once, and the order results are recorded in
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = set()
+        self.started = []
+        self.finished = []
+        self.max_running = 0
+        self.recorded = []
+        # what was running, and what had finished, as each state-changing definition started
+        self.barriers = {}
+
+    def start(self, name):
+        with self.lock:
+            if name in STATE_CHANGING:
+                self.barriers[name] = (set(self.running), list(self.finished))
+            self.running.add(name)
+            self.started.append(name)
+            self.max_running = max(self.max_running, len(self.running))
+
+    def finish(self, name):
+        with self.lock:
+            self.running.remove(name)
+            self.finished.append(name)
+
+    def delay(self, name) -> float:
+        return 0.02 * (3 - ENABLED_NAMES.index(name) % 4)
+
+    def prepare(self, name, definition):
+        def query():
+            self.start(name)
+            time.sleep(self.delay(name))
+            self.finish(name)
+            return name
+        return query
+
+    def prepare_async(self, name, definition):
+        async def query():
+            self.start(name)
+            await asyncio.sleep(self.delay(name))
+            self.finish(name)
+            return name
+        return query
+
+    def record(self, result):
+        assert result.query_name == result.invocation
+        self.recorded.append(result.query_name)
+
+    def check_barriers(self):
+        for name in STATE_CHANGING:
+            running, finished = self.barriers[name]
+            # everything before it had finished, and nothing after it had started
+            assert running == set()
+            assert set(finished) == set(ENABLED_NAMES[:ENABLED_NAMES.index(name)])
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_run(workers):
+    recorder = _Recorder()
+    runner = OPResponseGenRunner(recorder.prepare, recorder.record, workers=workers, progress=None)
+    runner.run(_definitions())
+    assert recorder.recorded == ENABLED_NAMES
+    recorder.check_barriers()
+    if workers == 1:
+        assert recorder.started == ENABLED_NAMES
+        assert recorder.max_running == 1
+    else:
+        # the read-only definitions ran concurrently, so didn't finish in config order
+        assert recorder.max_running > 1
+        assert recorder.finished != ENABLED_NAMES
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_run_async(workers):
+    recorder = _Recorder()
+    runner = OPResponseGenRunner(recorder.prepare_async, recorder.record, workers=workers, progress=None)
+    asyncio.run(runner.run_async(_definitions()))
+    assert recorder.recorded == ENABLED_NAMES
+    recorder.check_barriers()
+    assert recorder.max_running == min(workers, 3)
+
+
+def test_failed_definition_stops_run():
+    recorded = []
+
+    def prepare(name, definition):
+        def query():
+            if name == "delete":
+                raise RuntimeError("op failed")
+            return name
+        return query
+
+    runner = OPResponseGenRunner(prepare, lambda result: recorded.append(result.query_name), workers=4,
+                                 progress=None)
+    with pytest.raises(RuntimeError):
+        runner.run(_definitions())
+    # everything before the failure was recorded, and nothing after it
+    assert recorded == ENABLED_NAMES[:ENABLED_NAMES.index("delete")]
@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+from conftest import (
+    ITEM_GET_ARGV,
+    ITEM_GET_OUTPUT,
+    clean_environment,
+    run_entry_point
+)
+from mock_cli import ResponseLookupException
+from mock_cli.argv_conversion import argv_to_string
+
+from mock_op.response_index import (
+    MockOPResponseIndexException,
+    command_tokens,
+    compile_response_index,
+    open_indexed_response_directory,
+    response_index_path
+)
+from mock_op.state import write_json_atomic
+
+ITEM_LIST_ARGV = ["--format", "json", "item", "list"]
+
+
+def test_compiled_index_lookup(response_directory):
+    index_path = compile_response_index(response_directory)
+    assert index_path == response_index_path(response_directory)
+    directory = open_indexed_response_directory(response_directory)
+    try:
+        assert directory.commands == json.loads(response_directory.read_text())["commands"]
+        response = directory.response_lookup(ITEM_GET_ARGV)
+        assert response["name"] == "item-get"
+        with pytest.raises(ResponseLookupException):
+            directory.response_lookup(ITEM_LIST_ARGV)
+        with pytest.raises(MockOPResponseIndexException):
+            directory.add_command_invocation(None)
+
+        token = sorted(command_tokens(argv_to_string(ITEM_GET_ARGV)))[0]
+        commands = directory.token_commands(token, 10)
+        assert [directory.command_at(command) for command in commands] == \
+            [("", argv_to_string(ITEM_GET_ARGV))]
+    finally:
+        directory.close()
+
+
+def test_uncompiled_directory_has_no_index(response_directory):
+    assert open_indexed_response_directory(response_directory) is None
+
+
+def test_index_rebuilt_when_json_changes(response_directory):
+    compile_response_index(response_directory)
+    directory_dict = json.loads(response_directory.read_text())
+    response = directory_dict["commands"][argv_to_string(ITEM_GET_ARGV)]
+    directory_dict["commands"][argv_to_string(ITEM_LIST_ARGV)] = dict(response)
+    write_json_atomic(response_directory, directory_dict)
+
+    directory = open_indexed_response_directory(response_directory)
+    try:
+        assert directory.response_lookup(ITEM_LIST_ARGV)["name"] == "item-get"
+    finally:
+        directory.close()
+
+
+def test_index_kept_when_json_only_touched(response_directory):
+    index_path = compile_response_index(response_directory)
+    index_inode = os.stat(index_path).st_ino
+    st = os.stat(response_directory)
+    os.utime(response_directory, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    directory = open_indexed_response_directory(response_directory)
+    directory.close()
+    # same contents, so the index isn't rebuilt, only updated with the new time
+    assert os.stat(index_path).st_ino == index_inode
+    assert directory.meta["source-mtime-ns"] == str(st.st_mtime_ns + 10 ** 9)
+
+
+def test_mock_op_answers_from_index(response_directory):
+    index_path = compile_response_index(response_directory)
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(index_path)
+    result = run_entry_point("mock_op.mock_op_main", ITEM_GET_ARGV, env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert result.stdout == ITEM_GET_OUTPUT
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+
+from conftest import clean_environment, run_entry_point
+from mock_cli import CommandInvocation
+from mock_cli.argv_conversion import argv_to_string
+
+from mock_op.response_directory import MockOPResponseDirectory
+from mock_op.response_journal import (
+    MockOPResponseJournal,
+    response_journal_path
+)
+
+DELETE_ARGV = ["item", "delete", "-"]
+DELETE_INPUT = b'[{"id": "abc"}]'
+
+
+def _invocation(i):
+    return CommandInvocation(["--format", "json", "item", "get", f"Item {i}"],
+                             f'{{"title": "Item {i}"}}\n'.encode("utf-8"), b"", 0, f"item-get-{i}", False)
+
+
+def _delete_invocation():
+    return CommandInvocation(DELETE_ARGV, b"", b"", 0, "item-delete", True, input=DELETE_INPUT)
+
+
+def _open_directory(tmp_path, create=False):
+    return MockOPResponseDirectory(Path(tmp_path, "response-directory.json"), create=create,
+                                   response_dir=Path(tmp_path, "responses"),
+                                   input_dir=Path(tmp_path, "input"))
+
+
+def _saved_commands(directory):
+    saved = json.loads(directory.json_file.read_text())
+    return saved["commands"], saved["commands_with_input"]
+
+
+def test_journal_saves_in_batches(tmp_path):
+    directory = _open_directory(tmp_path, create=True)
+    directory.save()
+    with MockOPResponseJournal(directory, save_batch_size=2) as journal:
+        assert journal.replayed_count == 0
+        journal.add_command_invocation(_invocation(0), save=True)
+        # journaled and synced, but the JSON file isn't rewritten until a batch has built up
+        assert len(journal.path.read_text().splitlines()) == 1
+        assert _saved_commands(directory)[0] == {}
+
+        journal.add_command_invocation(_invocation(1), save=True)
+        assert not journal.path.exists()
+        assert len(_saved_commands(directory)[0]) == 2
+
+        journal.add_command_invocation(_invocation(2), save=True)
+        assert journal.path.exists()
+
+    assert not journal.path.exists()
+    assert len(_saved_commands(directory)[0]) == 3
+
+
+def test_interrupted_journal_replayed(tmp_path):
+    directory = _open_directory(tmp_path, create=True)
+    directory.save()
+    journal = MockOPResponseJournal(directory, save_batch_size=100)
+    journal.add_command_invocation(_invocation(0), save=True)
+    journal.add_command_invocation(_delete_invocation(), save=True)
+    # interrupted while writing the next entry, without closing the journal
+    with open(response_journal_path(directory.json_file), "a") as f:
+        f.write('{"args": "--format json item get')
+    assert _saved_commands(directory) == ({}, {})
+
+    directory = _open_directory(tmp_path)
+    with MockOPResponseJournal(directory) as journal:
+        assert journal.replayed_count == 2
+        assert not journal.path.exists()
+
+    commands, commands_with_input = _saved_commands(directory)
+    assert list(commands) == [argv_to_string(_invocation(0).cmd_args)]
+    [input_hash] = commands_with_input
+    assert list(commands_with_input[input_hash]) == [argv_to_string(DELETE_ARGV)]
+
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(directory.json_file)
+    for argv, input, output in [(_invocation(0).cmd_args, None, b'{"title": "Item 0"}\n'),
+                                (DELETE_ARGV, DELETE_INPUT, b"")]:
+        result = run_entry_point("mock_op.mock_op_main", argv, env, input=input)
+        assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+        assert result.stdout == output
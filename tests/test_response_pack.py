@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import pytest
+from conftest import (
+    ITEM_GET_ARGV,
+    ITEM_GET_OUTPUT,
+    clean_environment,
+    run_entry_point
+)
+
+from mock_op.response_pack import (
+    MockOPResponsePack,
+    MockOPResponsePackException,
+    pack_response_dir,
+    response_pack_path,
+    unpack_response_dir
+)
+
+
+def _files(directory: Path):
+    return {path.relative_to(directory).as_posix(): path.read_bytes()
+            for path in directory.rglob("*") if path.is_file()}
+
+
+def test_pack_round_trip(tmp_path, response_directory):
+    response_dir = Path(tmp_path, "responses")
+    original = _files(response_dir)
+    assert pack_response_dir(response_dir, remove=True) == (2, len(ITEM_GET_OUTPUT))
+    assert not response_dir.exists()
+
+    pack = MockOPResponsePack(response_pack_path(response_dir))
+    try:
+        assert {relpath: pack.read(relpath) for relpath, _ in pack.entries()} == original
+        with pytest.raises(FileNotFoundError):
+            pack.read("item-list/output")
+    finally:
+        pack.close()
+
+    assert unpack_response_dir(response_dir, remove=True) == (2, len(ITEM_GET_OUTPUT))
+    assert _files(response_dir) == original
+    assert not response_pack_path(response_dir).exists()
+
+
+def test_pack_again_keeps_packed_files(tmp_path, response_directory):
+    response_dir = Path(tmp_path, "responses")
+    pack_response_dir(response_dir, remove=True)
+    Path(response_dir, "item-list").mkdir(parents=True)
+    Path(response_dir, "item-list", "output").write_bytes(b"[]\n")
+    Path(response_dir, "item-get").mkdir()
+    Path(response_dir, "item-get", "error_output").write_bytes(b"replaced\n")
+
+    assert pack_response_dir(response_dir, remove=True)[0] == 3
+    pack = MockOPResponsePack(response_pack_path(response_dir))
+    try:
+        assert pack.read("item-get/output") == ITEM_GET_OUTPUT
+        assert pack.read("item-get/error_output") == b"replaced\n"
+        assert pack.read("item-list/output") == b"[]\n"
+    finally:
+        pack.close()
+
+
+def test_invalid_pack(tmp_path):
+    pack_path = Path(tmp_path, "responses.pack")
+    pack_path.write_bytes(b"not a response pack, but long enough to have a footer")
+    with pytest.raises(MockOPResponsePackException):
+        MockOPResponsePack(pack_path)
+
+
+def test_mock_op_answers_from_pack(tmp_path, response_directory):
+    pack_response_dir(Path(tmp_path, "responses"), remove=True)
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(response_directory)
+    result = run_entry_point("mock_op.mock_op_main", ITEM_GET_ARGV, env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert result.stdout == ITEM_GET_OUTPUT
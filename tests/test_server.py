@@ -0,0 +1,86 @@
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from conftest import (
+    ITEM_GET_ARGV,
+    ITEM_GET_OUTPUT,
+    clean_environment,
+    run_entry_point
+)
+
+SERVER_START_TIMEOUT = 10
+
+
+@pytest.fixture
+def server_socket(tmp_path):
+    socket_path = Path(tmp_path, "mock-op.sock")
+    server = subprocess.Popen([sys.executable, "-m", "mock_op.mock_op_server", "--socket", str(socket_path)],
+                              env=clean_environment(), stdin=subprocess.DEVNULL,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while not socket_path.is_socket():
+        assert server.poll() is None, server.stderr.read().decode("utf-8", "replace")
+        assert time.monotonic() < deadline, "mock-op-server didn't start"
+        time.sleep(0.05)
+    yield socket_path, server.pid
+    server.terminate()
+    server.wait()
+    server.stderr.close()
+
+
+def _client_env(socket_path, **env_vars):
+    env = clean_environment()
+    env["MOCK_OP_SERVER_SOCKET"] = str(socket_path)
+    env.update({name: str(value) for name, value in env_vars.items()})
+    return env
+
+
+def test_client_answered_by_server(tmp_path, server_socket, response_directory):
+    socket_path, server_pid = server_socket
+    trace_path = Path(tmp_path, "trace.jsonl")
+    env = _client_env(socket_path, MOCK_OP_RESPONSE_DIRECTORY=response_directory, MOCK_OP_PROFILE=trace_path)
+    result = run_entry_point("mock_op.mock_op_client", ITEM_GET_ARGV, env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert result.stdout == ITEM_GET_OUTPUT
+    # answered by the server, not by the client falling back to answering in-process
+    trace = json.loads(trace_path.read_text().splitlines()[-1])
+    assert trace["pid"] == server_pid
+
+
+def test_client_relays_errors(server_socket, response_directory):
+    socket_path, _ = server_socket
+    argv = ["--format", "json", "item", "get", "Unrecorded Login"]
+    env = _client_env(socket_path, MOCK_OP_RESPONSE_DIRECTORY=response_directory)
+    served = run_entry_point("mock_op.mock_op_client", argv, env)
+    del env["MOCK_OP_SERVER_SOCKET"]
+    stand_alone = run_entry_point("mock_op.mock_op_main", argv, env)
+    assert served.returncode == stand_alone.returncode != 0
+    assert served.stdout == stand_alone.stdout
+    assert served.stderr == stand_alone.stderr
+
+
+def test_client_without_server(tmp_path, response_directory):
+    env = _client_env(Path(tmp_path, "no-server.sock"), MOCK_OP_RESPONSE_DIRECTORY=response_directory)
+    result = run_entry_point("mock_op.mock_op_client", ITEM_GET_ARGV, env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert result.stdout == ITEM_GET_OUTPUT
+
+
+def test_client_forwards_input_for_vault_model(server_socket, vault_model_path):
+    socket_path, _ = server_socket
+    env = _client_env(socket_path, MOCK_OP_VAULT_MODEL=vault_model_path)
+    list_argv = ["--format", "json", "item", "list", "--vault", "Test Data"]
+    listed = run_entry_point("mock_op.mock_op_client", list_argv, env)
+    items = json.loads(listed.stdout)
+    assert len(items) == 2
+
+    deleted = run_entry_point("mock_op.mock_op_client", ["--format", "json", "item", "delete", "-"], env,
+                              input=json.dumps(items[:1]).encode("utf-8"))
+    assert deleted.returncode == 0, deleted.stderr.decode("utf-8", "replace")
+    # the server keeps the changed model in memory
+    remaining = json.loads(run_entry_point("mock_op.mock_op_client", list_argv, env).stdout)
+    assert [item["id"] for item in remaining] == [items[1]["id"]]
@@ -0,0 +1,94 @@
+"""
+mock-op is started once per 'op' invocation, so what it imports on the way to playing back a
+response is paid for over and over. These hold startup to a budget, and make sure what only
+response generation or unusual argument lists need stays unloaded
+"""
+import json
+import os
+from pathlib import Path
+
+from conftest import (
+    ITEM_GET_ARGV,
+    ITEM_GET_OUTPUT,
+    clean_environment,
+    run_python
+)
+
+IMPORT_BUDGET_ENV_NAME = "MOCK_OP_TEST_IMPORT_BUDGET_MS"
+# cumulative import time of mock_op.mock_op_main, as '-X importtime' reports it
+DEFAULT_IMPORT_BUDGET_MS = 150
+IMPORT_RUNS = 3
+
+# top-level packages, and mock_op modules, playback should never load
+UNWANTED_PACKAGES = ["pyonepassword", "dotenv"]
+UNWANTED_MODULES = ["mock_op.mock_op_argument_parser", "mock_op.response_generator", "mock_op._op"]
+
+_PLAYBACK_SCRIPT = """
+import json, sys
+from mock_op.mock_op_main import main
+modules_path = sys.argv[1]
+sys.argv = ["mock-op"] + sys.argv[2:]
+exit_status = main()
+with open(modules_path, "w") as f:
+    json.dump(sorted(sys.modules), f)
+sys.exit(exit_status)
+"""
+
+
+def _environment():
+    env = clean_environment()
+    # let the warm-up import write bytecode, so compiling isn't counted against the budget
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def _import_time_ms(env) -> float:
+    result = run_python(["-X", "importtime", "-c", "import mock_op.mock_op_main"], env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    # lines are 'import time: <self us> | <cumulative us> | <module>', with nested imports indented
+    total_us = 0
+    for line in result.stderr.decode("utf-8").splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[0].startswith("import time:"):
+            continue
+        # past the space after the '|'
+        module = fields[2][1:].rstrip()
+        if module.lstrip() != module:
+            continue
+        if module == "mock_op" or module.startswith("mock_op."):
+            total_us += int(fields[1])
+    return total_us / 1000
+
+
+def _unwanted(modules):
+    unwanted = [name for name in modules
+                if name.split(".")[0] in UNWANTED_PACKAGES or name in UNWANTED_MODULES]
+    return unwanted
+
+
+def test_import_within_budget():
+    budget_ms = float(os.environ.get(IMPORT_BUDGET_ENV_NAME, DEFAULT_IMPORT_BUDGET_MS))
+    env = _environment()
+    run_python(["-c", "import mock_op.mock_op_main"], env)
+    # the quickest of a few runs, as the others only measure how busy the machine is
+    import_ms = min(_import_time_ms(env) for _ in range(IMPORT_RUNS))
+    assert import_ms <= budget_ms, \
+        f"Importing mock_op.mock_op_main took {import_ms:.1f}ms, over the {budget_ms:.0f}ms budget"
+
+
+def test_import_loads_only_playback_modules():
+    result = run_python(["-c", "import json, sys, mock_op.mock_op_main; print(json.dumps(sorted(sys.modules)))"],
+                        _environment())
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert _unwanted(json.loads(result.stdout)) == []
+
+
+def test_playback_loads_only_playback_modules(tmp_path, response_directory):
+    env = _environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(response_directory)
+    modules_path = Path(tmp_path, "modules.json")
+    # no .env file in the working directory, so python-dotenv has no reason to load
+    result = run_python(["-c", _PLAYBACK_SCRIPT, str(modules_path)] + ITEM_GET_ARGV, env, cwd=tmp_path)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    assert result.stdout == ITEM_GET_OUTPUT
+    assert _unwanted(json.loads(modules_path.read_text())) == []
@@ -0,0 +1,50 @@
+"""
+Test suites run in parallel, e.g., with pytest-xdist, share one state configuration, so every
+state-changing response has to advance it exactly once, however many mock-op processes are
+doing so at the same time
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from conftest import (
+    STATE_CHANGING_ARGV,
+    clean_environment,
+    run_python,
+    write_state_config
+)
+
+from mock_op.state import MockOPStateConfig
+
+PROCESSES = 8
+TRANSITIONS = 4
+
+
+def _transitions(env, count: int) -> List[int]:
+    observed = []
+    for _ in range(count):
+        result = run_python(["-m", "mock_op.mock_op_main"] + STATE_CHANGING_ARGV, env)
+        assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+        observed.append(int(result.stdout))
+    return observed
+
+
+def test_concurrent_transitions(tmp_path):
+    total = PROCESSES * TRANSITIONS
+    # one extra state for the last transition to land on
+    state_config_path = write_state_config(tmp_path, total + 1)
+    env = clean_environment()
+    env["MOCK_OP_STATE_DIR"] = str(state_config_path)
+
+    # each thread runs its mock-op processes one after another, so there are always
+    # PROCESSES of them contending for the state configuration
+    with ThreadPoolExecutor(max_workers=PROCESSES) as executor:
+        results = list(executor.map(_transitions, [env] * PROCESSES, [TRANSITIONS] * PROCESSES))
+
+    # each transition should have been answered from a distinct iteration, with none skipped
+    counts = Counter(iteration for observed in results for iteration in observed)
+    lost = [i for i in range(total) if i not in counts]
+    duplicated = [i for i, count in counts.items() if count > 1]
+    assert lost == []
+    assert duplicated == []
+    assert MockOPStateConfig(state_config_path).iteration == total
@@ -0,0 +1,59 @@
+import os
+import stat
+
+from conftest import (
+    STATE_CHANGING_ARGV,
+    clean_environment,
+    run_python,
+    write_state_config
+)
+
+from mock_op.state import MockOPState, MockOPStateConfig, reset_state_session
+
+STATE_COUNT = 4
+
+
+def _transition(env) -> int:
+    result = run_python(["-m", "mock_op.mock_op_main"] + STATE_CHANGING_ARGV, env)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    return int(result.stdout)
+
+
+def test_sessions_advance_independently(tmp_path):
+    state_config_path = write_state_config(tmp_path, STATE_COUNT)
+    config_bytes = state_config_path.read_bytes()
+
+    first = MockOPState(state_config_path, session="first")
+    first.iterate_config()
+    first.iterate_config()
+    second = MockOPState(state_config_path, session="second")
+    second.iterate_config()
+    assert MockOPState(state_config_path, session="first").iteration == 2
+    assert MockOPState(state_config_path, session="second").iteration == 1
+    # a new session starts wherever the state configuration is
+    assert MockOPState(state_config_path, session="third").iteration == 0
+    assert state_config_path.read_bytes() == config_bytes
+
+    reset_state_session(state_config_path, "first")
+    assert MockOPState(state_config_path, session="first").iteration == 0
+    assert MockOPState(state_config_path, session="second").iteration == 1
+    assert MockOPStateConfig(state_config_path).iteration == 0
+
+
+def test_session_with_read_only_state_dir(tmp_path):
+    state_config_path = write_state_config(tmp_path, STATE_COUNT)
+    state_dir = state_config_path.parent
+    state_files = sorted(os.listdir(state_dir))
+    env = clean_environment()
+    env["MOCK_OP_STATE_DIR"] = str(state_config_path)
+    env["MOCK_OP_STATE_SESSION"] = "read-only"
+    env["MOCK_OP_STATE_SESSION_DIR"] = str(tmp_path / "sessions")
+
+    mode = stat.S_IMODE(os.stat(state_dir).st_mode)
+    os.chmod(state_dir, 0o555)
+    try:
+        assert [_transition(env) for _ in range(3)] == [0, 1, 2]
+    finally:
+        os.chmod(state_dir, mode)
+    # checked directly too, since the state directory's mode doesn't stop root from writing to it
+    assert sorted(os.listdir(state_dir)) == state_files
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from conftest import ITEM_GET_ARGV, clean_environment, run_entry_point
+from mock_cli.argv_conversion import argv_to_string
+
+from mock_op.response_directory import open_response_directory
+from mock_op.response_index import compile_response_index
+from mock_op.state import write_json_atomic
+from mock_op.suggestions import (
+    SUGGESTIONS_ENV_NAME,
+    suggest_commands,
+    suggestion_limit_from_env
+)
+
+INPUT_HASH = "0" * 32
+RECORDED_ARGVS = [
+    ["--format", "json", "item", "get", "Other Login", "--vault", "Test Data"],
+    ["--format", "json", "vault", "get", "Test Data"],
+    ["--format", "json", "document", "get", "Example Login", "--vault", "Test Data"]
+]
+INPUT_ARGV = ["item", "delete", "-"]
+TYPO_ARGV = ["--format", "json", "item", "get", "Exmaple Login", "--vault", "Test Data"]
+
+
+@pytest.fixture(params=[False, True], ids=["json", "index"])
+def suggesting_directory(request, response_directory):
+    directory_dict = json.loads(response_directory.read_text())
+    response = directory_dict["commands"][argv_to_string(ITEM_GET_ARGV)]
+    for argv in RECORDED_ARGVS:
+        directory_dict["commands"][argv_to_string(argv)] = dict(response)
+    directory_dict["commands_with_input"][INPUT_HASH] = {argv_to_string(INPUT_ARGV): dict(response)}
+    write_json_atomic(response_directory, directory_dict)
+    respdir_path = response_directory
+    if request.param:
+        respdir_path = compile_response_index(response_directory)
+    return open_response_directory(respdir_path)
+
+
+def test_suggest_typo(suggesting_directory):
+    suggestions = suggest_commands(suggesting_directory, TYPO_ARGV)
+    assert suggestions[0].argv == ITEM_GET_ARGV
+    # only 'item get's, since there are some, and most similar first
+    assert [suggestion.argv for suggestion in suggestions] == [ITEM_GET_ARGV, RECORDED_ARGVS[0]]
+    assert suggestions[0].similarity > suggestions[1].similarity
+
+
+def test_suggest_reordered(suggesting_directory):
+    # compared in canonical form, so option order doesn't count against a command
+    reordered = ["item", "get", "Example Logn", "--vault", "Test Data", "--format", "json"]
+    assert suggest_commands(suggesting_directory, reordered, limit=1)[0].argv == ITEM_GET_ARGV
+
+
+def test_suggest_other_subcommand(suggesting_directory):
+    suggestions = suggest_commands(suggesting_directory, ["--format", "json", "vault", "get", "Test Dta"])
+    assert [suggestion.argv for suggestion in suggestions] == [RECORDED_ARGVS[1]]
+    assert suggest_commands(suggesting_directory, TYPO_ARGV, limit=0) == []
+
+
+def test_suggest_different_input(suggesting_directory):
+    suggestions = suggest_commands(suggesting_directory, INPUT_ARGV, input_hash="1" * 32)
+    assert [(suggestion.argv, suggestion.input_hash) for suggestion in suggestions] == [(INPUT_ARGV, INPUT_HASH)]
+
+
+@pytest.mark.parametrize("value, limit", [(None, 3), ("5", 5), ("0", 0), ("-1", 0), ("lots", 3)])
+def test_suggestion_limit_from_env(monkeypatch, value, limit):
+    if value is None:
+        monkeypatch.delenv(SUGGESTIONS_ENV_NAME, raising=False)
+    else:
+        monkeypatch.setenv(SUGGESTIONS_ENV_NAME, value)
+    assert suggestion_limit_from_env() == limit
+
+
+def test_mock_op_reports_suggestions(suggesting_directory, response_directory):
+    env = clean_environment()
+    env["MOCK_OP_RESPONSE_DIRECTORY"] = str(response_directory)
+    result = run_entry_point("mock_op.mock_op_main", TYPO_ARGV, env)
+    assert result.returncode != 0
+    stderr = result.stderr.decode("utf-8")
+    assert "Closest recorded commands:\n    --format json item get 'Example Login' --vault 'Test Data'" in stderr
+
+    env[SUGGESTIONS_ENV_NAME] = "0"
+    result = run_entry_point("mock_op.mock_op_main", TYPO_ARGV, env)
+    assert "Closest recorded commands" not in result.stderr.decode("utf-8")
@@ -0,0 +1,98 @@
+import json
+from pathlib import Path
+
+import pytest
+from conftest import clean_environment, run_entry_point
+
+from mock_op.response_pack import response_pack_path
+from mock_op.synthetic import (
+    LAYOUT_LOOSE,
+    MockOPSyntheticException,
+    MockOPSyntheticSpec,
+    synthesize_response_directories,
+    synthesize_vault_model
+)
+
+SPEC_ARGS = {"items": 30, "vaults": 3, "users": 5, "groups": 2, "documents": 2, "payload_bytes": 100}
+ITEM_GET_ARGV = ["--format", "json", "item", "get", "Example Login 4", "--vault", "Test Vault 1"]
+
+
+def _mock_op(argv, **env_vars):
+    env = clean_environment()
+    env.update({name: str(value) for name, value in env_vars.items()})
+    return run_entry_point("mock_op.mock_op_main", argv, env)
+
+
+def _contents(output_dir: Path):
+    # response directories record absolute paths, which differ from one output directory to the next
+    return {path.relative_to(output_dir).as_posix(): path.read_bytes().replace(str(output_dir).encode(), b"")
+            for path in output_dir.rglob("*") if path.is_file()}
+
+
+def test_same_seed_same_output(tmp_path):
+    first = synthesize_response_directories(Path(tmp_path, "first"), MockOPSyntheticSpec(**SPEC_ARGS))
+    synthesize_response_directories(Path(tmp_path, "second"), MockOPSyntheticSpec(**SPEC_ARGS))
+    synthesize_response_directories(Path(tmp_path, "other"), MockOPSyntheticSpec(seed=1, **SPEC_ARGS))
+    first_contents = _contents(Path(tmp_path, "first"))
+    assert first_contents == _contents(Path(tmp_path, "second"))
+    assert first_contents != _contents(Path(tmp_path, "other"))
+
+    # whoami, the vault, user, and group lists, an item list per vault, a get for each thing,
+    # including 2 missing items (5% of 30), and a 'document get' per document
+    assert first.command_count == 1 + 3 + 3 + (3 + 30 + 2 + 5 + 2) + 2
+    assert first.commands_with_input_count == 2
+    assert first.state_config is None
+
+
+@pytest.mark.parametrize("layout_args", [{}, {"layout": LAYOUT_LOOSE}])
+def test_synthetic_playback(tmp_path, layout_args):
+    stats = synthesize_response_directories(tmp_path, MockOPSyntheticSpec(**SPEC_ARGS, **layout_args))
+    respdir_json_file, = stats.response_directories
+    assert response_pack_path(Path(tmp_path, "responses")).exists() == (not layout_args)
+
+    result = _mock_op(ITEM_GET_ARGV, MOCK_OP_RESPONSE_DIRECTORY=respdir_json_file)
+    assert result.returncode == 0, result.stderr.decode("utf-8", "replace")
+    item = json.loads(result.stdout)
+    assert item["title"] == "Example Login 4"
+    assert item["fields"][0]["reference"] == "op://Test Vault 1/Example Login 4/username"
+
+    missing = _mock_op(["--format", "json", "item", "get", "Missing Item 0", "--vault", "Test Vault 0"],
+                       MOCK_OP_RESPONSE_DIRECTORY=respdir_json_file)
+    assert missing.returncode == 1
+    assert b"isn't an item" in missing.stderr
+
+
+def test_synthetic_iterations(tmp_path):
+    stats = synthesize_response_directories(tmp_path, MockOPSyntheticSpec(iterations=3, **SPEC_ARGS))
+    assert len(stats.response_directories) == 3
+    env_vars = {"MOCK_OP_STATE_DIR": stats.state_config}
+    deleted = ["--format", "json", "item", "get", "Example Login 0", "--vault", "Test Vault 0"]
+    assert _mock_op(deleted, **env_vars).returncode == 0
+    delete = _mock_op(["--format", "json", "item", "delete", "Example Login 0", "--vault", "Test Vault 0"],
+                      **env_vars)
+    assert delete.returncode == 0, delete.stderr.decode("utf-8", "replace")
+    assert _mock_op(deleted, **env_vars).returncode == 1
+
+
+def test_synthetic_vault_model(tmp_path):
+    model_path = synthesize_vault_model(Path(tmp_path, "vault-model.json"), MockOPSyntheticSpec(**SPEC_ARGS))
+    modeled = _mock_op(ITEM_GET_ARGV, MOCK_OP_VAULT_MODEL=model_path)
+    assert modeled.returncode == 0, modeled.stderr.decode("utf-8", "replace")
+
+    respdir_json_file, = synthesize_response_directories(
+        Path(tmp_path, "responses"), MockOPSyntheticSpec(**SPEC_ARGS)).response_directories
+    recorded = _mock_op(ITEM_GET_ARGV, MOCK_OP_RESPONSE_DIRECTORY=respdir_json_file)
+    # the same account, whichever way it's answered
+    assert json.loads(modeled.stdout)["id"] == json.loads(recorded.stdout)["id"]
+
+
+@pytest.mark.parametrize("spec_args", [
+    {"vaults": 0},
+    {"iterations": 0},
+    {"items": 1, "iterations": 3},
+    {"error_ratio": 2},
+    {"layout": "zip"}
+])
+def test_invalid_spec(spec_args):
+    with pytest.raises(MockOPSyntheticException):
+        MockOPSyntheticSpec(**spec_args)
@@ -0,0 +1,138 @@
+import copy
+import json
+from pathlib import Path
+
+import pytest
+from conftest import VAULT_MODEL, clean_environment, run_entry_point
+
+from mock_op.vault_model import (
+    MockOPVaultModel,
+    MockOPVaultModelException,
+    vault_model_respond
+)
+
+
+@pytest.fixture
+def model() -> MockOPVaultModel:
+    return MockOPVaultModel(copy.deepcopy(VAULT_MODEL))
+
+
+def _query(model, *args, input=None):
+    response = model.respond(["--format", "json"] + list(args), input=input)
+    assert response is not None
+    assert response.exit_status == 0, response.error_output
+    return json.loads(response.output) if response.output else None
+
+
+def test_queries(model):
+    assert _query(model, "whoami")["email"] == "user@example.com"
+    vaults = _query(model, "vault", "list")
+    assert [(vault["name"], vault["items"]) for vault in vaults] == [("Test Data", 2), ("Other Data", 1)]
+    assert [vault["name"] for vault in _query(model, "vault", "list", "--group", "Example Group")] == ["Test Data"]
+    assert [user["email"] for user in _query(model, "user", "list", "--vault", "Test Data")] == ["user@example.com"]
+    assert [group["name"] for group in _query(model, "group", "list", "--user", "user@example.com")] == \
+        ["Example Group"]
+
+    item = _query(model, "item", "get", "Example Login", "--vault", "Test Data")
+    assert [field["value"] for field in item["fields"]] == ["user", "secret"]
+    # by ID as well as by title
+    assert _query(model, "item", "get", item["id"]) == item
+    summaries = _query(model, "item", "list", "--vault", "Test Data")
+    assert [summary["title"] for summary in summaries] == ["Example Login", "Example Login 2"]
+    assert "fields" not in summaries[0]
+    assert [summary["title"] for summary in _query(model, "item", "list", "--tags", "example")] == ["Example Login"]
+
+
+def test_not_found(model):
+    response = model.respond(["--format", "json", "item", "get", "Missing Login", "--vault", "Test Data"])
+    assert response.exit_status == 1
+    assert b"\"Missing Login\" isn't an item in the \"Test Data\" vault" in response.error_output
+    response = model.respond(["--format", "json", "vault", "get", "Missing Vault"])
+    assert response.exit_status == 1
+
+
+@pytest.mark.parametrize("argv", [
+    # only JSON output is modeled
+    ["item", "get", "Example Login"],
+    ["--format", "json", "document", "get", "Example Document"],
+    ["--format", "json", "item", "get", "Example Login", "--fields", "type=otp"],
+    ["--format", "json", "item", "delete", "-"]
+])
+def test_unanswered(model, argv):
+    assert model.respond(argv) is None
+
+
+def test_item_delete_piped(model):
+    items = _query(model, "item", "list", "--vault", "Test Data")
+    # the same item piped twice is only deleted once
+    response = model.respond(["--format", "json", "item", "delete", "-"],
+                             input=json.dumps(items[:1] + items).encode("utf-8"))
+    assert response.exit_status == 0, response.error_output
+    assert response.changes_state
+    assert _query(model, "item", "list", "--vault", "Test Data") == []
+    assert [vault["items"] for vault in _query(model, "vault", "list")] == [0, 1]
+
+
+def test_item_archive(model):
+    _query(model, "item", "delete", "Example Login", "--archive")
+    assert len(_query(model, "item", "list", "--vault", "Test Data")) == 1
+    assert _query(model, "item", "get", "Example Login", "--include-archive")["state"] == "ARCHIVED"
+
+
+def test_item_edit(model):
+    _query(model, "item", "edit", "Example Login", "password=changed")
+    edited = _query(model, "item", "edit", "Example Login", "section.pin[password]=1234",
+                    "--tags", "a,b", "--url", "https://example.com")
+    assert edited["version"] == 3
+    assert edited["tags"] == ["a", "b"]
+    assert edited["urls"][0]["href"] == "https://example.com"
+    fields = {field["label"]: field for field in edited["fields"]}
+    assert fields["password"]["value"] == "changed"
+    assert fields["pin"]["type"] == "CONCEALED"
+    assert fields["pin"]["reference"] == "op://Test Data/Example Login/section/pin"
+    assert _query(model, "item", "get", "Example Login") == edited
+
+
+def test_item_edit_title(model):
+    edited = _query(model, "item", "edit", "Example Login", "note=hello", "--title", "Renamed Login")
+    assert [field["reference"] for field in edited["fields"] if "reference" in field] == \
+        ["op://Test Data/Renamed Login/note"]
+    # fields that already had a reference follow the new title too
+    with_references = copy.deepcopy(VAULT_MODEL)
+    for field in with_references["items"][0]["fields"]:
+        field["reference"] = f"op://Test Data/Example Login/{field['label']}"
+    model = MockOPVaultModel(with_references)
+    edited = _query(model, "item", "edit", "Example Login", "--title", "Renamed Login")
+    assert [field["reference"] for field in edited["fields"]] == \
+        ["op://Test Data/Renamed Login/username", "op://Test Data/Renamed Login/password"]
+    assert _query(model, "item", "get", "Renamed Login")["id"] == edited["id"]
+    response = model.respond(["--format", "json", "item", "get", "Example Login"])
+    assert response.exit_status == 1
+
+
+def test_invalid_model():
+    with pytest.raises(MockOPVaultModelException):
+        MockOPVaultModel({"items": [{"title": "Example Login", "vault": "Missing Vault"}]})
+
+
+def test_state_file(tmp_path, vault_model_path):
+    state_path = Path(tmp_path, "state", "vault-model-state.json")
+    argv = ["--format", "json", "item", "delete", "Example Login"]
+    assert vault_model_respond(vault_model_path, argv, state_path=state_path).exit_status == 0
+    # a fresh model, as another process would load, starts from the saved state
+    list_argv = ["--format", "json", "item", "list", "--vault", "Test Data"]
+    listed = json.loads(vault_model_respond(vault_model_path, list_argv, state_path=state_path).output)
+    assert [item["title"] for item in listed] == ["Example Login 2"]
+    # the model itself is unchanged
+    assert len(json.loads(vault_model_respond(vault_model_path, list_argv).output)) == 2
+
+
+def test_mock_op_state_file(tmp_path, vault_model_path):
+    env = clean_environment()
+    env["MOCK_OP_VAULT_MODEL"] = str(vault_model_path)
+    env["MOCK_OP_VAULT_MODEL_STATE"] = str(Path(tmp_path, "vault-model-state.json"))
+    argv = ["--format", "json", "item", "get", "Example Login", "--vault", "Test Data"]
+    assert run_entry_point("mock_op.mock_op_main", argv, env).returncode == 0
+    deleted = run_entry_point("mock_op.mock_op_main", ["--format", "json", "item", "delete", "Example Login"], env)
+    assert deleted.returncode == 0, deleted.stderr.decode("utf-8", "replace")
+    assert run_entry_point("mock_op.mock_op_main", argv, env).returncode == 1